@@ -0,0 +1,116 @@
+"""
+Compare the ways of answering queries about the conflicting artifacts of many analysed PRs, on synthetic
+conflicts_before_*.json files:
+  - scan:  read and walk all JSON files for every query, as the per-PR files were used so far
+  - index: ConflictIndex, with the conflicts keyed by groupId:artifactId and precomputed aggregates per artifact
+
+The queries are the top conflicting artifacts, all PRs where an artifact lost a mediation, and the version span of
+an artifact. The time to build the index from the files is printed as well.
+
+Run from the project root: python benchmarks/bench_conflict_index.py
+"""
+import glob
+import json
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+
+from rq2.conflict_index import ConflictIndex
+from rq2.pom_resolver import version_key
+
+PRS = 2_000
+MODULES_PER_PR = (1, 30)
+CONFLICTS_PER_MODULE = (1, 40)
+ARTIFACTS = 5_000
+QUERIED_ARTIFACT = "org.apache.logging.log4j:log4j-api"
+SEED = 42
+
+
+def random_version(rng):
+    return f"{rng.randint(1, 9)}.{rng.randint(0, 20)}.{rng.randint(0, 30)}{rng.choice(['', '', '-jre', '.Final'])}"
+
+
+def generate_files(directory, rng):
+    # Zipf-like popularity, so a few artifacts conflict in most PRs, as e.g. log4j, guava or jackson do
+    artifacts = [QUERIED_ARTIFACT] + [f"org.example{i % 300}:artifact-{i}" for i in range(ARTIFACTS)]
+    weights = [1 / (rank + 1) for rank in range(len(artifacts))]
+    for pr in range(PRS):
+        pr_url = f"https://github.com/owner{pr % 400}/repo{pr}/pull/{pr}"
+        conflicts = {}
+        for module in range(rng.randint(*MODULES_PER_PR)):
+            dependencies = conflicts.setdefault(f"module-{module}", {})
+            for artifact in rng.choices(artifacts, weights, k=rng.randint(*CONFLICTS_PER_MODULE)):
+                omitted = dependencies.setdefault(f"{artifact}:{random_version(rng)}", {})
+                omitted_version = random_version(rng)
+                omitted[omitted_version] = omitted.get(omitted_version, 0) + 1
+        with open(os.path.join(directory, f"conflicts_before_owner_repo_{pr}.json"), 'w') as f:
+            json.dump({"pr_url": pr_url, "total_conflicts": 0, "affected_modules": len(conflicts),
+                       "conflicts": conflicts}, f)
+
+
+def scan(directory):
+    """Walk all conflict files, yielding (pr_url, module, group_id, artifact_id, used, omitted, count)."""
+    for path in sorted(glob.glob(os.path.join(directory, "conflicts_before_*.json"))):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        for module, dependencies in data['conflicts'].items():
+            for dependency, omitted_versions in dependencies.items():
+                group_id, artifact_id, used_version = dependency.rsplit(':', 2)
+                for omitted_version, count in omitted_versions.items():
+                    yield data['pr_url'], module, group_id, artifact_id, used_version, omitted_version, count
+
+
+def scan_top_artifacts(directory, limit=20):
+    counts = defaultdict(int)
+    for _, _, group_id, artifact_id, _, _, count in scan(directory):
+        counts[(group_id, artifact_id)] += count
+    return [key for key, _ in sorted(counts.items(), key=lambda item: -item[1])[:limit]]
+
+
+def scan_prs_with_lost_mediation(directory, artifact):
+    group_id, artifact_id = artifact.split(':')
+    return sorted({row[0] for row in scan(directory) if row[2] == group_id and row[3] == artifact_id})
+
+
+def scan_version_span(directory, artifact):
+    group_id, artifact_id = artifact.split(':')
+    versions = {version for row in scan(directory) if row[2] == group_id and row[3] == artifact_id
+                for version in row[4:6]}
+    ordered = sorted(versions, key=lambda version: (version_key(version), version))
+    return len(ordered), ordered[0], ordered[-1]
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        generate_files(tmp, random.Random(SEED))
+        index = ConflictIndex(os.path.join(tmp, "conflict_index.sqlite"))
+        _, build_s = timed(index.build, os.path.join(tmp, "conflicts_before_*.json"))
+        rows = index.db.execute("SELECT COUNT(*) FROM conflicts").fetchone()[0]
+        print(f"{PRS} PRs, {rows} conflict rows, index built in {build_s:.1f}s\n")
+
+        queries = [
+            ('top artifacts', lambda: scan_top_artifacts(tmp),
+             lambda: [(group_id, artifact_id) for group_id, artifact_id, *_ in index.top_artifacts(20)]),
+            ('PRs with lost mediation', lambda: scan_prs_with_lost_mediation(tmp, QUERIED_ARTIFACT),
+             lambda: index.prs_with_lost_mediation(QUERIED_ARTIFACT)),
+            ('version span', lambda: scan_version_span(tmp, QUERIED_ARTIFACT),
+             lambda: tuple(index.version_span(QUERIED_ARTIFACT)[0][2:])),
+        ]
+        print(f"{'query':>25} {'scan (ms)':>10} {'index (ms)':>11} {'speedup':>8}")
+        for name, scan_query, index_query in queries:
+            expected, scan_s = timed(scan_query)
+            result, index_s = timed(index_query)
+            assert result == expected, f"{name}: results disagree"
+            print(f"{name:>25} {scan_s * 1000:>10.1f} {index_s * 1000:>11.2f} {scan_s / index_s:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Compare the parsers of mvn dependency:tree -Dverbose output on synthetic multi-module trees of several MB:
+  - legacy:    the original parse_conflicts_by_module_from_dependency_tree, running two regexes on every line
+  - streaming: DependencyTreeParser, tokenizing every tree line once into DependencyNode records
+
+The corpus mixes used, managed, duplicate and conflicting dependencies with the long [WARNING] lines Maven prints for
+e.g. classpath problems, which make the lazy .*? segments of the legacy conflict regex backtrack.
+
+Run from the project root: python benchmarks/bench_dependency_tree_parser.py
+"""
+import os
+import random
+import re
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+from rq2.dependency_tree import parse_dependency_tree
+
+CORPUS_SIZES_MB = [5, 20]
+LONG_LINE_SHARE = 0.01      # share of long [WARNING] lines
+SEED = 42
+
+
+def legacy_parse_conflicts(file_path):
+    """The original implementation of parse_conflicts_by_module_from_dependency_tree."""
+    module_conflicts = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+    total_conflicts = 0
+    current_module = None
+    module_pattern = re.compile(r'dependency:.*?:tree.*?@ ([-\w.]+)')
+
+    conflict_pattern = re.compile(
+        r'([a-zA-Z0-9_.\-]+):([a-zA-Z0-9_.\-]+):.*?:([\w.\-]+):.*? -.*? omitted for conflict with ([\w.\-]+)'
+    )
+
+    with open(file_path, 'r') as f:
+        for line in f:
+            module_match = module_pattern.search(line)
+            if module_match:
+                current_module = module_match.group(1)
+                continue
+
+            match = conflict_pattern.search(line)
+            if match and current_module:
+                key = f"{match.group(1)}:{match.group(2)}:{match.group(4)}"
+                module_conflicts[current_module][key][match.group(3)] += 1
+                total_conflicts += 1
+
+    return total_conflicts, len(module_conflicts), module_conflicts
+
+
+def random_version(rng):
+    return f"{rng.randint(1, 9)}.{rng.randint(0, 20)}.{rng.randint(0, 30)}{rng.choice(['', '', '-jre', '.Final'])}"
+
+
+def generate_corpus(path, size_mb, rng):
+    artifacts = [(f"org.example{rng.randint(0, 50)}.group{i % 40}", f"artifact-{i}") for i in range(2000)]
+    target = size_mb * 1024 ** 2
+    written = 0
+    module = 0
+    with open(path, 'w') as f:
+        while written < target:
+            lines = [f"[INFO] --- dependency:3.8.1:tree (default-cli) @ module-{module} ---\n",
+                     f"[INFO] org.example:module-{module}:jar:1.0-SNAPSHOT\n"]
+            module += 1
+            for _ in range(rng.randint(50, 400)):
+                depth = rng.randint(1, 6)
+                prefix = "|  " * (depth - 1) + rng.choice(["+- ", "\\- "])
+                group_id, artifact_id = rng.choice(artifacts)
+                version = random_version(rng)
+                scope = rng.choice(["compile", "runtime", "test", "provided"])
+                kind = rng.random()
+                if kind < 0.15:
+                    line = (f"({group_id}:{artifact_id}:jar:{version}:{scope} - omitted for conflict with "
+                            f"{random_version(rng)})")
+                elif kind < 0.35:
+                    line = f"({group_id}:{artifact_id}:jar:{version}:{scope} - omitted for duplicate)"
+                elif kind < 0.45:
+                    line = (f"{group_id}:{artifact_id}:jar:{version}:{scope} "
+                            f"(version managed from {random_version(rng)})")
+                elif kind < 0.5:
+                    line = f"{group_id}:{artifact_id}:jar:tests:{version}:{scope}"
+                else:
+                    line = f"{group_id}:{artifact_id}:jar:{version}:{scope}"
+                lines.append(f"[INFO] {prefix}{line}\n")
+
+                if rng.random() < LONG_LINE_SHARE:
+                    jars = ":".join(f"/home/user/.m2/repository/{g.replace('.', '/')}/{a}/{random_version(rng)}"
+                                    for g, a in rng.sample(artifacts, 40))
+                    lines.append(f"[WARNING] The POM for {group_id}:{artifact_id}:jar:{version} is invalid, "
+                                 f"classpath: {jars}\n")
+            lines.append("[INFO] ------------------------------------------------------------------------\n")
+            chunk = "".join(lines)
+            f.write(chunk)
+            written += len(chunk)
+
+
+def streaming_parse_conflicts(file_path):
+    parser = parse_dependency_tree(file_path)
+    return parser.total_conflicts, parser.affected_modules, parser.conflicts
+
+
+def measure(function, path):
+    start = time.perf_counter()
+    result = function(path)
+    elapsed = time.perf_counter() - start
+
+    # Separate run for the memory, as tracing the allocations slows the parsers down
+    tracemalloc.start()
+    function(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    rng = random.Random(SEED)
+    print(f"{'size (MB)':>10} {'parser':>10} {'time (s)':>10} {'MB/s':>8} {'peak (MB)':>10} {'conflicts':>10}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_mb in CORPUS_SIZES_MB:
+            path = os.path.join(tmp, f"dep_tree_{size_mb}.txt")
+            generate_corpus(path, size_mb, rng)
+
+            results = {}
+            for name, function in [('legacy', legacy_parse_conflicts), ('streaming', streaming_parse_conflicts)]:
+                results[name], elapsed, peak = measure(function, path)
+                print(f"{size_mb:>10} {name:>10} {elapsed:>10.2f} {size_mb / elapsed:>8.1f} {peak / 1024 ** 2:>10.1f} "
+                      f"{results[name][0]:>10}")
+
+            legacy, streaming = results['legacy'], results['streaming']
+            assert legacy[:2] == streaming[:2], "Conflict counts disagree"
+            assert {m: {k: dict(v) for k, v in deps.items()} for m, deps in legacy[2].items()} == streaming[2], \
+                "Conflicts disagree"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Compare the ways of computing java_code_changes on large synthetic PR diffs:
+  - legacy: download the whole diff, splitlines() and classify every line in Python
+  - diff:   stream the diff through JavaDiffCounter in chunks
+  - files:  sum additions + deletions of the *.java entries of the PR files listing
+
+Run from the project root: python benchmarks/bench_java_code_changes.py
+"""
+import json
+import random
+import time
+import tracemalloc
+
+from rq1.developer_effort_basic_metrics import DIFF_CHUNK_SIZE, JavaDiffCounter, sum_java_file_changes
+
+DIFF_SIZES_MB = [1, 10, 100]
+SEED = 42
+
+
+def legacy_count_java_code_changes(diff_text):
+    """The original implementation of count_java_code_changes, working on the complete diff text."""
+    total_added = 0
+    total_removed = 0
+    count_this_file = False
+
+    for line in diff_text.splitlines():
+        if line.startswith('diff --git'):
+            parts = line.strip().split(' ')
+            if len(parts) >= 3:
+                current_file = parts[2][2:]
+                count_this_file = current_file.endswith('.java')
+        elif count_this_file:
+            if line.startswith('+') and not line.startswith('+++'):
+                total_added += 1
+            elif line.startswith('-') and not line.startswith('---'):
+                total_removed += 1
+
+    return total_added + total_removed
+
+
+def generate_diff(size_mb, rng):
+    """Generate a unified diff of roughly size_mb MB and the matching PR files listing."""
+    target = size_mb * 1024 * 1024
+    parts = []
+    files = []
+    size = 0
+    i = 0
+
+    while size < target:
+        extension = rng.choice(['.java', '.java', '.xml', '.md', '.properties'])
+        path = f"module{i % 50}/src/main/java/org/example/File{i}{extension}"
+        added = removed = 0
+        lines = [f"diff --git a/{path} b/{path}", "index 1234567..89abcde 100644", f"--- a/{path}", f"+++ b/{path}"]
+
+        for hunk in range(rng.randint(1, 8)):
+            lines.append(f"@@ -{hunk * 100},20 +{hunk * 100},20 @@ public class File{i} {{")
+            for _ in range(rng.randint(5, 60)):
+                kind = rng.random()
+                if kind < 0.3:
+                    lines.append(f"+        value = compute(\"{rng.random()}\"); // ++ added")
+                    added += 1
+                elif kind < 0.5:
+                    lines.append(f"-        value = legacy(\"{rng.random()}\"); // -- removed")
+                    removed += 1
+                else:
+                    lines.append(f"         return value + {rng.randint(0, 1000)};")
+
+        chunk = "\n".join(lines) + "\n"
+        parts.append(chunk)
+        files.append({'filename': path, 'additions': added, 'deletions': removed})
+        size += len(chunk)
+        i += 1
+
+    return "".join(parts).encode(), files
+
+
+def measure(function, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def run_legacy(diff_bytes):
+    return legacy_count_java_code_changes(diff_bytes.decode())
+
+
+def run_streaming(diff_bytes):
+    counter = JavaDiffCounter()
+    view = memoryview(diff_bytes)
+    for offset in range(0, len(diff_bytes), DIFF_CHUNK_SIZE):
+        counter.feed(bytes(view[offset:offset + DIFF_CHUNK_SIZE]))
+    return counter.total()
+
+
+def run_files(files_json):
+    return sum_java_file_changes(json.loads(files_json))
+
+
+def main():
+    rng = random.Random(SEED)
+    print(f"{'diff size':>10} {'mode':>8} {'result':>10} {'time (s)':>10} {'MB/s':>10} {'peak memory (MB)':>18}")
+
+    for size_mb in DIFF_SIZES_MB:
+        diff_bytes, files = generate_diff(size_mb, rng)
+        files_json = json.dumps(files)
+        actual_mb = len(diff_bytes) / 1024 ** 2
+
+        results = {}
+        for mode, function, argument in [('legacy', run_legacy, diff_bytes),
+                                         ('diff', run_streaming, diff_bytes),
+                                         ('files', run_files, files_json)]:
+            result, elapsed, peak = measure(function, argument)
+            results[mode] = result
+            print(f"{actual_mb:>8.1f}MB {mode:>8} {result:>10} {elapsed:>10.3f} {actual_mb / elapsed:>10.1f} "
+                  f"{peak / 1024 ** 2:>18.1f}")
+
+        assert len(set(results.values())) == 1, f"Modes disagree: {results}"
+
+
+if __name__ == "__main__":
+    main()
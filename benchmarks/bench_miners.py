@@ -0,0 +1,487 @@
+"""
+Run the miners end-to-end against a local stand-in of the GitHub API (see github_stand_in.py), offline and without a
+GITHUB_TOKEN:
+  - search_issues: pr_mining.search_issues_for_repo over all repositories, with the PR files listing and the diff
+                   fallback for listings that fail
+  - basic_metrics: developer_effort_basic_metrics.main, with batched GraphQL and the REST fallback for truncated PRs
+  - normalized:    the comment count and time to merge crawls of developer_effort_normalized_metrics
+
+Every workload runs in its own process and reports the requests it sent (including the retries after the injected
+rate limit errors), its wall time and its peak RSS. The responses come from a synthetic world generated from SEED,
+whose ground truth the results are checked against, or from recorded fixtures (GITHUB_FIXTURES=<file>.json.gz).
+With RECORD and a GITHUB_TOKEN, the fixtures missing from that file are recorded from GitHub for the PRs of
+RECORD_PRS_CSV first.
+
+With BENCH_BASELINE=<file>.json, the measurements are saved to the file on the first run, and later runs fail if a
+workload sends more requests or takes more than MAX_SLOWDOWN times the wall time or peak RSS of the baseline.
+
+Run from the project root: python benchmarks/bench_miners.py
+"""
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data-collection'))
+
+import pr_mining  # noqa: E402
+from common.checkpoint import CheckpointStore  # noqa: E402
+from common.datasets import TIMESTAMP_FORMAT, read_table  # noqa: E402
+from common.github_client import get_client  # noqa: E402
+from github_stand_in import GITHUB_API_URL, GITHUB_DIFF_URL, Fixtures, GitHubStandIn, graphql_key, rest_key  # noqa
+from rq1 import developer_effort_basic_metrics as basic_metrics  # noqa: E402
+from rq1 import developer_effort_normalized_metrics as normalized_metrics  # noqa: E402
+from rq1.developer_effort_basic_metrics import is_impure_comment  # noqa: E402
+
+FIXTURES_FILE = os.getenv('GITHUB_FIXTURES')    # None replays a synthetic world
+BASELINE_FILE = os.getenv('BENCH_BASELINE')
+RECORD = False
+RECORD_PRS_CSV = 'data/final_version_conflict_prs.csv'
+RECORD_PRS = 50             # first PRs of RECORD_PRS_CSV, whose repositories are searched and crawled too
+RECORD_REPOS = 3
+
+LATENCY_MS = 20             # added to every response
+PAGE_SIZE = 100             # maximum items per page of the REST lists
+RATE_LIMIT_EVERY = 100      # every n-th request is answered with a 403 or 429, 0 for none
+RETRY_AFTER_S = 1
+MAX_SLOWDOWN = 1.25         # allowed wall time and peak RSS compared to the baseline
+
+# Synthetic world
+REPOS = 4
+ISSUES_PER_REPO = 300
+METRICS_PRS = 120
+MERGED_PRS_PER_REPO = 250
+SEED = 42
+
+WORKLOADS = ['search_issues', 'basic_metrics', 'normalized']
+START = datetime(2020, 1, 1, tzinfo=timezone.utc)
+HOUR = timedelta(hours=1)
+COMMENT_BODIES = ['LGTM', 'Looks good to me', 'run tests', 'rerun', '', 'Please update the version']
+
+
+def timestamp(moment):
+    return moment.strftime(TIMESTAMP_FORMAT)
+
+
+def random_moment(rng):
+    return START + timedelta(seconds=rng.randint(0, 3 * 365 * 24 * 3600))
+
+
+def random_login(rng, bot_share=0.1):
+    return 'dependabot[bot]' if rng.random() < bot_share else f"developer{rng.randint(1, 50)}"
+
+
+def diff_of(paths):
+    return ''.join(f"diff --git a/{path} b/{path}\nindex 0000000..1111111 100644\n--- a/{path}\n+++ b/{path}\n"
+                   f"@@ -1 +1 @@\n-old\n+new\n" for path in paths)
+
+
+class SyntheticWorld:
+    """Fixtures of a generated set of repositories, issues and PRs, and the results the miners should produce."""
+
+    def __init__(self, rng, directory):
+        self.rng = rng
+        self.repos = [f"owner{i}/repo{i}" for i in range(REPOS)]
+        self.prs = []
+        self.fixtures = Fixtures()
+        self.expected = {'search_issues': [], 'basic_metrics': {}, 'normalized': {'comments': {}, 'time_to_merge': {}}}
+
+        for repo in self.repos:
+            self.generate_issues(repo)
+            self.generate_merged_prs(repo)
+        self.generate_metrics_prs(directory)
+        self.expected['search_issues'].sort()
+        self.fixtures.inputs = {'repos': self.repos, 'prs': self.prs}
+
+    def generate_issues(self, repo):
+        """Issues and PRs of search_issues_for_repo, some mentioning a keyword, merged, created by bots..."""
+        rng = self.rng
+        issues = []
+        for number in range(1, ISSUES_PER_REPO + 1):
+            is_pr = rng.random() < 0.6
+            mentions_keyword = rng.random() < 0.25
+            body = f"Fixes a {rng.choice(pr_mining.KEYWORDS).upper()}" if mentions_keyword else rng.choice([None, ''])
+            issue = {
+                'number': number,
+                'title': f"Change {number}",
+                'body': body,
+                'user': {'login': random_login(rng)},
+                'html_url': f"https://github.com/{repo}/{'pull' if is_pr else 'issues'}/{number}",
+                'repository_url': f"{GITHUB_API_URL}/repos/{repo}",
+            }
+            if is_pr:
+                merged_at = timestamp(random_moment(rng)) if rng.random() < 0.7 else None
+                issue['pull_request'] = {'url': f"{GITHUB_API_URL}/repos/{repo}/pulls/{number}", 'merged_at': merged_at}
+                if mentions_keyword and merged_at and '[bot]' not in issue['user']['login']:
+                    self.generate_pr_files(repo, issue)
+            issues.append(issue)
+        self.fixtures.add(rest_key(f"repos/{repo}/issues?state=all"), issues)
+
+    def generate_pr_files(self, repo, issue):
+        """Changed files of a candidate PR. Long listings span two pages, some fail (e.g. with a 422)."""
+        rng = self.rng
+        paths = [f"src/main/java/org/example/Class{i}.java" for i in range(150 if rng.random() < 0.15 else
+                                                                            rng.randint(1, 20))]
+        if rng.random() < 0.5:
+            paths.insert(rng.randint(0, len(paths)), rng.choice(['pom.xml', 'module/pom.xml']))
+            self.expected['search_issues'].append(issue['html_url'])
+
+        number = issue['number']
+        if rng.random() < 0.05:
+            self.fixtures.add(rest_key(f"repos/{repo}/pulls/{number}/files"),
+                              {'message': 'Sorry, this diff is taking too long to generate.'}, status=422)
+            self.fixtures.add(rest_key(f"https://github.com/{repo}/pull/{number}.diff"), diff_of(paths),
+                              content_type='text/plain')
+        else:
+            self.fixtures.add(rest_key(f"repos/{repo}/pulls/{number}/files"), [{'filename': path} for path in paths])
+
+    def generate_metrics_prs(self, directory):
+        """PRs of developer_effort_basic_metrics, fetched with batched GraphQL queries or with REST if truncated."""
+        rng = self.rng
+        prs = []
+        for i in range(METRICS_PRS):
+            repo = rng.choice(self.repos)
+            number = 10_000 + i
+            created_at = random_moment(rng)
+            merged_at = created_at + timedelta(minutes=rng.randint(10, 30 * 24 * 60))
+            linked_issue = f"https://github.com/{repo}/issues/{20_000 + i}" if rng.random() < 0.4 else None
+            issue_created_at = created_at - timedelta(minutes=rng.randint(10, 10 * 24 * 60))
+            truncated = rng.random() < 0.1
+            pr = {
+                'repo': repo, 'number': number, 'created_at': created_at, 'merged_at': merged_at,
+                'linked_issue': linked_issue, 'issue_created_at': issue_created_at,
+                'comments': [self.random_comment() for _ in range(150 if truncated else rng.randint(0, 8))],
+                'reviews': [{'body': rng.choice(['', 'Approved', 'Please fix the build']),
+                             'comments': [self.random_comment() for _ in range(rng.randint(0, 3))]}
+                            for _ in range(rng.randint(0, 3))],
+                'files': [(f"src/File{j}.{rng.choice(['java', 'java', 'xml', 'md'])}", rng.randint(0, 50),
+                           rng.randint(0, 50)) for j in range(rng.randint(1, 15))],
+            }
+            self.prs.append({'pr_url': f"https://github.com/{repo}/pull/{number}", 'repository': repo,
+                             'linked_issue': linked_issue})
+            self.expected['basic_metrics'][self.prs[-1]['pr_url']] = self.expected_metrics(pr, truncated)
+            if truncated:
+                self.add_rest_metrics(pr)
+            prs.append(pr)
+
+        # The queries are built as the miner builds them, from the rows of the input table
+        rows = list(read_table(write_prs_csv(self.prs, directory)).iterrows())
+        for i in range(0, len(rows), basic_metrics.GRAPHQL_BATCH_SIZE):
+            batch = rows[i:i + basic_metrics.GRAPHQL_BATCH_SIZE]
+            data = {}
+            for (index, _), pr in zip(batch, prs[i:i + len(batch)]):
+                data[f'pr{index}'] = {'pullRequest': self.graphql_pr(pr)}
+                if pr['linked_issue']:
+                    data[f'issue{index}'] = {'issueOrPullRequest': {'createdAt': timestamp(pr['issue_created_at'])}}
+            self.fixtures.add(graphql_key(basic_metrics.build_metrics_query(batch)), {'data': data})
+
+    def random_comment(self):
+        return {'body': self.rng.choice(COMMENT_BODIES), 'login': random_login(self.rng)}
+
+    @staticmethod
+    def expected_metrics(pr, truncated):
+        review_comments = [comment for review in pr['reviews'] for comment in review['comments']]
+        metrics = {
+            'comments': len(pr['comments']) + len(review_comments) + sum(1 for review in pr['reviews']
+                                                                         if review['body']),
+            'java_code_changes': sum(added + removed for path, added, removed in pr['files'] if path.endswith('.java')),
+            'time_to_merge': (pr['merged_at'] - pr['created_at']) / HOUR,
+            'time_from_detection_to_resolution':
+                (pr['merged_at'] - pr['issue_created_at']) / HOUR if pr['linked_issue'] else None,
+        }
+        if not truncated:
+            # The REST collector only counts the impure comments of the first page of comments
+            metrics['impure_comments'] = sum(is_impure_comment(comment['body'], comment['login'])
+                                             for comment in pr['comments'] + review_comments)
+        return metrics
+
+    @staticmethod
+    def graphql_comment(comment):
+        if comment['login'].endswith('[bot]'):
+            return {'body': comment['body'], 'author': {'login': comment['login'][:-len('[bot]')], '__typename': 'Bot'}}
+        return {'body': comment['body'], 'author': {'login': comment['login'], '__typename': 'User'}}
+
+    def graphql_pr(self, pr):
+        return {
+            'additions': sum(added for _, added, _ in pr['files']),
+            'deletions': sum(removed for _, _, removed in pr['files']),
+            'createdAt': timestamp(pr['created_at']),
+            'mergedAt': timestamp(pr['merged_at']),
+            'comments': {'totalCount': len(pr['comments']),
+                         'nodes': [self.graphql_comment(comment) for comment in pr['comments'][:100]]},
+            'reviews': {'totalCount': len(pr['reviews']), 'nodes': [
+                {'body': review['body'], 'comments': {'totalCount': len(review['comments']), 'nodes': [
+                    self.graphql_comment(comment) for comment in review['comments']]}}
+                for review in pr['reviews']]},
+            'files': {'totalCount': len(pr['files']), 'nodes': [{'path': path, 'additions': added, 'deletions': removed}
+                                                                for path, added, removed in pr['files']]},
+        }
+
+    def add_rest_metrics(self, pr):
+        """The REST responses collect_metrics_rest falls back to."""
+        repo, number = pr['repo'], pr['number']
+        review_comments = [comment for review in pr['reviews'] for comment in review['comments']]
+        self.fixtures.add(rest_key(f"repos/{repo}/pulls/{number}"), {
+            'additions': sum(added for _, added, _ in pr['files']),
+            'deletions': sum(removed for _, _, removed in pr['files']),
+            'diff_url': f"https://github.com/{repo}/pull/{number}.diff",
+            'comments': len(pr['comments']),
+            'review_comments': len(review_comments),
+            'comments_url': f"{GITHUB_API_URL}/repos/{repo}/issues/{number}/comments",
+            'review_comments_url': f"{GITHUB_API_URL}/repos/{repo}/pulls/{number}/comments",
+            'created_at': timestamp(pr['created_at']),
+            'merged_at': timestamp(pr['merged_at']),
+        })
+        self.fixtures.add(rest_key(f"repos/{repo}/pulls/{number}/files"),
+                          [{'filename': path, 'additions': added, 'deletions': removed}
+                           for path, added, removed in pr['files']])
+        self.fixtures.add(rest_key(f"repos/{repo}/pulls/{number}/reviews"),
+                          [{'body': review['body']} for review in pr['reviews']])
+        for path, comments in [(f"repos/{repo}/issues/{number}/comments", pr['comments']),
+                               (f"repos/{repo}/pulls/{number}/comments", review_comments)]:
+            self.fixtures.add(rest_key(path), [{'body': comment['body'], 'user': {'login': comment['login']}}
+                                               for comment in comments])
+        if pr['linked_issue']:
+            self.fixtures.add(rest_key(f"repos/{repo}/issues/{pr['linked_issue'].split('/')[-1]}"),
+                              {'created_at': timestamp(pr['issue_created_at'])})
+
+    def generate_merged_prs(self, repo):
+        """Merged PRs of the comment count (GraphQL) and time to merge (REST) crawls of a repository."""
+        rng = self.rng
+        owner, name = repo.split('/')
+        nodes = []
+        comments = []
+        closed_prs = []
+        hours = []
+        for number in range(1, MERGED_PRS_PER_REPO + 1):
+            created_at = random_moment(rng)
+            merged_at = created_at + timedelta(minutes=rng.randint(1, 60 * 24 * 60))
+            # The first PR has more reviews than the crawl query returns, so they are paged with REVIEWS_QUERY
+            reviews = [{'body': rng.choice(['', 'Approved']), 'comments': {'totalCount': rng.randint(0, 3)}}
+                       for _ in range(130 if number == 1 else rng.randint(0, 4))]
+            nodes.append({'number': number, 'mergedAt': timestamp(merged_at), 'updatedAt': timestamp(merged_at),
+                          'comments': {'totalCount': rng.randint(0, 20)},
+                          'reviews': {'totalCount': len(reviews), 'nodes': reviews[:100]}})
+            comments.append(nodes[-1]['comments']['totalCount'] +
+                            sum(review['comments']['totalCount'] + bool(review['body']) for review in reviews))
+            if len(reviews) > 100:
+                self.add_review_pages(owner, name, number, reviews)
+            closed_prs.append({'number': None, 'created_at': timestamp(created_at),
+                               'updated_at': timestamp(merged_at), 'merged_at': timestamp(merged_at)})
+            hours.append((merged_at - created_at) / HOUR)
+            if rng.random() < 0.2:
+                closed_prs.append({'number': None, 'created_at': timestamp(created_at),
+                                   'updated_at': timestamp(merged_at), 'merged_at': None})
+
+        page_size = normalized_metrics.GRAPHQL_PAGE_SIZE
+        for start in range(0, len(nodes), page_size):
+            has_next_page = start + page_size < len(nodes)
+            variables = {'owner': owner, 'name': name, 'after': f"cursor{start}" if start else None,
+                         'field': 'CREATED_AT', 'direction': 'ASC'}
+            page_info = {'hasNextPage': has_next_page, 'endCursor': f"cursor{start + page_size}"}
+            self.fixtures.add(graphql_key(normalized_metrics.COMMENT_STATS_QUERY, variables), {'data': {'repository': {
+                'pullRequests': {'nodes': nodes[start:start + page_size], 'pageInfo': page_info}}}})
+        # Listed oldest first, and numbered in creation order as on GitHub
+        closed_prs.sort(key=lambda pr: pr['created_at'])
+        for number, pr in enumerate(closed_prs, start=1):
+            pr['number'] = number
+        self.fixtures.add(rest_key(f"repos/{repo}/pulls?state=closed&sort=created&direction=asc"), closed_prs)
+
+        self.expected['normalized']['comments'][repo] = [len(comments), float(np.mean(comments))]
+        self.expected['normalized']['time_to_merge'][repo] = [len(hours), float(np.mean(hours))]
+
+    def add_review_pages(self, owner, name, number, reviews):
+        for start in range(0, len(reviews), 100):
+            variables = {'owner': owner, 'name': name, 'number': number, 'after': f"reviews{start}" if start else None}
+            page_info = {'hasNextPage': start + 100 < len(reviews), 'endCursor': f"reviews{start + 100}"}
+            self.fixtures.add(graphql_key(normalized_metrics.REVIEWS_QUERY, variables), {'data': {'repository': {
+                'pullRequest': {'reviews': {'nodes': reviews[start:start + 100], 'pageInfo': page_info}}}}})
+
+
+def write_prs_csv(rows, directory):
+    path = os.path.join(directory, 'prs.csv')
+    pd.DataFrame(rows, columns=['pr_url', 'repository', 'linked_issue', 'detected_at', 'resolved_at']).to_csv(
+        path, index=False)
+    return path
+
+
+def record_inputs():
+    """Repositories and PRs to record the responses of, from the dataset of the study."""
+    df = read_table(RECORD_PRS_CSV, columns=['pr_url', 'repository', 'linked_issue']).head(RECORD_PRS)
+    return {'repos': list(df['repository'].unique()[:RECORD_REPOS]),
+            'prs': df.astype(object).where(df.notna(), None).to_dict('records')}
+
+
+def search_issues(inputs, directory):
+    store = CheckpointStore(os.path.join(directory, 'pr_mining_checkpoint.sqlite'))
+    store.enqueue(inputs['repos'])
+    with ThreadPoolExecutor(max_workers=pr_mining.MAX_WORKERS) as executor:
+        matches = executor.map(lambda repo: pr_mining.search_issues_for_repo(repo, store), inputs['repos'])
+        return sorted(match['pr_url'] for repo_matches in matches for match in repo_matches)
+
+
+def collect_basic_metrics(inputs, directory):
+    basic_metrics.INPUT_CSV = os.path.join(os.path.dirname(directory), 'prs.csv')
+    basic_metrics.OUTPUT_CSV = os.path.join(directory, 'result_rq1_version_conflict_prs.csv')
+    basic_metrics.main()
+
+    df = pd.read_csv(basic_metrics.OUTPUT_CSV).set_index('pr_url')
+    columns = ['comments', 'java_code_changes', 'impure_comments', 'time_to_merge', 'time_from_detection_to_resolution']
+    return {pr_url: {column: None if pd.isna(value) else float(value) for column, value in row.items()}
+            for pr_url, row in df.reindex(columns=columns).iterrows()}
+
+
+def crawl_baselines(inputs, directory):
+    df = pd.DataFrame({'repository': inputs['repos'], 'comments': 0.0, 'time_to_merge': 0.0})
+    baselines = {}
+    for metric, crawl in [('comments', normalized_metrics.concurrent_get_normalized_no_of_comments),
+                          ('time_to_merge', normalized_metrics.concurrent_get_normalized_time_to_merge)]:
+        cache_file = os.path.join(directory, f"{metric}_cache.json")
+        crawl(df, inputs['repos'], cache_file)
+        with open(cache_file) as f:
+            baselines[metric] = {repo: [entry['count'], entry['mean']] for repo, entry in json.load(f).items()}
+    return baselines
+
+
+WORKLOAD_FUNCTIONS = {'search_issues': search_issues, 'basic_metrics': collect_basic_metrics,
+                      'normalized': crawl_baselines}
+
+
+def run_workload(name, inputs, directory):
+    """
+    Run a workload in a fresh process, so its peak RSS is its own. The workload gets an empty directory for its
+    checkpoints and caches, where the output of the miners goes to output.log.
+    """
+    workload_directory = tempfile.mkdtemp(prefix=f"{name}-", dir=directory)
+    sys.stdout = sys.stderr = open(os.path.join(workload_directory, 'output.log'), 'w', buffering=1)
+    start = time.perf_counter()
+    output = WORKLOAD_FUNCTIONS[name](inputs, workload_directory)
+    wall_s = time.perf_counter() - start
+
+    summary = get_client().summary()
+    return {'output': output, 'requests': summary['requests'], 'retries': summary['retries'], 'wall_s': wall_s,
+            'rate_limit_wait_s': summary['rate_limit_wait_s'],
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+def run_workloads(stand_in, inputs, directory):
+    url = stand_in.start()
+    # Read by common.github_client when the workload processes import it
+    os.environ.update({'GITHUB_API_URL': url, 'GITHUB_DIFF_URL': url, 'GITHUB_HTTP_CACHE': '',
+                       'GITHUB_TOKEN': 'stand-in'})
+    measurements = {}
+    try:
+        for name in WORKLOADS:
+            stand_in.metrics.reset()
+            pool = multiprocessing.get_context('spawn').Pool(1)
+            try:
+                measurements[name] = pool.apply(run_workload, (name, inputs, directory))
+            finally:
+                pool.close()
+                pool.join()
+            measurements[name]['misses'] = stand_in.metrics.misses
+    finally:
+        stand_in.stop()
+    return measurements
+
+
+def record(fixtures, directory):
+    """Record the responses missing from the fixtures from GitHub, by running all workloads through a recorder."""
+    recorder = GitHubStandIn(fixtures, upstream=(GITHUB_API_URL, GITHUB_DIFF_URL), token=os.getenv('GITHUB_TOKEN'))
+    recorded_before = len(fixtures)
+    run_workloads(recorder, fixtures.inputs, directory)
+    fixtures.save(FIXTURES_FILE)
+    print(f"Recorded {len(fixtures) - recorded_before} responses to {FIXTURES_FILE} ({len(fixtures)} in total)")
+
+
+def check_results(measurements, expected):
+    """Compare the results of the workloads with the ground truth of the synthetic world."""
+    assert measurements['search_issues']['output'] == expected['search_issues'], "search_issues: matches disagree"
+
+    results = measurements['basic_metrics']['output']
+    for pr_url, metrics in expected['basic_metrics'].items():
+        for column, value in metrics.items():
+            result = results[pr_url][column]
+            assert (result is None if value is None else result is not None and np.isclose(result, value)), \
+                f"basic_metrics: {column} of {pr_url} is {result} instead of {value}"
+
+    baselines = measurements['normalized']['output']
+    for metric, repos in expected['normalized'].items():
+        for repo, (count, mean) in repos.items():
+            result_count, result_mean = baselines[metric][repo]
+            assert result_count == count and np.isclose(result_mean, mean), \
+                f"normalized: {metric} baseline of {repo} is {result_count}/{result_mean} instead of {count}/{mean}"
+
+
+def compare_with_baseline(measurements):
+    """Save the measurements as the baseline, or fail on regressions against an existing baseline."""
+    current = {name: {'requests': m['requests'] - m['retries'], 'wall_s': m['wall_s'], 'peak_rss_mb': m['peak_rss_mb']}
+               for name, m in measurements.items()}
+    if not os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, 'w') as f:
+            json.dump(current, f, indent=4)
+        print(f"Saved the baseline to {BASELINE_FILE}")
+        return
+
+    with open(BASELINE_FILE) as f:
+        baseline = json.load(f)
+    regressions = []
+    for name, measurement in current.items():
+        if name not in baseline:
+            continue
+        if measurement['requests'] > baseline[name]['requests']:
+            regressions.append(f"{name}: {measurement['requests']} requests instead of {baseline[name]['requests']}")
+        for key in ['wall_s', 'peak_rss_mb']:
+            if measurement[key] > baseline[name][key] * MAX_SLOWDOWN:
+                regressions.append(f"{name}: {key} {measurement[key]:.1f} instead of {baseline[name][key]:.1f}")
+    assert not regressions, f"Regressions against {BASELINE_FILE}:\n  " + "\n  ".join(regressions)
+    print(f"No regressions against {BASELINE_FILE}")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        if FIXTURES_FILE and (RECORD or os.path.exists(FIXTURES_FILE)):
+            if os.path.exists(FIXTURES_FILE):
+                fixtures = Fixtures.load(FIXTURES_FILE)
+            else:
+                fixtures = Fixtures(inputs=record_inputs())
+            write_prs_csv(fixtures.inputs['prs'], directory)
+            if RECORD:
+                record(fixtures, directory)
+            expected = None
+        else:
+            world = SyntheticWorld(random.Random(SEED), directory)
+            fixtures, expected = world.fixtures, world.expected
+
+        print(f"{len(fixtures)} responses, {len(fixtures.inputs['repos'])} repositories, "
+              f"{len(fixtures.inputs['prs'])} PRs; latency {LATENCY_MS} ms, {PAGE_SIZE} items per page, "
+              f"a rate limit error every {RATE_LIMIT_EVERY} requests\n")
+        stand_in = GitHubStandIn(fixtures, LATENCY_MS / 1000, PAGE_SIZE, RATE_LIMIT_EVERY, RETRY_AFTER_S)
+        measurements = run_workloads(stand_in, fixtures.inputs, directory)
+
+    print(f"{'workload':>14} {'requests':>9} {'retries':>8} {'rate limit wait (s)':>20} {'wall (s)':>9} "
+          f"{'peak RSS (MB)':>14}")
+    for name, m in measurements.items():
+        print(f"{name:>14} {m['requests']:>9} {m['retries']:>8} {m['rate_limit_wait_s']:>20.1f} {m['wall_s']:>9.2f} "
+              f"{m['peak_rss_mb']:>14.0f}")
+        if m['misses']:
+            print(f"{'':>14} {m['misses']} requests without a recorded response")
+
+    if expected is not None:
+        check_results(measurements, expected)
+    if BASELINE_FILE:
+        compare_with_baseline(measurements)
+
+
+if __name__ == "__main__":
+    main()
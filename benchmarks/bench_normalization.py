@@ -0,0 +1,90 @@
+"""
+Compare the per-repository z-score normalization of developer_effort_normalized_metrics.py:
+  - legacy:     iterrows() over the PRs and a df.at write per row
+  - vectorized: map the baseline of each repository onto the frame and compute all z-scores at once
+
+The legacy loop is skipped for the largest tables, where it takes minutes.
+
+Run from the project root: python benchmarks/bench_normalization.py
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from rq1.normalization import RepoBaseline, normalize
+
+TABLE_SIZES = [10_000, 100_000, 1_000_000, 5_000_000]
+LEGACY_MAX_SIZE = 100_000
+REPOS = 100
+SEED = 42
+
+
+def legacy_normalize(df, repo_mean, repo_std):
+    """The original normalization loop of concurrent_get_normalized_time_to_merge."""
+    for index, row in df.iterrows():
+        try:
+            repo = row['repository']
+            time_to_merge = row['time_to_merge']
+
+            mean = repo_mean.get(repo)
+            std = repo_std.get(repo)
+
+            if mean and std and std != 0:
+                df.at[index, 'time_to_merge_normalized'] = (time_to_merge - mean) / std
+
+        except Exception as e:
+            print(f"Error processing {row['pr_url']}: {e}")
+
+
+def generate_baselines(rng):
+    baselines = {}
+    for i in range(REPOS):
+        baseline = RepoBaseline()
+        baseline.push_many(rng.exponential(rng.uniform(10, 500), size=1000))
+        baselines[f"owner{i}/repo{i}"] = baseline.to_dict()
+    return baselines
+
+
+def generate_prs(size, rng):
+    repos = rng.integers(0, REPOS, size=size)
+    return pd.DataFrame({
+        'pr_url': [f"https://github.com/owner/repo/pull/{i}" for i in range(size)],
+        'repository': pd.Series([f"owner{i}/repo{i}" for i in repos]),
+        'time_to_merge': rng.exponential(100, size=size)
+    })
+
+
+def main():
+    rng = np.random.default_rng(SEED)
+    baselines = generate_baselines(rng)
+    repo_mean = {repo: entry['mean'] for repo, entry in baselines.items()}
+    repo_std = {repo: entry['std'] for repo, entry in baselines.items()}
+
+    print(f"{'PRs':>10} {'mode':>12} {'time (s)':>10} {'PRs/s':>14}")
+    for size in TABLE_SIZES:
+        df = generate_prs(size, rng)
+
+        start = time.perf_counter()
+        vectorized = normalize(df, 'time_to_merge', baselines)
+        elapsed = time.perf_counter() - start
+        print(f"{size:>10} {'vectorized':>12} {elapsed:>10.3f} {size / elapsed:>14.0f}")
+
+        for method in ['log', 'robust']:
+            start = time.perf_counter()
+            normalize(df, 'time_to_merge', baselines, method)
+            elapsed = time.perf_counter() - start
+            print(f"{size:>10} {method:>12} {elapsed:>10.3f} {size / elapsed:>14.0f}")
+
+        if size <= LEGACY_MAX_SIZE:
+            legacy_df = df.copy()
+            start = time.perf_counter()
+            legacy_normalize(legacy_df, repo_mean, repo_std)
+            elapsed = time.perf_counter() - start
+            print(f"{size:>10} {'legacy':>12} {elapsed:>10.3f} {size / elapsed:>14.0f}")
+
+            assert np.allclose(legacy_df['time_to_merge_normalized'], vectorized), "Modes disagree"
+
+
+if __name__ == "__main__":
+    main()
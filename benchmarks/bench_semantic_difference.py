@@ -0,0 +1,94 @@
+"""
+Compare the ways of classifying the semantic difference of (used, omitted) version pairs, on a synthetic stream of
+pairs that repeats a limited set of distinct pairs, as the trees of large multi-module builds do:
+  - legacy:   Version.parse of both versions for every pair, inside a try/except
+  - memoized: semantic_difference, with interned versions and an LRU cache of the pairs
+  - batch:    classify_pairs on the whole arrays of pairs
+
+The share of INVALID pairs is printed for the strict SemVer and the tolerant Maven version schemes.
+
+Run from the project root: python benchmarks/bench_semantic_difference.py
+"""
+import random
+import time
+
+from semver import Version
+
+from rq2.compute_semantic_difference import classify_pairs, semantic_difference
+
+PAIRS = 1_000_000
+DISTINCT_ARTIFACTS = 2_000
+SEED = 42
+
+# Version styles seen in Maven Central, e.g. 5.4.2.Final, 32.1.0-jre, 2.0.0.RELEASE, 1.2.3.4
+VERSION_STYLES = [
+    lambda r: f"{r.randint(0, 9)}.{r.randint(0, 20)}.{r.randint(0, 20)}",
+    lambda r: f"{r.randint(0, 9)}.{r.randint(0, 20)}",
+    lambda r: f"{r.randint(0, 9)}.{r.randint(0, 20)}.{r.randint(0, 20)}-SNAPSHOT",
+    lambda r: f"{r.randint(0, 9)}.{r.randint(0, 20)}.{r.randint(0, 20)}.Final",
+    lambda r: f"{r.randint(20, 33)}.{r.randint(0, 2)}-jre",
+    lambda r: f"{r.randint(0, 9)}.{r.randint(0, 20)}.{r.randint(0, 20)}.RELEASE",
+    lambda r: f"{r.randint(0, 9)}.{r.randint(0, 20)}.{r.randint(0, 20)}.{r.randint(0, 9)}",
+]
+
+
+def legacy_semantic_difference(v1, v2):
+    """The original implementation of semantic_difference."""
+    try:
+        v1_parsed = Version.parse(v1, optional_minor_and_patch=True)
+        v2_parsed = Version.parse(v2, optional_minor_and_patch=True)
+
+        if v1_parsed.major != v2_parsed.major:
+            return "MAJOR"
+        elif v1_parsed.minor != v2_parsed.minor:
+            return "MINOR"
+        elif v1_parsed.patch != v2_parsed.patch:
+            return "PATCH"
+        else:
+            return "OTHER"
+
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def generate_pairs(rng):
+    distinct = []
+    for _ in range(DISTINCT_ARTIFACTS):
+        style = rng.choice(VERSION_STYLES)
+        distinct.append((style(rng), style(rng)))
+    pairs = [rng.choice(distinct) for _ in range(PAIRS)]
+    return [p[0] for p in pairs], [p[1] for p in pairs]
+
+
+def legacy(used, omitted):
+    return [d if isinstance(d, str) else "INVALID" for d in map(legacy_semantic_difference, used, omitted)]
+
+
+def memoized(used, omitted):
+    return [semantic_difference(v1, v2, 'semver') for v1, v2 in zip(used, omitted)]
+
+
+def batch(used, omitted):
+    return list(classify_pairs(used, omitted, 'semver'))
+
+
+def main():
+    used, omitted = generate_pairs(random.Random(SEED))
+    print(f"{'mode':>10} {'time (s)':>10} {'pairs/s':>14}")
+
+    results = {}
+    for name, function in [('legacy', legacy), ('memoized', memoized), ('batch', batch)]:
+        start = time.perf_counter()
+        results[name] = function(used, omitted)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>10} {elapsed:>10.3f} {PAIRS / elapsed:>14.0f}")
+
+    assert results['legacy'] == results['memoized'] == results['batch'], "Classifications disagree"
+
+    for scheme in ['semver', 'maven']:
+        invalid = (classify_pairs(used, omitted, scheme) == "INVALID").mean()
+        print(f"INVALID pairs with the {scheme} scheme: {invalid:.1%}")
+
+
+if __name__ == "__main__":
+    main()
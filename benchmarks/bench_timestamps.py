@@ -0,0 +1,109 @@
+"""
+Compare the duration computations of RQ1 on a synthetic table of merged PRs:
+  - durations: time_to_merge and time_from_detection_to_resolution of every PR, computed row by row with
+    datetime.strptime (legacy) or with compute_durations over whole datetime64 columns (vectorized)
+  - baseline:  merge times of the pages of 100 PRs returned by the pulls listing, parsed with strptime and pushed into
+    RunningStats one by one (legacy) or parsed per page and folded as arrays (vectorized)
+
+Run from the project root: python benchmarks/bench_timestamps.py
+"""
+import random
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from common.datasets import TIMESTAMP_FORMAT, timestamp_array
+from rq1.developer_effort_basic_metrics import compute_durations
+from rq1.developer_effort_normalized_metrics import HOUR
+from rq1.running_stats import RunningStats
+
+TABLE_SIZE = 1_000_000
+PAGE_SIZE = 100
+SEED = 42
+
+
+def generate_timestamps(size, rng):
+    start = datetime(2015, 4, 1)
+    created = [start + timedelta(seconds=rng.randint(0, 10 * 365 * 86400)) for _ in range(size)]
+    merged = [c + timedelta(seconds=rng.randint(60, 90 * 86400)) for c in created]
+    detected = [c - timedelta(seconds=rng.randint(0, 30 * 86400)) if rng.random() < 0.5 else None for c in created]
+
+    def fmt(values):
+        return [v.strftime(TIMESTAMP_FORMAT) if v else None for v in values]
+
+    return fmt(created), fmt(merged), fmt(detected)
+
+
+def legacy_durations(created, merged, detected):
+    """The per-PR computation of the original set_durations."""
+    time_to_merge = []
+    time_from_detection = []
+    for created_at, resolved_at, detected_at in zip(created, merged, detected):
+        resolved_at_dt = datetime.strptime(resolved_at, "%Y-%m-%dT%H:%M:%SZ")
+        created_at_dt = datetime.strptime(created_at, "%Y-%m-%dT%H:%M:%SZ")
+        time_to_merge.append((resolved_at_dt - created_at_dt).total_seconds() / 3600)
+
+        if detected_at is not None:
+            detected_at_dt = datetime.strptime(detected_at, "%Y-%m-%dT%H:%M:%SZ")
+            time_from_detection.append((resolved_at_dt - detected_at_dt).total_seconds() / 3600)
+        else:
+            time_from_detection.append(np.nan)
+    return np.array(time_to_merge), np.array(time_from_detection)
+
+
+def vectorized_durations(created, merged, detected):
+    df = pd.DataFrame({
+        'linked_issue': ['https://github.com/owner/repo/issues/1'] * len(created),
+        'detected_at': pd.Series(pd.NaT, index=range(len(created)), dtype='datetime64[ns, UTC]'),
+        'resolved_at': pd.Series(pd.NaT, index=range(len(created)), dtype='datetime64[ns, UTC]'),
+    })
+    compute_durations(df, dict(enumerate(zip(created, merged, detected))))
+    return df['time_to_merge'].to_numpy(float), df['time_from_detection_to_resolution'].to_numpy(float)
+
+
+def legacy_baseline(created, merged):
+    stats = RunningStats()
+    for created_at, merged_at in zip(created, merged):
+        created_at_dt = datetime.strptime(created_at, "%Y-%m-%dT%H:%M:%SZ")
+        merged_at_dt = datetime.strptime(merged_at, "%Y-%m-%dT%H:%M:%SZ")
+        stats.push((merged_at_dt - created_at_dt).total_seconds() / 3600)
+    return stats
+
+
+def vectorized_baseline(created, merged):
+    stats = RunningStats()
+    for start in range(0, len(created), PAGE_SIZE):
+        hours = (timestamp_array(merged[start:start + PAGE_SIZE]) -
+                 timestamp_array(created[start:start + PAGE_SIZE])) / HOUR
+        stats.push_many(hours)
+    return stats
+
+
+def measure(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    created, merged, detected = generate_timestamps(TABLE_SIZE, random.Random(SEED))
+    print(f"{'stage':>10} {'mode':>12} {'time (s)':>10} {'PRs/s':>14}")
+
+    results = {}
+    for stage, mode, function, args in [('durations', 'legacy', legacy_durations, (created, merged, detected)),
+                                        ('durations', 'vectorized', vectorized_durations, (created, merged, detected)),
+                                        ('baseline', 'legacy', legacy_baseline, (created, merged)),
+                                        ('baseline', 'vectorized', vectorized_baseline, (created, merged))]:
+        results[stage, mode], elapsed = measure(function, *args)
+        print(f"{stage:>10} {mode:>12} {elapsed:>10.3f} {TABLE_SIZE / elapsed:>14.0f}")
+
+    for legacy, vectorized in zip(results['durations', 'legacy'], results['durations', 'vectorized']):
+        assert np.allclose(legacy, vectorized, equal_nan=True), "Durations disagree"
+    legacy, vectorized = results['baseline', 'legacy'], results['baseline', 'vectorized']
+    assert np.isclose(legacy.mean, vectorized.mean) and np.isclose(legacy.std, vectorized.std), "Baselines disagree"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+Local stand-in for the GitHub REST, GraphQL and diff endpoints, used to run the miners offline.
+
+It replays recorded responses (Fixtures), adding a fixed latency to each response, paginating the JSON arrays of the
+REST list endpoints with Link headers, and answering every n-th request with a 403 or 429 rate limit error. With an
+upstream, responses missing from the fixtures are fetched from GitHub and recorded, so a run against the real API
+produces the fixtures of the next offline runs.
+
+Point the clients at it with GITHUB_API_URL and GITHUB_DIFF_URL (both the URL of the stand-in).
+"""
+import gzip
+import hashlib
+import json
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+
+GITHUB_API_URL = 'https://api.github.com'
+GITHUB_DIFF_URL = 'https://patch-diff.githubusercontent.com'
+DEFAULT_PER_PAGE = 30       # as GitHub, for list requests without per_page
+MAX_PER_PAGE = 100
+RATE_LIMIT = 5000
+
+PAGINATION_PARAMS = {'page', 'per_page'}
+# diff_url of a PR, which github.com redirects to the diff host
+PR_DIFF_URL = re.compile(r'https://github\.com/([^/"\s]+/[^/"\s]+/pull/\d+\.diff)')
+PR_DIFF_PATH = re.compile(r'^/[^/]+/[^/]+/pull/\d+\.diff$')
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients drop their keep-alive connections when their process exits
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def request_key(method, path, query=(), body=None):
+    """
+    Key of the recorded response of a request: the method, path and query without the pagination parameters, and
+    for GraphQL the hash of the query and its variables.
+    """
+    if method == 'POST' and path.rstrip('/').endswith('/graphql'):
+        payload = json.loads(body) if isinstance(body, (bytes, str)) else body
+        digest = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+        return f"POST /graphql {digest}"
+    if PR_DIFF_PATH.match(path):
+        path = f"/raw{path}"
+    params = sorted((name, value) for name, value in query if name not in PAGINATION_PARAMS)
+    return f"{method} {path}{'?' + urlencode(params) if params else ''}"
+
+
+def graphql_key(query, variables=None):
+    """Key of a GraphQL request as GitHubClient.graphql sends it."""
+    payload = {'query': query}
+    if variables:
+        payload['variables'] = variables
+    return request_key('POST', '/graphql', body=payload)
+
+
+def rest_key(url):
+    """Key of a GET request of an absolute GitHub API URL or of a path such as repos/{owner}/{repo}/issues?state=all."""
+    parts = urlsplit(url if '://' in url else f"{GITHUB_API_URL}/{url.lstrip('/')}")
+    return request_key('GET', parts.path, parse_qsl(parts.query))
+
+
+class Fixtures:
+    """
+    Recorded responses by request key, each {'status', 'content_type', 'body'}, and the inputs of the runs that
+    recorded them. JSON arrays of REST list endpoints are stored whole and paginated when they are replayed.
+    """
+
+    def __init__(self, responses=None, inputs=None):
+        self.responses = responses or {}
+        self.inputs = inputs or {}
+        self._lock = threading.Lock()
+
+    def add(self, key, body, status=200, content_type='application/json'):
+        with self._lock:
+            self.responses[key] = {'status': status, 'content_type': content_type, 'body': body}
+
+    def get(self, key):
+        return self.responses.get(key)
+
+    def __len__(self):
+        return len(self.responses)
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, 'rt') as f:
+            data = json.load(f)
+        return cls(data['responses'], data['inputs'])
+
+    def save(self, path):
+        with self._lock, gzip.open(path, 'wt') as f:
+            json.dump({'inputs': self.inputs, 'responses': self.responses}, f)
+
+
+class StandInMetrics:
+    """Thread-safe request counters of the stand-in."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.rate_limited = 0
+            self.misses = 0
+            self.recorded = 0
+            self.bytes_sent = 0
+
+    def count(self, name, value=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + value)
+            return getattr(self, name)
+
+
+class GitHubStandIn:
+    """
+    HTTP server answering the requests of the miners from Fixtures.
+
+    latency is added to every response (in seconds), REST lists are served with at most page_size items per page,
+    and every rate_limit_every-th request (0 for none) is answered alternately with a primary rate limit error (403,
+    X-RateLimit-Remaining: 0) and a secondary one (429, Retry-After), both lifted after retry_after seconds.
+    """
+
+    def __init__(self, fixtures, latency=0.0, page_size=MAX_PER_PAGE, rate_limit_every=0, retry_after=1,
+                 upstream=None, token=None):
+        self.fixtures = fixtures
+        self.latency = latency
+        self.page_size = page_size
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.upstream = upstream    # (API URL, diff URL) to record missing responses from
+        self.metrics = StandInMetrics()
+        self.url = None
+        self._server = None
+        self._session = requests.Session()
+        if token:
+            self._session.headers['Authorization'] = f'Bearer {token}'
+
+    def start(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'   # keep-alive, as GitHub
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                self.respond(*stand_in.handle('GET', self.path))
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                self.respond(*stand_in.handle('POST', self.path, body))
+
+            def respond(self, status, headers, payload):
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self._server = StandInServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def handle(self, method, path_and_query, body=None):
+        number = self.metrics.count('requests')
+        if self.latency:
+            time.sleep(self.latency)
+
+        parts = urlsplit(path_and_query)
+        query = parse_qsl(parts.query)
+        resource = 'graphql' if parts.path == '/graphql' else 'search' if parts.path.startswith('/search/') else 'core'
+        if self.rate_limit_every and number % self.rate_limit_every == 0:
+            self.metrics.count('rate_limited')
+            return self.rate_limit_error(resource, number // self.rate_limit_every)
+
+        key = request_key(method, parts.path, query, body)
+        fixture = self.fixtures.get(key)
+        if fixture is None and self.upstream:
+            fixture = self.record(key, method, parts.path, query, body)
+        if fixture is None:
+            self.metrics.count('misses')
+            print(f"No fixture for {key}")
+            return self.json_response(404, {'message': 'Not Found'}, resource)
+
+        content = fixture['body']
+        headers = {}
+        if method == 'GET' and fixture['status'] == 200 and isinstance(content, list):
+            content, headers = self.paginate(parts.path, query, content)
+        if fixture['content_type'] != 'application/json':
+            return self.send(fixture['status'], content.encode(), fixture['content_type'], resource, headers)
+        return self.json_response(fixture['status'], content, resource, headers)
+
+    def paginate(self, path, query, items):
+        """One page of a list, with the Link header GitHub sends (rel="next" and rel="last")."""
+        params = dict(query)
+        per_page = min(int(params.get('per_page', DEFAULT_PER_PAGE)), MAX_PER_PAGE, self.page_size)
+        page = int(params.get('page', 1))
+        last_page = max(1, -(-len(items) // per_page))
+
+        def page_url(number):
+            return f"{self.url}{path}?{urlencode({**params, 'page': number})}"
+
+        links = []
+        if page < last_page:
+            links.append(f'<{page_url(page + 1)}>; rel="next"')
+        if last_page > 1:
+            links.append(f'<{page_url(last_page)}>; rel="last"')
+        headers = {'Link': ', '.join(links)} if links else {}
+        return items[(page - 1) * per_page:page * per_page], headers
+
+    def rate_limit_error(self, resource, number):
+        if number % 2:
+            headers = {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': str(int(time.time()) + self.retry_after)}
+            return self.json_response(403, {'message': 'API rate limit exceeded'}, resource, headers)
+        return self.json_response(429, {'message': 'You have exceeded a secondary rate limit'}, resource,
+                                  {'Retry-After': str(self.retry_after)})
+
+    def json_response(self, status, content, resource, headers=None):
+        # Absolute GitHub URLs in the responses (next pages, comments_url, diff_url, ...) point to the stand-in
+        text = json.dumps(content).replace(GITHUB_API_URL, self.url)
+        text = PR_DIFF_URL.sub(lambda match: f"{self.url}/raw/{match.group(1)}", text)
+        return self.send(status, text.encode(), 'application/json; charset=utf-8', resource, headers)
+
+    def send(self, status, payload, content_type, resource, headers=None):
+        self.metrics.count('bytes_sent', len(payload))
+        return status, {
+            'Content-Type': content_type,
+            'X-RateLimit-Limit': str(RATE_LIMIT),
+            'X-RateLimit-Remaining': str(RATE_LIMIT - 1),
+            'X-RateLimit-Reset': str(int(time.time()) + 3600),
+            'X-RateLimit-Resource': resource,
+            **(headers or {}),
+        }, payload
+
+    def record(self, key, method, path, query, body):
+        """Fetch a missing response from GitHub and add it to the fixtures. Lists are fetched with all their pages."""
+        api_url, diff_url = self.upstream
+        if method == 'POST':
+            response = self._session.post(f"{api_url}{path}", data=body)
+            fixture_body = response.json()
+        elif key.startswith('GET /raw/'):
+            response = self._session.get(f"{diff_url}{key[len('GET '):]}")
+            fixture_body = response.text
+        else:
+            params = [(name, value) for name, value in query if name not in PAGINATION_PARAMS]
+            response = self._session.get(f"{api_url}{path}", params=params + [('per_page', MAX_PER_PAGE)])
+            fixture_body = response.json() if response.ok else {'message': response.text}
+            while response.ok and isinstance(fixture_body, list) and 'next' in response.links:
+                response = self._session.get(response.links['next']['url'])
+                fixture_body += response.json()
+
+        content_type = 'application/json' if method == 'POST' or not key.startswith('GET /raw/') else 'text/plain'
+        if content_type == 'application/json' and api_url != GITHUB_API_URL:
+            # Recorded from another stand-in: store the URLs as GitHub sends them, they are rewritten when replayed
+            text = json.dumps(fixture_body).replace(f"{api_url}/raw/", 'https://github.com/')
+            fixture_body = json.loads(text.replace(api_url, GITHUB_API_URL))
+        self.fixtures.add(key, fixture_body, response.status_code, content_type)
+        self.metrics.count('recorded')
+        return self.fixtures.get(key)
@@ -0,0 +1,193 @@
+import asyncio
+import json
+import time
+from collections import defaultdict
+
+import aiohttp
+
+from common.github_client import (BACKOFF_BASE, GITHUB_TOKEN, MAX_RETRIES, ClientMetrics, RateLimitBucket, api_url,
+                                  print_summary, resource_for_url)
+
+CONCURRENCY = 50        # requests in flight across all repositories and pages
+STREAM_CHUNK_SIZE = 64 * 1024
+MAX_LINE_LENGTH = 64 * 1024     # longer lines of a streamed body (e.g. minified files) are cut off
+
+
+class AsyncResponse:
+    """The parts of an aiohttp response the miners need, read while the connection was still open."""
+
+    def __init__(self, status, headers, body, links, matched=None):
+        self.status_code = status
+        self.headers = headers
+        self.body = body
+        self.links = links          # {rel: url} from the Link header
+        self.matched = matched      # result of a streamed line scan, see AsyncGitHubClient.request
+
+    @property
+    def next_url(self):
+        return self.links.get('next')
+
+    @property
+    def text(self):
+        return self.body.decode(errors='replace')
+
+    def json(self):
+        return json.loads(self.body)
+
+
+async def stream_lines(content):
+    """
+    Yield the lines of a streamed body without the line break. aiohttp's own line iterator raises ValueError on lines
+    longer than its buffer, so the chunks are split here, and only the first MAX_LINE_LENGTH bytes of a longer line
+    are yielded.
+    """
+    remainder = b''
+    cut_off = False     # the rest of a cut off line is skipped up to its end
+    async for chunk in content.iter_chunked(STREAM_CHUNK_SIZE):
+        lines = (remainder + chunk).split(b'\n')
+        remainder = lines.pop()
+        for line in lines:
+            if cut_off:
+                cut_off = False
+                continue
+            yield line
+        if len(remainder) > MAX_LINE_LENGTH:
+            if not cut_off:
+                yield remainder[:MAX_LINE_LENGTH]
+                cut_off = True
+            remainder = b''
+    if remainder and not cut_off:
+        yield remainder
+
+
+class AsyncGitHubClient:
+    """
+    asyncio counterpart of GitHubClient.
+
+    All requests share one aiohttp connection pool, one global concurrency limit and the same RateLimitBucket
+    logic as the threaded client, so many repositories and pages can be fetched at once without exceeding the quota.
+    """
+
+    def __init__(self, token=GITHUB_TOKEN, concurrency=CONCURRENCY, max_retries=MAX_RETRIES):
+        self.token = token
+        self.max_retries = max_retries
+        self.metrics = ClientMetrics()
+        self.buckets = defaultdict(RateLimitBucket)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.session = None
+        self._concurrency = concurrency
+
+    async def __aenter__(self):
+        self.session = aiohttp.ClientSession(
+            headers={
+                'Authorization': f'Bearer {self.token}',
+                'Accept': 'application/vnd.github+json'
+            },
+            connector=aiohttp.TCPConnector(limit=self._concurrency)
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+
+    async def _acquire(self, bucket):
+        waited = 0.0
+        while (wait := bucket.reserve()) > 0:
+            await asyncio.sleep(wait)
+            waited += wait
+        self.metrics.record_wait(waited)
+
+    @staticmethod
+    def _is_rate_limited(status, headers, body):
+        if status == 429:
+            return True
+        if status != 403:
+            return False
+        return (headers.get('X-RateLimit-Remaining') == '0' or
+                'Retry-After' in headers or
+                b'rate limit' in body.lower())
+
+    async def request(self, method, url, line_predicate=None, **kwargs):
+        """
+        Send a request with rate limit handling and return an AsyncResponse (whatever its status code), or None if
+        the request could not be sent. With a line_predicate, the body is streamed line by line instead of being
+        read, and the response is closed as soon as a line matches (response.matched tells whether one did).
+        """
+        bucket = self.buckets[resource_for_url(url)]
+
+        result = None
+        for attempt in range(self.max_retries):
+            await self._acquire(bucket)
+
+            start = time.perf_counter()
+            try:
+                async with self.semaphore, self.session.request(method, url, **kwargs) as response:
+                    body, matched = b'', None
+                    if line_predicate is not None and response.status == 200:
+                        matched = False
+                        async for line in stream_lines(response.content):
+                            if line_predicate(line.rstrip(b'\r')):
+                                matched = True
+                                break
+                    else:
+                        body = await response.read()
+                    links = {rel: str(link['url']) for rel, link in response.links.items()}
+                    result = AsyncResponse(response.status, response.headers, body, links, matched)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"Request to {url} failed: {e}")
+                self.metrics.record_retry()
+                await asyncio.sleep(BACKOFF_BASE ** attempt)
+                continue
+            latency = time.perf_counter() - start
+
+            resource = result.headers.get('X-RateLimit-Resource', resource_for_url(url))
+            bucket = self.buckets[resource]
+            bucket.update(result.headers)
+            self.metrics.record(resource, result.status_code, latency)
+
+            if not self._is_rate_limited(result.status_code, result.headers, result.body):
+                return result
+
+            self.metrics.record_retry()
+            if 'Retry-After' not in result.headers and result.headers.get('X-RateLimit-Remaining') != '0':
+                bucket.block_for(BACKOFF_BASE ** attempt)
+            print(f"Rate limit reached ({result.status_code}) for {url}, waiting for the quota to reset...")
+
+        return result
+
+    async def get(self, url, params=None, **kwargs):
+        """Make a GET request and return the response if it succeeded, otherwise None."""
+        response = await self.request('GET', url, params=params, **kwargs)
+        if response is None:
+            return None
+        if response.status_code != 200:
+            print(f"Request failed: {response.status_code} - {response.text}")
+            return None
+        return response
+
+    async def any_line(self, url, predicate):
+        """Stream the body of a GET request and return True as soon as a line matches, or None if the request failed."""
+        response = await self.get(url, line_predicate=predicate)
+        if response is None:
+            return None
+        return response.matched
+
+    async def graphql(self, query, variables=None):
+        """Run a GraphQL query and return its 'data' object, or None if the query failed."""
+        payload = {'query': query}
+        if variables:
+            payload['variables'] = variables
+
+        response = await self.request('POST', api_url('graphql'), json=payload)
+        if response is None:
+            return None
+        if response.status_code != 200 or response.json().get('errors'):
+            print(f"GraphQL query failed: {response.status_code} - {response.text}")
+            return None
+        return response.json()['data']
+
+    def summary(self):
+        return self.metrics.summary(self.buckets)
+
+    def print_summary(self):
+        print_summary(self.summary())
@@ -0,0 +1,106 @@
+import json
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS work (
+    item TEXT PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'pending',     -- pending, done or failed
+    cursor TEXT,                                -- where to continue, e.g. the URL of the next page
+    result TEXT,                                -- JSON result of a finished item
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS matches (
+    key TEXT PRIMARY KEY,
+    item TEXT NOT NULL,
+    data TEXT NOT NULL,
+    found_at REAL
+);
+"""
+
+
+def open_database(path, schema=None):
+    """Open an SQLite database in WAL mode, so readers never block the (single) writer."""
+    connection = sqlite3.connect(path, timeout=60)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    if schema:
+        connection.executescript(schema)
+    return connection
+
+
+class CheckpointStore:
+    """
+    Durable work queue for long mining runs.
+
+    Every work item (e.g. a repository) has a status and a cursor that is updated after each processed page,
+    and matches are appended as soon as they are found. A restarted run only processes the items that are
+    not done yet and continues each of them from its last cursor.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        open_database(path, SCHEMA).close()
+
+    @property
+    def db(self):
+        # sqlite3 connections cannot be shared between threads, so each thread gets its own
+        if not hasattr(self._local, 'connection'):
+            self._local.connection = open_database(self.path)
+        return self._local.connection
+
+    def enqueue(self, items):
+        """Add work items; items that are already known keep their status and cursor."""
+        with self.db:
+            self.db.executemany("INSERT OR IGNORE INTO work (item, updated_at) VALUES (?, ?)",
+                                [(item, time.time()) for item in items])
+
+    def pending_items(self, items=None):
+        """Return the items that are not done yet (in insertion order), optionally restricted to the given items."""
+        rows = self.db.execute("SELECT item FROM work WHERE status != 'done' ORDER BY rowid").fetchall()
+        pending = [row[0] for row in rows]
+        if items is not None:
+            items = set(items)
+            pending = [item for item in pending if item in items]
+        return pending
+
+    def get_cursor(self, item):
+        row = self.db.execute("SELECT cursor FROM work WHERE item = ?", (item,)).fetchone()
+        return row[0] if row else None
+
+    def checkpoint(self, item, cursor, matches=()):
+        """Atomically store the matches found so far and the cursor to continue from."""
+        now = time.time()
+        with self.db:
+            self.db.executemany("INSERT OR IGNORE INTO matches (key, item, data, found_at) VALUES (?, ?, ?, ?)",
+                                [(key, item, json.dumps(data), now) for key, data in matches])
+            self.db.execute("UPDATE work SET cursor = ?, updated_at = ? WHERE item = ?", (cursor, now, item))
+
+    def mark_done(self, item, result=None):
+        with self.db:
+            self.db.execute("UPDATE work SET status = 'done', cursor = NULL, result = ?, error = NULL, "
+                            "attempts = attempts + 1, updated_at = ? WHERE item = ?",
+                            (json.dumps(result), time.time(), item))
+
+    def mark_failed(self, item, error):
+        """Mark an item as failed. It keeps its cursor and is retried by the next run."""
+        with self.db:
+            self.db.execute("UPDATE work SET status = 'failed', error = ?, attempts = attempts + 1, updated_at = ? "
+                            "WHERE item = ?", (str(error), time.time(), item))
+
+    def results(self):
+        """Return {item: result} for all finished items."""
+        rows = self.db.execute("SELECT item, result FROM work WHERE status = 'done'").fetchall()
+        return {item: json.loads(result) for item, result in rows}
+
+    def matches(self):
+        rows = self.db.execute("SELECT data FROM matches ORDER BY found_at, rowid").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def progress(self):
+        """Return the number of items per status."""
+        return dict(self.db.execute("SELECT status, COUNT(*) FROM work GROUP BY status").fetchall())
@@ -0,0 +1,118 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401 (used by pandas for Parquet)
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+TIMESTAMP_PATTERN = r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}Z'
+
+FILTER_OPERATORS = {
+    '==': lambda column, value: column == value,
+    '!=': lambda column, value: column != value,
+    '<': lambda column, value: column < value,
+    '<=': lambda column, value: column <= value,
+    '>': lambda column, value: column > value,
+    '>=': lambda column, value: column >= value,
+    'in': lambda column, value: column.isin(value),
+    'not in': lambda column, value: ~column.isin(value),
+}
+
+
+def parquet_path(path):
+    """The Parquet copy of a dataset lives next to its CSV file, e.g. data/repos.csv -> data/repos.parquet."""
+    return os.path.splitext(path)[0] + '.parquet'
+
+
+def timestamp_array(values):
+    """Parse GitHub timestamps (2024-11-28T14:26:55Z, always UTC) into a datetime64 array. Missing values become NaT."""
+    return np.array([value[:19] if isinstance(value, str) else 'NaT' for value in values], dtype='datetime64[s]')
+
+
+def to_timestamps(values):
+    """Parse GitHub timestamps into a datetime64 Series in UTC, keeping the index of a Series."""
+    if isinstance(values, pd.Series) and values.dtype != object:
+        # Already parsed, or a column without any value
+        return pd.to_datetime(values, utc=True)
+
+    index = values.index if isinstance(values, pd.Series) else None
+    return pd.Series(timestamp_array(values), index=index).dt.tz_localize('UTC')
+
+
+def parse_timestamps(df):
+    """Convert the text columns holding GitHub timestamps to datetime64 columns in UTC."""
+    for column in df.columns[df.dtypes == object]:
+        values = df[column].dropna()
+        if len(values) > 0 and values.astype(str).str.fullmatch(TIMESTAMP_PATTERN).all():
+            df[column] = to_timestamps(df[column])
+    return df
+
+
+def format_timestamps(df):
+    """Inverse of parse_timestamps, so CSV files keep the GitHub timestamp format."""
+    df = df.copy()
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.DatetimeTZDtype):
+            df[column] = df[column].dt.strftime(TIMESTAMP_FORMAT)
+    return df
+
+
+def apply_filters(df, filters):
+    """Apply [(column, operator, value)] predicates (the Parquet filter syntax) to a loaded data frame."""
+    mask = pd.Series(True, index=df.index)
+    for column, operator, value in filters:
+        mask &= FILTER_OPERATORS[operator](df[column], value)
+    return df[mask]
+
+
+def is_parquet_current(path):
+    parquet = parquet_path(path)
+    return os.path.exists(parquet) and (not os.path.exists(path) or os.path.getmtime(parquet) >= os.path.getmtime(path))
+
+
+def read_table(path, columns=None, filters=None):
+    """
+    Load a dataset stored as CSV and/or Parquet, with GitHub timestamps as datetime64 columns.
+
+    Only the given columns are loaded, and only the rows matching all filters, e.g. [('name', 'in', repos)]. If the
+    Parquet copy is at least as new as the CSV file, the projection and filters are pushed down to the Parquet reader.
+    Otherwise, only the needed columns of the CSV file are parsed. Reading never writes a file, see convert_table.
+    """
+    filters = [tuple(f) for f in filters or []]
+
+    if HAS_PYARROW and is_parquet_current(path):
+        return pd.read_parquet(parquet_path(path), columns=columns, filters=filters or None)
+
+    usecols = None if columns is None else list(dict.fromkeys(list(columns) + [f[0] for f in filters]))
+    df = parse_timestamps(pd.read_csv(path, usecols=usecols))
+
+    if filters:
+        df = apply_filters(df, filters).reset_index(drop=True)
+    return df if columns is None else df[list(columns)]
+
+
+def convert_table(path):
+    """Write the typed Parquet copy of a CSV dataset, so the next loads of it only read what they need."""
+    if not HAS_PYARROW:
+        raise RuntimeError("Converting datasets to Parquet requires pyarrow")
+    parse_timestamps(pd.read_csv(path)).to_parquet(parquet_path(path), index=False)
+    print(f"Converted {path} to {parquet_path(path)}")
+
+
+def write_table(df, path):
+    """Write a dataset as CSV, the format published with the study, and as typed Parquet for faster loading."""
+    format_timestamps(df).to_csv(path, index=False)
+    if HAS_PYARROW:
+        parse_timestamps(df.copy()).to_parquet(parquet_path(path), index=False)
+
+
+if __name__ == "__main__":
+    # python -m common.datasets data/*.csv
+    for csv_path in sys.argv[1:]:
+        convert_table(csv_path)
@@ -0,0 +1,343 @@
+import os
+import threading
+import time
+from collections import defaultdict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from common.http_cache import HTTP_CACHE_DB, HttpCache
+
+# In the run configuration, you need to set the GITHUB_TOKEN environment variable to your GitHub Personal Access Token
+GITHUB_TOKEN = os.getenv('GITHUB_TOKEN')
+GITHUB_API_URL = os.getenv('GITHUB_API_URL', 'https://api.github.com').rstrip('/')
+GITHUB_DIFF_URL = os.getenv('GITHUB_DIFF_URL', 'https://patch-diff.githubusercontent.com').rstrip('/')
+POOL_SIZE = 32        # keep-alive connections per host
+MAX_RETRIES = 5
+BACKOFF_BASE = 2      # seconds, used when GitHub does not tell us how long to wait
+MAX_PR_FILES = 3000   # the PR files listing silently stops after this many files
+
+HEADERS = {
+    'Authorization': f'Bearer {GITHUB_TOKEN}',
+    'Accept': 'application/vnd.github+json'
+}
+
+
+def api_url(path):
+    """Build an absolute GitHub REST API URL from a path like 'repos/{owner}/{repo}'."""
+    return f"{GITHUB_API_URL}/{path.lstrip('/')}"
+
+
+def resource_for_url(url):
+    """Guess which GitHub rate limit bucket a request is charged against."""
+    if not url.startswith(GITHUB_API_URL):
+        return 'other'
+    if url.startswith(f"{GITHUB_API_URL}/graphql"):
+        return 'graphql'
+    if url.startswith(f"{GITHUB_API_URL}/search/"):
+        return 'search'
+    return 'core'
+
+
+class RateLimitBucket:
+    """
+    Token bucket mirroring the quota GitHub reports for one rate limit resource.
+
+    The bucket holds the number of requests left until the next reset. Every request takes a token, and the
+    X-RateLimit-Remaining/X-RateLimit-Reset headers of each response correct the local count. When the bucket is
+    empty, callers wait until the reset time instead of sleeping blindly and retrying.
+    """
+
+    def __init__(self, capacity=None):
+        self.capacity = capacity    # None until GitHub tells us the limit
+        self.tokens = capacity
+        self.reset_at = 0.0
+        self.blocked_until = 0.0    # set by Retry-After and secondary rate limits
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token if one is available and return how many seconds the caller has to wait before retrying."""
+        with self._lock:
+            now = time.time()
+            if now < self.blocked_until:
+                return self.blocked_until - now
+
+            if self.tokens is None:
+                return 0.0
+
+            if self.tokens <= 0:
+                if now < self.reset_at:
+                    return self.reset_at - now + 1
+                # The quota was reset in the meantime
+                self.tokens = self.capacity
+
+            self.tokens -= 1
+            return 0.0
+
+    def acquire(self):
+        """Block until a token is available. Returns the total time spent waiting."""
+        waited = 0.0
+        while (wait := self.reserve()) > 0:
+            time.sleep(wait)
+            waited += wait
+        return waited
+
+    def update(self, headers):
+        """Synchronize the bucket with the rate limit headers of a response."""
+        remaining = headers.get('X-RateLimit-Remaining')
+        limit = headers.get('X-RateLimit-Limit')
+        reset = headers.get('X-RateLimit-Reset')
+        retry_after = headers.get('Retry-After')
+
+        with self._lock:
+            if limit is not None:
+                self.capacity = int(limit)
+            if remaining is not None:
+                self.tokens = int(remaining)
+            if reset is not None:
+                self.reset_at = float(reset)
+            if retry_after is not None:
+                self.blocked_until = max(self.blocked_until, time.time() + float(retry_after))
+
+    def block_for(self, seconds):
+        """Stop handing out tokens for the given number of seconds."""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.time() + seconds)
+
+    @property
+    def remaining(self):
+        return self.tokens
+
+
+class ClientMetrics:
+    """Thread-safe per-call latency and quota counters of a GitHubClient."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.requests = 0
+        self.retries = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.rate_limit_wait = 0.0
+        self.cache_hits = 0
+        self.status_counts = defaultdict(int)
+        self.requests_per_resource = defaultdict(int)
+        self.latency_per_resource = defaultdict(float)
+
+    def record(self, resource, status_code, latency):
+        with self._lock:
+            self.requests += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+            self.status_counts[status_code] += 1
+            self.requests_per_resource[resource] += 1
+            self.latency_per_resource[resource] += latency
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def record_wait(self, seconds):
+        with self._lock:
+            self.rate_limit_wait += seconds
+
+    def record_cache_hit(self):
+        with self._lock:
+            self.cache_hits += 1
+
+    def summary(self, buckets=None):
+        with self._lock:
+            elapsed = time.time() - self.started_at
+            summary = {
+                'requests': self.requests,
+                'retries': self.retries,
+                'elapsed_s': round(elapsed, 2),
+                'requests_per_s': round(self.requests / elapsed, 2) if elapsed > 0 else 0.0,
+                'mean_latency_ms': round(self.total_latency / self.requests * 1000, 1) if self.requests else 0.0,
+                'max_latency_ms': round(self.max_latency * 1000, 1),
+                'rate_limit_wait_s': round(self.rate_limit_wait, 2),
+                'cache_hits': self.cache_hits,
+                'status_codes': dict(self.status_counts),
+                'per_resource': {
+                    resource: {
+                        'requests': count,
+                        'mean_latency_ms': round(self.latency_per_resource[resource] / count * 1000, 1)
+                    }
+                    for resource, count in self.requests_per_resource.items()
+                }
+            }
+
+        if buckets:
+            summary['quota_remaining'] = {resource: bucket.remaining for resource, bucket in buckets.items()}
+        return summary
+
+
+class GitHubClient:
+    """
+    Pooled GitHub API client shared by all mining scripts.
+
+    A single requests.Session keeps TLS connections alive between calls, and one RateLimitBucket per rate limit
+    resource (core, search, graphql) is shared by all threads that use the client. With an HttpCache, GET requests
+    are sent as conditional requests and 304 answers are served from the cache.
+    """
+
+    def __init__(self, token=GITHUB_TOKEN, pool_size=POOL_SIZE, max_retries=MAX_RETRIES, cache=None):
+        self.max_retries = max_retries
+        self.cache = cache
+        self.metrics = ClientMetrics()
+        self.buckets = defaultdict(RateLimitBucket)
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Authorization': f'Bearer {token}',
+            'Accept': 'application/vnd.github+json'
+        })
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method, url, **kwargs):
+        """
+        Send a request, waiting for the rate limit and retrying when GitHub answers with 403/429.
+        Returns the last response (whatever its status code), or None if the request could not be sent.
+        """
+        if self.cache is None or method != 'GET' or kwargs.get('stream'):
+            return self._send(method, url, **kwargs)
+
+        headers = dict(kwargs.pop('headers', None) or {})
+        accept = headers.get('Accept', self.session.headers['Accept'])
+        cache_key, full_url = self.cache.key(url, kwargs.get('params'), accept)
+
+        entry = self.cache.lookup(cache_key)
+        if entry is not None:
+            if self.cache.is_fresh(entry):
+                self.metrics.record_cache_hit()
+                return entry.to_response()
+            headers.update(entry.conditional_headers())
+
+        response = self._send(method, url, headers=headers, **kwargs)
+        if response is None:
+            return None
+
+        if entry is not None and response.status_code == 304:
+            self.cache.revalidated(cache_key)
+            self.metrics.record_cache_hit()
+            return entry.to_response()
+
+        self.cache.store(cache_key, full_url, response)
+        return response
+
+    def _send(self, method, url, **kwargs):
+        bucket = self.buckets[resource_for_url(url)]
+
+        response = None
+        for attempt in range(self.max_retries):
+            self.metrics.record_wait(bucket.acquire())
+
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.RequestException as e:
+                print(f"Request to {url} failed: {e}")
+                self.metrics.record_retry()
+                time.sleep(BACKOFF_BASE ** attempt)
+                continue
+            latency = time.perf_counter() - start
+
+            resource = response.headers.get('X-RateLimit-Resource', resource_for_url(url))
+            bucket = self.buckets[resource]
+            bucket.update(response.headers)
+            self.metrics.record(resource, response.status_code, latency)
+
+            if not self._is_rate_limited(response):
+                return response
+
+            self.metrics.record_retry()
+            if 'Retry-After' not in response.headers and response.headers.get('X-RateLimit-Remaining') != '0':
+                # Secondary rate limit without any hint from GitHub, back off exponentially
+                bucket.block_for(BACKOFF_BASE ** attempt)
+            print(f"Rate limit reached ({response.status_code}) for {url}, waiting for the quota to reset...")
+
+        return response
+
+    @staticmethod
+    def _is_rate_limited(response):
+        if response.status_code == 429:
+            return True
+        if response.status_code != 403:
+            return False
+        return (response.headers.get('X-RateLimit-Remaining') == '0' or
+                'Retry-After' in response.headers or
+                'rate limit' in response.text.lower())
+
+    def get(self, url, params=None, **kwargs):
+        """Make a GET request to the GitHub API and return the response if it succeeded, otherwise None."""
+        response = self.request('GET', url, params=params, **kwargs)
+        if response is None:
+            return None
+        if response.status_code != 200:
+            print(f"Request failed: {response.status_code} - {response.text}")
+            return None
+        return response
+
+    def paginate(self, url, params=None):
+        """Yield every page of a paginated REST endpoint, following the 'next' links."""
+        while url:
+            response = self.get(url, params=params)
+            if response is None:
+                return
+
+            yield response
+
+            # Docs: https://docs.github.com/en/rest/using-the-rest-api/using-pagination-in-the-rest-api?apiVersion=2022-11-28
+            url = next_page_url(response)
+            params = None   # the next link already contains the query string
+
+    def graphql(self, query, variables=None):
+        """Run a GraphQL query and return its 'data' object, or None if the query failed."""
+        payload = {'query': query}
+        if variables:
+            payload['variables'] = variables
+
+        response = self.request('POST', api_url('graphql'), json=payload)
+        if response is None:
+            return None
+
+        if response.status_code != 200 or response.json().get('errors'):
+            print(f"GraphQL query failed: {response.status_code} - {response.text}")
+            return None
+        return response.json()['data']
+
+    def summary(self):
+        return self.metrics.summary(self.buckets)
+
+    def print_summary(self):
+        print_summary(self.summary())
+
+
+def print_summary(summary):
+    """Print the metrics summary of a client."""
+    print(f"GitHub API: {summary['requests']} requests ({summary['requests_per_s']}/s), "
+          f"{summary['retries']} retries, mean latency {summary['mean_latency_ms']} ms, "
+          f"waited {summary['rate_limit_wait_s']}s for the rate limit")
+    print(f"  status codes: {summary['status_codes']}, served from cache: {summary['cache_hits']}")
+    print(f"  quota remaining: {summary.get('quota_remaining', {})}")
+
+
+def next_page_url(response):
+    """Return the URL of the next page from the Link header, or None on the last page."""
+    return response.links.get('next', {}).get('url')
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide GitHubClient, so all threads share one connection pool and rate limit budget."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = GitHubClient(cache=HttpCache() if HTTP_CACHE_DB else None)
+        return _client
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from common.checkpoint import open_database
+
+# Set GITHUB_HTTP_CACHE to another file to move the cache, or to an empty string to disable it
+HTTP_CACHE_DB = os.getenv('GITHUB_HTTP_CACHE', str(Path(__file__).resolve().parent.parent / 'http_cache.sqlite'))
+MAX_CACHE_SIZE = 2 * 1024 ** 3      # bytes of response bodies, least recently used entries are evicted first
+MAX_AGE = 30 * 24 * 3600            # seconds, older entries are fetched again without a conditional request
+FRESH_FOR = 0                       # seconds during which an entry is used without asking GitHub at all
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    validated_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+"""
+
+
+class CacheEntry:
+    def __init__(self, url, etag, last_modified, headers, body, validated_at):
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.headers = headers
+        self.body = body
+        self.validated_at = validated_at
+
+    def conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def to_response(self):
+        """Rebuild the cached 200 response as a requests.Response."""
+        response = requests.Response()
+        response.status_code = 200
+        response.url = self.url
+        response.headers = CaseInsensitiveDict(self.headers)
+        response._content = self.body
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers) or 'utf-8'
+        return response
+
+
+class HttpCache:
+    """
+    Persistent, size-bounded cache of GET responses used for conditional requests.
+
+    Responses with an ETag or Last-Modified header are stored per URL. The next request for the URL sends
+    If-None-Match/If-Modified-Since, and a 304 answer (which does not count against the GitHub rate limit) is
+    served from the cache.
+    """
+
+    def __init__(self, path=HTTP_CACHE_DB, max_size=MAX_CACHE_SIZE, max_age=MAX_AGE, fresh_for=FRESH_FOR):
+        self.path = path
+        self.max_size = max_size
+        self.max_age = max_age
+        self.fresh_for = fresh_for
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        db = open_database(path, SCHEMA)
+        self.size = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        db.close()
+
+    @property
+    def db(self):
+        if not hasattr(self._local, 'connection'):
+            self._local.connection = open_database(self.path)
+        return self._local.connection
+
+    @staticmethod
+    def key(url, params=None, accept=None):
+        """Cache key of a request: the full URL including the query string, and the requested media type."""
+        full_url = requests.Request('GET', url, params=params).prepare().url
+        return hashlib.sha256(f"{accept}|{full_url}".encode()).hexdigest(), full_url
+
+    def lookup(self, key):
+        """Return the cached entry for a key, or None if there is none or it is older than max_age."""
+        row = self.db.execute("SELECT url, etag, last_modified, headers, body, validated_at FROM responses "
+                              "WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+
+        entry = CacheEntry(row[0], row[1], row[2], json.loads(row[3]), row[4], row[5])
+        if time.time() - entry.validated_at > self.max_age:
+            self.delete(key)
+            return None
+
+        with self.db:
+            self.db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return entry
+
+    def is_fresh(self, entry):
+        return time.time() - entry.validated_at < self.fresh_for
+
+    def revalidated(self, key):
+        """Record that GitHub confirmed (304) that the cached response is still up to date."""
+        now = time.time()
+        with self.db:
+            self.db.execute("UPDATE responses SET validated_at = ?, accessed_at = ? WHERE key = ?", (now, now, key))
+
+    def store(self, key, url, response):
+        """Store a 200 response if it can be revalidated later."""
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if response.status_code != 200 or not (etag or last_modified):
+            return
+
+        body = response.content
+        now = time.time()
+        with self._lock:
+            with self.db:
+                old = self.db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+                self.db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                (key, url, etag, last_modified, json.dumps(dict(response.headers)), body,
+                                 len(body), now, now))
+            self.size += len(body) - (old[0] if old else 0)
+
+            if self.size > self.max_size:
+                self._evict()
+
+    def delete(self, key):
+        with self._lock:
+            with self.db:
+                row = self.db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+                self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            if row:
+                self.size -= row[0]
+
+    def _evict(self):
+        """Delete least recently used entries until the cache uses at most 90% of max_size."""
+        target = self.max_size * 0.9
+        with self.db:
+            rows = self.db.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall()
+            evicted = []
+            for key, size in rows:
+                if self.size <= target:
+                    break
+                evicted.append((key,))
+                self.size -= size
+            self.db.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        print(f"Evicted {len(evicted)} responses from the HTTP cache")
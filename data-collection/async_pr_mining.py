@@ -0,0 +1,179 @@
+import asyncio
+import time
+
+import pandas as pd
+from yarl import URL
+
+from common.async_github_client import AsyncGitHubClient
+from common.checkpoint import CheckpointStore
+from common.datasets import read_table
+from common.github_client import GITHUB_DIFF_URL, MAX_PR_FILES, api_url
+from pr_mining import (CHECKPOINT_DB, INPUT_CSV, MAX_REPOS_PER_RUN, OUTPUT_CSV, diff_header_modifies_pom,
+                       discusses_version_conflict, is_pom, to_match)
+
+REPO_CONCURRENCY = 100  # repositories being mined at the same time
+REPORT_INTERVAL = 30    # seconds between two throughput reports
+
+
+class AsyncMiningEngine:
+    """
+    asyncio version of the issue crawl in pr_mining.py.
+
+    Listing a repository, fetching each of its issue pages and verifying each candidate PR are independent tasks.
+    All of them share the global concurrency limit and the rate limit budget of the AsyncGitHubClient, so slow
+    repositories no longer block a worker while other requests could be sent.
+    """
+
+    def __init__(self, client, store=None):
+        self.client = client
+        self.store = store
+        self.repos_done = 0
+        self.repos_failed = 0
+        self.matches = 0
+        self.started_at = time.time()
+
+    async def pr_modifies_pom(self, repo_full_name, pr_number):
+        """Check if a pull request modifies a pom.xml file, based on the list of changed files."""
+        url = api_url(f'repos/{repo_full_name}/pulls/{pr_number}/files')
+        params = {'per_page': 100}
+        listed_files = 0
+
+        while url:
+            response = await self.client.get(url, params=params)
+            if response is None:
+                return await self.diff_modifies_pom(repo_full_name, pr_number)
+
+            files = response.json()
+            for file in files:
+                if is_pom(file['filename']) or is_pom(file.get('previous_filename', '')):
+                    return True
+            listed_files += len(files)
+
+            url = response.next_url
+            params = None
+
+        if listed_files >= MAX_PR_FILES:
+            # The listing ends at MAX_PR_FILES without an error, the remaining files are only in the diff
+            return await self.diff_modifies_pom(repo_full_name, pr_number)
+        return False
+
+    async def diff_modifies_pom(self, repo_full_name, pr_number):
+        url = f'{GITHUB_DIFF_URL}/raw/{repo_full_name}/pull/{pr_number}.diff'
+        return bool(await self.client.any_line(url, diff_header_modifies_pom))
+
+    async def verify_pr(self, repo_full_name, issue):
+        # Ignore PRs that are not merged, created by bots or do not modify the pom.xml
+        if issue.get('pull_request').get('merged_at') is None or '[bot]' in issue.get('user').get('login'):
+            return None
+        if not await self.pr_modifies_pom(repo_full_name, issue.get('number')):
+            return None
+
+        match = to_match(repo_full_name, issue.get('title'), issue.get('html_url'))
+        self.matches += 1
+        if self.store:
+            self.store.checkpoint(repo_full_name, None, [(match['pr_url'], match)])
+        return match
+
+    async def process_issues(self, repo_full_name, issues):
+        candidates = [issue for issue in issues if 'pull_request' in issue and discusses_version_conflict(issue)]
+        results = await asyncio.gather(*(self.verify_pr(repo_full_name, issue) for issue in candidates))
+        return [match for match in results if match]
+
+    async def fetch_page(self, repo_full_name, url):
+        response = await self.client.get(url)
+        if response is None:
+            raise RuntimeError(f"Failed to fetch {url}")
+        return await self.process_issues(repo_full_name, response.json())
+
+    async def mine_repo(self, repo_full_name):
+        """Fetch the first page of issues, then all remaining pages of the repository concurrently."""
+        response = await self.client.get(api_url(f'repos/{repo_full_name}/issues'),
+                                         params={'state': 'all', 'per_page': 100})
+        if response is None:
+            raise RuntimeError(f"Failed to fetch issues for {repo_full_name}")
+
+        tasks = [self.process_issues(repo_full_name, response.json())]
+
+        if 'last' in response.links:
+            last_url = URL(response.links['last'])
+            last_page = int(last_url.query.get('page', 1))
+            tasks += [self.fetch_page(repo_full_name, str(last_url.update_query(page=page)))
+                      for page in range(2, last_page + 1)]
+            pages = await asyncio.gather(*tasks)
+        else:
+            # Without a 'last' link the page count is unknown, so follow the 'next' links one by one
+            pages = [await tasks[0]]
+            url = response.next_url
+            while url:
+                response = await self.client.get(url)
+                if response is None:
+                    raise RuntimeError(f"Failed to fetch {url}")
+                pages.append(await self.process_issues(repo_full_name, response.json()))
+                url = response.next_url
+
+        return [match for page in pages for match in page]
+
+    async def mine_repo_checkpointed(self, repo_full_name, repo_semaphore):
+        async with repo_semaphore:
+            try:
+                await self.mine_repo(repo_full_name)
+                self.repos_done += 1
+                if self.store:
+                    self.store.mark_done(repo_full_name)
+            except Exception as e:
+                print(f"Error processing repo {repo_full_name}: {e}")
+                self.repos_failed += 1
+                if self.store:
+                    self.store.mark_failed(repo_full_name, e)
+
+    def throughput(self):
+        elapsed = time.time() - self.started_at
+        return (f"{self.repos_done} repos done, {self.repos_failed} failed, {self.matches} matches in {elapsed:.0f}s - "
+                f"{self.client.metrics.requests / elapsed:.1f} requests/s, "
+                f"{self.repos_done / elapsed * 60:.1f} repos/min")
+
+    async def report_throughput(self):
+        while True:
+            await asyncio.sleep(REPORT_INTERVAL)
+            print(self.throughput())
+
+    async def run(self, repo_names):
+        self.started_at = time.time()
+        repo_semaphore = asyncio.Semaphore(REPO_CONCURRENCY)
+        reporter = asyncio.create_task(self.report_throughput())
+        try:
+            await asyncio.gather(*(self.mine_repo_checkpointed(name, repo_semaphore) for name in repo_names))
+        finally:
+            reporter.cancel()
+        print(self.throughput())
+
+
+async def mine(repo_names, store):
+    async with AsyncGitHubClient() as client:
+        await AsyncMiningEngine(client, store).run(repo_names)
+        client.print_summary()
+
+
+def main():
+    df = read_table(INPUT_CSV, columns=['name'])
+
+    # Shares the checkpoint database with pr_mining.py. Interrupted repositories are mined again from the first page,
+    # matches are deduplicated by their URL.
+    store = CheckpointStore(CHECKPOINT_DB)
+    store.enqueue(df['name'])
+    pending_repos = store.pending_items()[:MAX_REPOS_PER_RUN]
+    print(f"Mining {len(pending_repos)} repositories (progress so far: {store.progress()})")
+
+    asyncio.run(mine(pending_repos, store))
+
+    all_matches = store.matches()
+    if all_matches:
+        results_df = pd.DataFrame(all_matches)
+        results_df.to_csv(OUTPUT_CSV, index=False)
+        print(f"Done! Saved {len(results_df)} results to {OUTPUT_CSV} (progress: {store.progress()})")
+    else:
+        print("No matching issues found.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,14 @@
-import json
-import os
-import pandas as pd
-import requests
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urlparse
 
-# In the run configuration, you need to set the GITHUB_TOKEN environment variable to your GitHub Personal Access Token
-GITHUB_TOKEN = os.getenv('GITHUB_TOKEN')
+from common.checkpoint import CheckpointStore
+from common.datasets import read_table, write_table
+from common.github_client import api_url, get_client
+
 INPUT_CSV = 'filtered_repos.csv'
 OUTPUT_CSV = 'filtered_repos.csv'
+CHECKPOINT_DB = 'filter_repo_population_checkpoint.sqlite'
 MAX_WORKERS = 10
-HEADERS = {
-    'Authorization': f'Bearer {GITHUB_TOKEN}',
-    'Accept': 'application/vnd.github+json'
-}
 
 
 def check_repo_status(repo_name):
@@ -25,14 +20,15 @@ def check_repo_status(repo_name):
         - ('ERROR', None) if request fails
     """
 
-    url = f"https://api.github.com/repos/{repo_name}"
+    url = api_url(f"repos/{repo_name}")
+    client = get_client()
     try:
-        response = requests.get(url, headers=HEADERS, allow_redirects=False)
+        response = client.request('GET', url, allow_redirects=False)
         if response.status_code in (301, 302):
             # Follow redirect manually
             location = response.headers.get('Location')
             if location:
-                redirected_resp = requests.get(location, headers=HEADERS)
+                redirected_resp = client.request('GET', location)
                 if redirected_resp.status_code == 200:
                     redirected_name = urlparse(redirected_resp.json()['html_url']).path.strip('/')
                     return 'REDIRECT', redirected_name
@@ -53,24 +49,32 @@ def check_repo_status(repo_name):
 
 
 def main():
-    df = pd.read_csv(INPUT_CSV)
-    repo_names = df['name']
-    repo_names_chunk = repo_names.iloc[5000:]
+    df = read_table(INPUT_CSV)
 
-    status_map = {}
+    # The status of every checked repository is stored immediately, so an interrupted run only checks the rest
+    store = CheckpointStore(CHECKPOINT_DB)
+    store.enqueue(df['name'])
+    pending_repos = store.pending_items(df['name'])
+    print(f"Checking {len(pending_repos)} repositories (progress so far: {store.progress()})")
 
     with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = {executor.submit(check_repo_status, name): name for name in repo_names_chunk}
+        futures = {executor.submit(check_repo_status, name): name for name in pending_repos}
 
         for future in as_completed(futures):
             repo = futures[future]
             status, target = future.result()
-            status_map[repo] = {'status': status, 'target': target}
+            if status == 'ERROR':
+                # Retried by the next run
+                store.mark_failed(repo, status)
+            else:
+                store.mark_done(repo, {'status': status, 'target': target})
+
+    names_in_dataset = set(df['name'])
+    status_map = {repo: info for repo, info in store.results().items() if repo in names_in_dataset}
 
     # Only remove:
     # - hidden repos: status NOT_FOUND
     # - duplicate repos: status REDIRECT where redirected target is in the dataset
-    names_in_dataset = set(df['name'])
     to_remove = []
 
     for repo, info in status_map.items():
@@ -83,9 +87,10 @@ def main():
 
     to_remove = set(to_remove)
     filtered_df = df[~df['name'].isin(to_remove)]
-    filtered_df.to_csv(OUTPUT_CSV, index=False)
+    write_table(filtered_df, OUTPUT_CSV)
 
     print(f"Filtered dataset written to {OUTPUT_CSV} ({len(df) - len(filtered_df)} repos removed)")
+    get_client().print_summary()
 
 
 if __name__ == '__main__':
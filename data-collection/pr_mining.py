@@ -1,23 +1,38 @@
 import datetime
 import pandas as pd
-import requests
-import time
-import os
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from collections import deque
+from collections import defaultdict
+
+from common.checkpoint import CheckpointStore
+from common.datasets import read_table
+from common.github_client import GITHUB_DIFF_URL, MAX_PR_FILES, api_url, get_client, next_page_url
 
-# In the run configuration, you need to set the GITHUB_TOKEN environment variable to your GitHub Personal Access Token
-GITHUB_TOKEN = os.getenv('GITHUB_TOKEN')
 INPUT_CSV = '../data/java_repos_from_April_2015_min_50_stars_min_50_issues.csv'
 OUTPUT_CSV = 'repositories_with_version_conflict_pulls.csv'
-RATE_LIMIT_SLEEP = 10  # seconds
+CHECKPOINT_DB = 'pr_mining_checkpoint.sqlite'
+MAX_REPOS_PER_RUN = None   # None mines all pending repositories, a number only the next N of them
 MAX_WORKERS = 10      # number of parallel threads
 KEYWORDS = ['version conflict', 'library conflict', 'nosuchmethoderror']
 
-HEADERS = {
-    'Authorization': f'Bearer {GITHUB_TOKEN}',
-    'Accept': 'application/vnd.github+json'
+# 'crawl' pages through all issues of every repository and filters them locally,
+# 'search' lets the search API filter by keyword and verifies the candidate PRs with batched GraphQL queries
+MINING_MODE = 'search'
+SEARCH_BATCH_SIZE = 20      # repositories per search query
+GRAPHQL_BATCH_SIZE = 25     # pull requests per GraphQL query
+
+PR_FIELDS_FRAGMENT = """
+fragment PrFields on PullRequest {
+  number
+  title
+  url
+  merged
+  author { login __typename }
+  files(first: 100) {
+    nodes { path }
+    pageInfo { hasNextPage }
+  }
 }
+"""
 
 
 def discusses_version_conflict(issue):
@@ -30,124 +45,317 @@ def discusses_version_conflict(issue):
     return False
 
 
+def is_pom(path):
+    return path == 'pom.xml' or path.endswith('/pom.xml')
+
+
 def pr_modifies_pom(repo_full_name, pr_number):
-    """Check if a pull request modifies a pom.xml file."""
-    url = f'https://patch-diff.githubusercontent.com/raw/{repo_full_name}/pull/{pr_number}.diff'
-    response = requests.get(url, headers=HEADERS)
+    """Check if a pull request modifies a pom.xml file, based on the list of changed files."""
+    url = api_url(f'repos/{repo_full_name}/pulls/{pr_number}/files')
+    params = {'per_page': 100}
+    listed_files = 0
+
+    while url:
+        response = get_client().get(url, params=params)
+        if response is None:
+            # The listing could not be fetched, fall back to the diff headers
+            return diff_modifies_pom(repo_full_name, pr_number)
+
+        files = response.json()
+        for file in files:
+            if is_pom(file['filename']) or is_pom(file.get('previous_filename', '')):
+                # No need to fetch the remaining pages
+                return True
+        listed_files += len(files)
+
+        url = next_page_url(response)
+        params = None
+
+    if listed_files >= MAX_PR_FILES:
+        # The listing ends at MAX_PR_FILES without an error, the remaining files are only in the diff
+        return diff_modifies_pom(repo_full_name, pr_number)
+    return False
 
-    if response.status_code == 403 or response.status_code == 429:
-        print(f"Rate limit reached ({response.status_code}) during PR diff check for {repo_full_name} PR#{pr_number}, retrying after {RATE_LIMIT_SLEEP}s...")
-        time.sleep(RATE_LIMIT_SLEEP)
-        return pr_modifies_pom(repo_full_name, pr_number)
 
-    if response.status_code != 200:
-        print(f"Failed to fetch PR diff for {repo_full_name} PR#{pr_number}: {response.status_code} - {response.text}")
+def diff_modifies_pom(repo_full_name, pr_number):
+    """Check if a pull request modifies a pom.xml file by streaming the 'diff --git' headers of its diff."""
+    url = f'{GITHUB_DIFF_URL}/raw/{repo_full_name}/pull/{pr_number}.diff'
+    response = get_client().get(url, stream=True)
+
+    if response is None:
+        print(f"Failed to fetch PR diff for {repo_full_name} PR#{pr_number}")
         return False
 
-    return "pom.xml" in response.text
+    with response:
+        for line in response.iter_lines(chunk_size=64 * 1024):
+            if diff_header_modifies_pom(line):
+                return True
 
+    return False
 
-def search_issues_for_repo(repo_full_name):
-    """Search all issues for a given repository and collect matches."""
-    matches = []
-    url = f'https://api.github.com/repos/{repo_full_name}/issues'
-    params = {
-        'state': 'all',
-        'per_page': 100
-    }
 
-    while url:  # Keep making requests as long as the URL is not empty (i.e., there's more data)
-        response = requests.get(url, headers=HEADERS, params=params)
+def diff_header_modifies_pom(line):
+    """Check if a line of a diff is the header of a pom.xml file (format: diff --git a/<old path> b/<new path>)."""
+    if not line.startswith(b'diff --git a/'):
+        return False
+    old_path, _, new_path = line[len(b'diff --git a/'):].decode(errors='replace').partition(' b/')
+    return is_pom(old_path) or is_pom(new_path)
 
-        if response.status_code == 403:
-            print(f"Rate limit reached ({response.status_code}) while fetching issues for {repo_full_name}, retrying after {RATE_LIMIT_SLEEP}s...")
-            time.sleep(RATE_LIMIT_SLEEP)
-            continue
 
-        if response.status_code != 200:
-            print(f"Failed to fetch issues for {repo_full_name}: {response.status_code} - {response.text}")
-            break
+def search_issues_for_repo(repo_full_name, store=None):
+    """
+    Search all issues for a given repository and collect matches.
+    With a checkpoint store, the search continues from the last stored page and the matches are stored after every page.
+    """
+    matches = []
+    url = store.get_cursor(repo_full_name) if store else None
+    params = None
+    if url is None:
+        url = api_url(f'repos/{repo_full_name}/issues')
+        params = {
+            'state': 'all',
+            'per_page': 100
+        }
+
+    while url:  # Keep making requests as long as the URL is not empty (i.e., there's more data)
+        response = get_client().get(url, params=params)
+        if response is None:
+            raise RuntimeError(f"Failed to fetch issues for {repo_full_name}")
 
         issues = response.json()
+        page_matches = []
 
         # Process the issues
         for issue in issues:
-            if 'pull_request' in issue and discusses_version_conflict(issue):
-                pr_number = issue.get('number')
-                pr_merged_date = issue.get('pull_request').get('merged_at')
-
-                if (pr_merged_date is None or
-                        '[bot]' in issue.get('user').get('login') or
-                        not pr_modifies_pom(repo_full_name, pr_number)):
-                    # Ignore PRs that are not merged, created by bots or do not modify the pom.xml
+            if 'pull_request' in issue and discusses_version_conflict(issue) and is_relevant_pr(repo_full_name, issue):
+                page_matches.append(to_match(repo_full_name, issue.get('title'), issue.get('html_url')))
+        matches.extend(page_matches)
+
+        # Docs: https://docs.github.com/en/rest/using-the-rest-api/using-pagination-in-the-rest-api?apiVersion=2022-11-28
+        url = next_page_url(response)
+        params = None  # the next link already contains the query string
+
+        if store:
+            store.checkpoint(repo_full_name, url, [(match['pr_url'], match) for match in page_matches])
+
+    return matches
+
+
+def is_relevant_pr(repo_full_name, issue):
+    """Check if a PR (as returned by the issues/search API) is merged, not created by a bot and modifies the pom.xml."""
+    pr_merged_date = issue.get('pull_request').get('merged_at')
+
+    # Ignore PRs that are not merged, created by bots or do not modify the pom.xml
+    return not (pr_merged_date is None or
+                '[bot]' in issue.get('user').get('login') or
+                not pr_modifies_pom(repo_full_name, issue.get('number')))
+
+
+def to_match(repo_full_name, pr_title, pr_url):
+    print(f"Found match: {repo_full_name} - {pr_url}")
+    return {
+        'repository': repo_full_name,
+        'pr_title': pr_title,
+        'pr_url': pr_url
+    }
+
+
+def build_search_query(repo_names, keyword):
+    repo_qualifiers = ' '.join(f'repo:{name}' for name in repo_names)
+    return f'is:pr is:merged "{keyword}" in:title,body {repo_qualifiers}'
+
+
+def search_candidate_prs(repo_names):
+    """
+    Use the search API to find merged PRs mentioning one of the KEYWORDS in a batch of repositories.
+    Returns a dict {(repo_full_name, pr_number): issue} and the set of repositories whose search failed.
+    """
+
+    names_by_lower = {name.lower(): name for name in repo_names}
+    candidates = {}
+    failed_repos = set()
+
+    for keyword in KEYWORDS:
+        url = api_url('search/issues')
+        params = {'q': build_search_query(repo_names, keyword), 'per_page': 100}
+
+        while url:
+            response = get_client().get(url, params=params)
+            if response is None:
+                if len(repo_names) > 1 and params is not None:
+                    # The whole query fails if a single repository cannot be searched (e.g. it was deleted),
+                    # so split the batch to isolate it
+                    middle = len(repo_names) // 2
+                    for half in (repo_names[:middle], repo_names[middle:]):
+                        half_candidates, half_failed_repos = search_candidate_prs(half)
+                        candidates.update(half_candidates)
+                        failed_repos |= half_failed_repos
+                    return candidates, failed_repos
+                # The results of these repositories are incomplete, so they have to be searched again
+                print(f"Search failed for {', '.join(repo_names)} ({keyword})")
+                failed_repos.update(repo_names)
+                break
+
+            for issue in response.json().get('items', []):
+                # The search API also matches stemmed words, so apply the exact keyword filter again
+                if not discusses_version_conflict(issue):
                     continue
+                repo_full_name = issue['repository_url'].split('/repos/')[-1]
+                repo_full_name = names_by_lower.get(repo_full_name.lower(), repo_full_name)
+                candidates[(repo_full_name, issue['number'])] = issue
 
-                matches.append({
-                    'repository': repo_full_name,
-                    'pr_title': issue.get('title'),
-                    'pr_url': issue.get('html_url')
-                })
-                print(f"Found match: {repo_full_name} - {issue.get('html_url')}")
+            url = next_page_url(response)
+            params = None
 
-        # Check if there's another page
-        # Docs: https://docs.github.com/en/rest/using-the-rest-api/using-pagination-in-the-rest-api?apiVersion=2022-11-28
-        if 'link' in response.headers:
-            link_header = response.headers['link']
+    return candidates, failed_repos
+
+
+def build_pr_batch_query(candidates):
+    """Build one GraphQL query that fetches all candidate PRs, aliased per repository and PR number."""
+
+    prs_by_repo = defaultdict(list)
+    for repo_full_name, pr_number in candidates:
+        prs_by_repo[repo_full_name].append(pr_number)
 
-            # Look for the 'next' link (pagination)
-            next_page_url = None
-            for link in link_header.split(','):
-                if 'rel="next"' in link:
-                    next_page_url = link[link.find('<')+1:link.find('>')]
-                    break
+    repo_aliases = {}
+    repo_queries = []
+    for i, (repo_full_name, pr_numbers) in enumerate(prs_by_repo.items()):
+        owner, name = repo_full_name.split('/')
+        alias = f'repo{i}'
+        repo_aliases[alias] = repo_full_name
+        pr_queries = ' '.join(f'pr{number}: pullRequest(number: {number}) {{ ...PrFields }}' for number in pr_numbers)
+        repo_queries.append(f'{alias}: repository(owner: "{owner}", name: "{name}") {{ {pr_queries} }}')
 
-            # Update the URL for the next request
-            url = next_page_url
-        else:
-            url = None  # No more pages
+    query = 'query {\n' + '\n'.join(repo_queries) + '\n}\n' + PR_FIELDS_FRAGMENT
+    return query, repo_aliases
+
+
+def verify_candidate_prs(candidates):
+    """Fetch merged state, author and changed files of a batch of candidate PRs with a single GraphQL query."""
+
+    matches = []
+    query, repo_aliases = build_pr_batch_query(candidates)
+    data = get_client().graphql(query)
+
+    if data is None:
+        # Fall back to checking the PRs one by one with the REST API
+        for (repo_full_name, _), issue in candidates.items():
+            if is_relevant_pr(repo_full_name, issue):
+                matches.append(to_match(repo_full_name, issue.get('title'), issue.get('html_url')))
+        return matches
+
+    for alias, repo_full_name in repo_aliases.items():
+        for pr in (data.get(alias) or {}).values():
+            if not pr or not pr['merged']:
+                continue
+
+            author = pr['author'] or {}
+            if author.get('__typename') == 'Bot' or '[bot]' in author.get('login', ''):
+                continue
+
+            paths = [node['path'] for node in pr['files']['nodes']]
+            modifies_pom = any(is_pom(path) for path in paths)
+            if not modifies_pom and pr['files']['pageInfo']['hasNextPage']:
+                # More than 100 changed files, check the remaining ones with the REST API
+                modifies_pom = pr_modifies_pom(repo_full_name, pr['number'])
+
+            if modifies_pom:
+                matches.append(to_match(repo_full_name, pr['title'], pr['url']))
 
     return matches
 
 
-def main():
-    # Uncomment to check rate limit ####
-    check_rate_limit()
+def mine_search_batch(repo_names, store=None):
+    """Find version conflict PRs in a batch of repositories with server-side keyword search and batched GraphQL verification."""
+
+    candidates, failed_repos = search_candidate_prs(repo_names)
+    keys = list(candidates)
+
+    matches = []
+    for i in range(0, len(keys), GRAPHQL_BATCH_SIZE):
+        matches.extend(verify_candidate_prs({key: candidates[key] for key in keys[i:i + GRAPHQL_BATCH_SIZE]}))
+
+    if store:
+        for repo_full_name in repo_names:
+            repo_matches = [match for match in matches if match['repository'] == repo_full_name]
+            store.checkpoint(repo_full_name, None, [(match['pr_url'], match) for match in repo_matches])
+            if repo_full_name in failed_repos:
+                # Retried by the next run
+                store.mark_failed(repo_full_name, "search failed")
+            else:
+                store.mark_done(repo_full_name)
+
+    return matches
 
-    df = pd.read_csv(INPUT_CSV)
 
-    START_INDEX = 6200
-    END_INDEX = 6200
-    df_chunk = df.iloc[START_INDEX:END_INDEX]
+def mine_repos_with_search(repo_names, store=None):
+    """Mine all repositories in batches of SEARCH_BATCH_SIZE."""
 
-    all_matches = deque()
+    batches = [repo_names[i:i + SEARCH_BATCH_SIZE] for i in range(0, len(repo_names), SEARCH_BATCH_SIZE)]
+
+    matches = []
     with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = {
-            executor.submit(search_issues_for_repo, row['name']): row['name']
-            for _, row in df_chunk.iterrows()
-        }
+        futures = {executor.submit(mine_search_batch, batch, store): batch for batch in batches}
 
         for future in as_completed(futures):
-            repo_name = futures[future]
             try:
-                matches = future.result()
-                all_matches.extend(matches) # thread-safe
+                matches.extend(future.result())
             except Exception as e:
-                print(f"Error processing repo {repo_name}: {e}")
+                print(f"Error processing repos {', '.join(futures[future])}: {e}")
+                if store:
+                    for repo_name in futures[future]:
+                        store.mark_failed(repo_name, e)
+
+    return matches
+
 
+def main():
+    # Uncomment to check rate limit ####
+    check_rate_limit()
+
+    df = read_table(INPUT_CSV, columns=['name'])
+
+    # Repositories that were mined completely in a previous run are skipped,
+    # interrupted ones continue from their last page
+    store = CheckpointStore(CHECKPOINT_DB)
+    store.enqueue(df['name'])
+    pending_repos = store.pending_items()[:MAX_REPOS_PER_RUN]
+    print(f"Mining {len(pending_repos)} repositories (progress so far: {store.progress()})")
+
+    if MINING_MODE == 'search':
+        mine_repos_with_search(pending_repos, store)
+    else:
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            futures = {
+                executor.submit(search_issues_for_repo, repo_name, store): repo_name
+                for repo_name in pending_repos
+            }
+
+            for future in as_completed(futures):
+                repo_name = futures[future]
+                try:
+                    future.result()
+                    store.mark_done(repo_name)
+                except Exception as e:
+                    print(f"Error processing repo {repo_name}: {e}")
+                    store.mark_failed(repo_name, e)
+
+    # The checkpoint store holds the matches of all runs, so the CSV is rewritten from it
+    all_matches = store.matches()
     if all_matches:
         results_df = pd.DataFrame(all_matches)
+        results_df.to_csv(OUTPUT_CSV, index=False)
 
-        # Append to the CSV output file
-        results_df.to_csv(OUTPUT_CSV, mode='a', index=False, header=not os.path.exists(OUTPUT_CSV))
-
-        print(f"Done! Saved results to {OUTPUT_CSV}")
+        print(f"Done! Saved {len(results_df)} results to {OUTPUT_CSV} (progress: {store.progress()})")
     else:
         print("No matching issues found.")
 
+    get_client().print_summary()
+
 
 def check_rate_limit():
-    response = requests.get('https://api.github.com/rate_limit', headers=HEADERS)
-    if response.status_code == 200:
+    response = get_client().get(api_url('rate_limit'))
+    if response:
         print(response.text)
         print(datetime.datetime.fromtimestamp(response.json().get('resources').get('core').get('reset')))
         print(datetime.datetime.fromtimestamp(response.json().get('resources').get('graphql').get('reset')))
@@ -1,4 +1,4 @@
-import pandas as pd
+from common.datasets import read_table
 
 # In the run configuration, you need to set the GITHUB_TOKEN environment variable to your GitHub Personal Access Token
 INPUT_CSV = '../data/final_version_conflict_prs.csv'
@@ -12,14 +12,14 @@ def print_statistics(df, columns):
 
 
 def main():
-    df = pd.read_csv(INPUT_CSV)
-    all_repos_df = pd.read_csv(ALL_REPOS_CSV)
+    df = read_table(INPUT_CSV, columns=['repository'])
 
     repos = df['repository'].unique()
-    selected_repos_df = all_repos_df[all_repos_df['name'].isin(repos)]
+    columns = ['codeLines', 'commits', 'totalPullRequests', 'stargazers', 'contributors']
+    selected_repos_df = read_table(ALL_REPOS_CSV, columns=columns, filters=[('name', 'in', list(repos))])
 
     print(f"Statistics for {len(repos)} selected repositories:")
-    print_statistics(selected_repos_df, ['codeLines', 'commits', 'totalPullRequests', 'stargazers', 'contributors'])
+    print_statistics(selected_repos_df, columns)
 
 
 if __name__ == "__main__":
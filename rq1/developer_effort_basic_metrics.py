@@ -1,44 +1,60 @@
-import os
-import time
 import pandas as pd
-import requests
-from datetime import datetime
 
 from tqdm import tqdm
 
-# In the run configuration, you need to set the GITHUB_TOKEN environment variable to your GitHub Personal Access Token
-GITHUB_TOKEN = os.getenv('GITHUB_TOKEN')
+from common.datasets import read_table, to_timestamps, write_table
+from common.github_client import MAX_PR_FILES, api_url, get_client, next_page_url
+
 INPUT_CSV = '../data/final_version_conflict_prs.csv'
 OUTPUT_CSV = 'result_rq1_version_conflict_prs.csv'
 
-HEADERS = {
-    'Authorization': f'Bearer {GITHUB_TOKEN}',
-    'Accept': 'application/vnd.github+json'
-}
+# 'rest' makes 5-6 REST calls per PR, 'graphql' fetches the metrics of GRAPHQL_BATCH_SIZE PRs with a single query
+COLLECTOR = 'graphql'
+GRAPHQL_BATCH_SIZE = 20
 
+# 'files' sums the per-file stats of the PR files listing, 'diff' streams and parses the raw diff
+JAVA_CHANGES_MODE = 'files'
+DIFF_CHUNK_SIZE = 1024 * 1024
 
-def safe_get(url, headers, max_retries=5):
-    """Make a GET request to the GitHub API with rate limit handling."""
+HOUR = pd.Timedelta(hours=1)
 
-    for i in range(max_retries):
-        response = requests.get(url, headers=headers)
-        if response.status_code == 200:
-            return response
-        elif response.status_code == 403:
-            wait = 2 ** i
-            print(f"Rate limited. Waiting {wait}s...")
-            time.sleep(wait)
-        else:
-            print(f"Request failed: {response.status_code} - {response.text}")
-            break
+PR_METRICS_FRAGMENT = """
+fragment CommentFields on Comment {
+  body
+  author { login __typename }
+}
 
-    return None
+fragment PrMetrics on PullRequest {
+  additions
+  deletions
+  createdAt
+  mergedAt
+  comments(first: 100) {
+    totalCount
+    nodes { ...CommentFields }
+  }
+  reviews(first: 100) {
+    totalCount
+    nodes {
+      body
+      comments(first: 100) {
+        totalCount
+        nodes { ...CommentFields }
+      }
+    }
+  }
+  files(first: 100) {
+    totalCount
+    nodes { path additions deletions }
+  }
+}
+"""
 
 
 def get_pr_reviews_count(repo_full_name, pr_number):
     """Fetch the number of non-empty reviews for a pull request."""
 
-    response = safe_get(f"https://api.github.com/repos/{repo_full_name}/pulls/{pr_number}/reviews", HEADERS)
+    response = get_client().get(api_url(f"repos/{repo_full_name}/pulls/{pr_number}/reviews"))
     if response is None:
         return None
 
@@ -54,21 +70,32 @@ def count_impure_pr_comments(comments_url, review_comments_url):
     impure_comments = 0
 
     for url in [comments_url, review_comments_url]:
-        response = safe_get(url, HEADERS)
+        response = get_client().get(url)
         if response is None:
             return None
 
         comments = response.json()
         for comment in comments:
-            if (not comment.get('body') or
-                    '[bot]' in comment.get('user').get('login') or
-                    comment.get('body').lower().startswith('run') or
-                    comment.get('body').lower().startswith('rerun')):
+            if is_impure_comment(comment.get('body'), comment.get('user').get('login')):
                 impure_comments += 1
 
     return impure_comments
 
 
+def is_impure_comment(body, author_login):
+    """Impure comments are empty, created by bots or commands to (re)run the CI."""
+    return (not body or
+            '[bot]' in author_login or
+            body.lower().startswith('run') or
+            body.lower().startswith('rerun'))
+
+
+def parse_github_url(html_url):
+    """Split a GitHub issue or PR URL into the repository name and the number."""
+    parts = html_url.strip('/').split('/')
+    return parts[3] + '/' + parts[4], int(parts[-1])
+
+
 def get_issue_date(issue_html_url):
     """Fetch the creation date of an issue from its HTML URL."""
 
@@ -76,10 +103,9 @@ def get_issue_date(issue_html_url):
         print(f"Invalid GitHub issue URL: {issue_html_url}")
         return None
 
-    repo_full_name = issue_html_url.split("/")[3] + "/" + issue_html_url.split("/")[4]
-    issue_number = issue_html_url.split("/")[-1]
+    repo_full_name, issue_number = parse_github_url(issue_html_url)
 
-    response = safe_get(f"https://api.github.com/repos/{repo_full_name}/issues/{issue_number}", HEADERS)
+    response = get_client().get(api_url(f"repos/{repo_full_name}/issues/{issue_number}"))
     if response is None:
         return None
 
@@ -87,97 +113,299 @@ def get_issue_date(issue_html_url):
 
 
 def count_java_code_changes(repo_full_name, pr_number, diff_url):
-    """ Count the number of added and removed lines in Java files from a diff url."""
+    """Count the number of added and removed lines in Java files of a pull request."""
 
-    response = safe_get(diff_url, HEADERS)
-    if response is None:
+    if JAVA_CHANGES_MODE == 'files':
+        total_java_code_changes = count_java_code_changes_from_files(repo_full_name, pr_number)
+        if total_java_code_changes is not None:
+            return total_java_code_changes
+
+    return count_java_code_changes_from_diff(diff_url)
+
+
+def sum_java_file_changes(files):
+    """Sum the changed lines of the Java files in a page of the PR files listing."""
+    return sum(file['additions'] + file['deletions'] for file in files if file['filename'].endswith('.java'))
+
+
+def count_java_code_changes_from_files(repo_full_name, pr_number):
+    """
+    Count the changed lines in Java files from the per-file stats of the PR files listing. Returns None if the
+    listing could not be fetched or is truncated, so the caller can count them in the diff instead.
+    """
+
+    total = 0
+    listed_files = 0
+    url = api_url(f"repos/{repo_full_name}/pulls/{pr_number}/files")
+    params = {'per_page': 100}
+
+    while url:
+        response = get_client().get(url, params=params)
+        if response is None:
+            return None
+
+        files = response.json()
+        total += sum_java_file_changes(files)
+        listed_files += len(files)
+        url = next_page_url(response)
+        params = None
+
+    if listed_files >= MAX_PR_FILES:
+        # The listing ends at MAX_PR_FILES without an error, so the total would miss the remaining files
+        print(f"Files listing of PR {pr_number} in {repo_full_name} is truncated, counting the changes in the diff")
         return None
+    return total
+
 
-    diff_body = response.text.splitlines()
+def count_java_code_changes_from_diff(diff_url):
+    """ Count the number of added and removed lines in Java files from a diff url, streaming the diff."""
 
-    total_added = 0
-    total_removed = 0
-    count_this_file = False
+    response = get_client().get(diff_url, stream=True)
+    if response is None:
+        return None
 
-    for line in diff_body:
-        # Detect file changes
-        if line.startswith('diff --git'):
-            parts = line.strip().split(' ')
+    counter = JavaDiffCounter()
+    with response:
+        for chunk in response.iter_content(chunk_size=DIFF_CHUNK_SIZE):
+            counter.feed(chunk)
+
+    return counter.total()
+
+
+class JavaDiffCounter:
+    """
+    Streaming counter of the added and removed lines in Java files of a unified diff.
+
+    The diff is fed in byte chunks. Each block of complete lines is split at the 'diff --git' headers only,
+    and the '+'/'-' lines of a Java file are counted with bytes.count on the whole section, so no list of lines
+    is ever built and memory use is bounded by the chunk size.
+    """
+
+    HEADER = b'\ndiff --git'
+
+    def __init__(self):
+        self.added = 0
+        self.removed = 0
+        self.count_this_file = False
+        self._remainder = b''
+
+    def feed(self, chunk):
+        data = self._remainder + chunk
+        end = data.rfind(b'\n')
+        if end == -1:
+            self._remainder = data
+            return
+        self._remainder = data[end + 1:]
+        self._process(b'\n' + data[:end + 1])
+
+    def total(self):
+        if self._remainder:
+            self._process(b'\n' + self._remainder + b'\n')
+            self._remainder = b''
+        return self.added + self.removed
+
+    def _process(self, block):
+        """Process a block of complete lines, every line (including the first) preceded by a newline."""
+        start = 0
+        while True:
+            header = block.find(self.HEADER, start)
+            self._count(block, start, len(block) if header == -1 else header + 1)
+            if header == -1:
+                return
+
+            # Detect file changes: diff --git a/<path> b/<path>
+            header_end = block.find(b'\n', header + 1)
+            parts = block[header + 1:header_end].strip().split(b' ')
             if len(parts) >= 3:
                 current_file = parts[2][2:]  # Remove the 'a/' prefix
-                count_this_file = current_file.endswith('.java')
-        elif count_this_file:
-            # Count added or removed lines (not context or diff metadata)
-            if line.startswith('+') and not line.startswith('+++'):
-                total_added += 1
-            elif line.startswith('-') and not line.startswith('---'):
-                total_removed += 1
+                self.count_this_file = current_file.endswith(b'.java')
+            start = header_end
+
+    def _count(self, block, start, end):
+        if not self.count_this_file or start >= end:
+            return
+        # Count added or removed lines (not context or diff metadata)
+        self.added += block.count(b'\n+', start, end) - block.count(b'\n+++', start, end)
+        self.removed += block.count(b'\n-', start, end) - block.count(b'\n---', start, end)
+
 
-    return total_added + total_removed
+def compute_durations(df, timestamps):
+    """
+    Write resolved_at/detected_at and compute the time to merge and the time from detection to resolution (in hours)
+    of all merged PRs in one pass over whole columns.
+    timestamps maps the index of each merged PR to its (created_at, resolved_at, linked_issue_date) GitHub timestamps.
+    """
+    if not timestamps:
+        return
+
+    fetched = pd.DataFrame.from_dict(timestamps, orient='index',
+                                     columns=['created_at', 'resolved_at', 'linked_issue_date'])
+    created_at = to_timestamps(fetched['created_at'])
+    resolved_at = to_timestamps(fetched['resolved_at'])
+    index = fetched.index
+
+    # Detected_at is the date of the linked issue, or was added manually
+    has_linked_issue = df.loc[index, 'linked_issue'].notna()
+    detected_at = to_timestamps(fetched['linked_issue_date']).where(has_linked_issue, df.loc[index, 'detected_at'])
 
+    df.loc[index, 'resolved_at'] = resolved_at
+    df.loc[index, 'detected_at'] = detected_at
+    df.loc[index, 'time_to_merge'] = (resolved_at - created_at) / HOUR
+
+    detected = index[detected_at.notna()]
+    df.loc[detected, 'time_from_detection_to_resolution'] = ((resolved_at - detected_at) / HOUR)[detected]
+
+
+def collect_metrics_rest(df, index, row, timestamps):
+    """
+    Collect the metrics of one PR with the REST API. Returns True if the PR changes at most 5 lines.
+    The timestamps of merged PRs are added to timestamps, see compute_durations.
+    """
 
-def main():
-    df = pd.read_csv(INPUT_CSV)
+    pr_url = row['pr_url']
+    pr_number = pr_url.split("/")[-1]
+    repo_full_name = row['repository']
+    at_most_5_lines = False
+
+    try:
+        response = get_client().get(api_url(f"repos/{repo_full_name}/pulls/{pr_number}"))
+        if response:
+            pr_data = response.json()
+
+            # <------ Calculate total changes ------>
+            at_most_5_lines = pr_data['additions'] + pr_data['deletions'] <= 5
+
+            # <------ Calculate java code changes ------>
+            if pr_data['diff_url']:
+                total_java_code_changes = count_java_code_changes(repo_full_name, pr_number, pr_data['diff_url'])
+                if total_java_code_changes is not None:
+                    df.at[index, 'java_code_changes'] = total_java_code_changes
+            else:
+                print(f"No diff URL for PR {pr_number} in {repo_full_name}")
+
+            # <------ Calculate comments count ------>
+            total_comments = pr_data['comments'] + pr_data['review_comments']
+            reviews = get_pr_reviews_count(repo_full_name, pr_number)
+            df.at[index, 'comments'] = total_comments + reviews
+            df.at[index, 'impure_comments'] = count_impure_pr_comments(pr_data['comments_url'],
+                                                                       pr_data['review_comments_url'])
+
+            # <------ Calculate time to merge and detection to resolution ------>
+            resolved_at = pr_data.get('merged_at')
+
+            if resolved_at:
+                linked_issue_date = get_issue_date(row['linked_issue']) if pd.notna(row['linked_issue']) else None
+                timestamps[index] = (pr_data['created_at'], resolved_at, linked_issue_date)
+
+    except Exception as e:
+        print(f"Error processing {pr_url}: {e}")
+
+    return at_most_5_lines
+
+
+def build_metrics_query(rows):
+    """Build one GraphQL query for the PRs (and linked issues) of the given rows, aliased by row index."""
+
+    queries = []
+    for index, row in rows:
+        owner, name = row['repository'].split('/')
+        pr_number = parse_github_url(row['pr_url'])[1]
+        queries.append(f'pr{index}: repository(owner: "{owner}", name: "{name}") '
+                       f'{{ pullRequest(number: {pr_number}) {{ ...PrMetrics }} }}')
+
+        if pd.notna(row['linked_issue']) and row['linked_issue'].startswith("https://github.com"):
+            issue_repo, issue_number = parse_github_url(row['linked_issue'])
+            issue_owner, issue_name = issue_repo.split('/')
+            queries.append(f'issue{index}: repository(owner: "{issue_owner}", name: "{issue_name}") '
+                           f'{{ issueOrPullRequest(number: {issue_number}) '
+                           f'{{ ... on Issue {{ createdAt }} ... on PullRequest {{ createdAt }} }} }}')
+
+    return 'query {\n' + '\n'.join(queries) + '\n}\n' + PR_METRICS_FRAGMENT
+
+
+def is_truncated(pr):
+    """Check if one of the connections of a PR has more nodes than a single GraphQL page returns."""
+    connections = [pr['comments'], pr['reviews'], pr['files']] + [review['comments'] for review in pr['reviews']['nodes']]
+    return any(connection['totalCount'] > len(connection['nodes']) for connection in connections)
+
+
+def is_impure_graphql_comment(comment):
+    author = comment['author'] or {}
+    login = author.get('login', '')
+    if author.get('__typename') == 'Bot':
+        # GraphQL returns the login of apps without the '[bot]' suffix
+        login += '[bot]'
+    return is_impure_comment(comment['body'], login)
+
+
+def apply_graphql_metrics(df, index, row, pr, linked_issue, timestamps):
+    """Write the metrics of a PR fetched with GraphQL into the data frame. Returns True if the PR changes at most 5 lines."""
+
+    reviews = pr['reviews']['nodes']
+    issue_comments = pr['comments']['nodes']
+    review_comments = [comment for review in reviews for comment in review['comments']['nodes']]
+
+    df.at[index, 'java_code_changes'] = sum(file['additions'] + file['deletions']
+                                            for file in pr['files']['nodes'] if file['path'].endswith('.java'))
+
+    # Same definition as the REST collector: issue comments + review comments + non-empty reviews
+    nonempty_reviews = sum(1 for review in reviews if review['body'])
+    df.at[index, 'comments'] = pr['comments']['totalCount'] + len(review_comments) + nonempty_reviews
+    df.at[index, 'impure_comments'] = sum(1 for comment in issue_comments + review_comments
+                                          if is_impure_graphql_comment(comment))
+
+    if pr['mergedAt']:
+        linked_issue_date = ((linked_issue or {}).get('issueOrPullRequest') or {}).get('createdAt')
+        timestamps[index] = (pr['createdAt'], pr['mergedAt'], linked_issue_date)
+
+    return pr['additions'] + pr['deletions'] <= 5
+
+
+def collect_metrics_graphql(df, timestamps):
+    """Collect the metrics of all PRs with batched GraphQL queries. Returns the number of PRs with at most 5 changed lines."""
 
     less_than_5_lines = 0
-    for index, row in tqdm(df.iterrows(), total=len(df)):
-        pr_url = row['pr_url']
-        pr_number = pr_url.split("/")[-1]
-        repo_full_name = row['repository']
-
-        try:
-            response = safe_get(f"https://api.github.com/repos/{repo_full_name}/pulls/{pr_number}", HEADERS)
-            if response:
-                pr_data = response.json()
-
-                # <------ Calculate total changes ------>
-                if pr_data['additions'] + pr_data['deletions'] <= 5:
-                    less_than_5_lines += 1
-
-                # <------ Calculate java code changes ------>
-                if pr_data['diff_url']:
-                    total_java_code_changes = count_java_code_changes(repo_full_name, pr_number, pr_data['diff_url'])
-                    if total_java_code_changes is not None:
-                        df.at[index, 'java_code_changes'] = total_java_code_changes
-                else:
-                    print(f"No diff URL for PR {pr_number} in {repo_full_name}")
-
-                # <------ Calculate comments count ------>
-                total_comments = pr_data['comments'] + pr_data['review_comments']
-                reviews = get_pr_reviews_count(repo_full_name, pr_number)
-                df.at[index, 'comments'] = total_comments + reviews
-                df.at[index, 'impure_comments'] = count_impure_pr_comments(pr_data['comments_url'],
-                                                                           pr_data['review_comments_url'])
-
-                # <------ Calculate time to merge and detection to resolution ------>
-                resolved_at = pr_data.get('merged_at')
-
-                if resolved_at:
-                    df.at[index, 'resolved_at'] = resolved_at
-
-                    resolved_at_dt = datetime.strptime(resolved_at, "%Y-%m-%dT%H:%M:%SZ")
-                    created_at = datetime.strptime(pr_data['created_at'], "%Y-%m-%dT%H:%M:%SZ")
-                    df.at[index, 'time_to_merge'] = (resolved_at_dt - created_at).total_seconds() / 3600  # in hours
-
-                    detected_at = pd.NA
-                    if pd.notna(row['linked_issue']):
-                        # Detected_at is the date of the linked issue
-                        detected_at = get_issue_date(row['linked_issue'])
-                        df.at[index, 'detected_at'] = detected_at
-                    elif pd.notna(row['detected_at']):
-                        # Detected_at was added manually
-                        detected_at = row['detected_at']
-
-                    if pd.notna(detected_at):
-                        detected_at_dt = datetime.strptime(detected_at, "%Y-%m-%dT%H:%M:%SZ")
-                        df.at[index, 'time_from_detection_to_resolution'] = (resolved_at_dt - detected_at_dt).total_seconds() / 3600  # in hours
-
-        except Exception as e:
-            print(f"Error processing {pr_url}: {e}")
-
-    df.to_csv(OUTPUT_CSV, index=False)
+    rows = list(df.iterrows())
+    batches = [rows[i:i + GRAPHQL_BATCH_SIZE] for i in range(0, len(rows), GRAPHQL_BATCH_SIZE)]
+
+    for batch in tqdm(batches):
+        data = get_client().graphql(build_metrics_query(batch))
+
+        for index, row in batch:
+            pr = ((data or {}).get(f'pr{index}') or {}).get('pullRequest')
+            if pr is None or is_truncated(pr):
+                # The query failed or the PR has more comments/reviews/files than one page holds
+                less_than_5_lines += collect_metrics_rest(df, index, row, timestamps)
+                continue
+
+            try:
+                less_than_5_lines += apply_graphql_metrics(df, index, row, pr, data.get(f'issue{index}'), timestamps)
+            except Exception as e:
+                print(f"Error processing {row['pr_url']}: {e}")
+
+    return less_than_5_lines
+
+
+def main():
+    df = read_table(INPUT_CSV)
+    for column in ['detected_at', 'resolved_at']:
+        # Columns without any value are not recognized as timestamps when loading
+        df[column] = to_timestamps(df[column])
+
+    timestamps = {}
+    if COLLECTOR == 'graphql':
+        less_than_5_lines = collect_metrics_graphql(df, timestamps)
+    else:
+        less_than_5_lines = 0
+        for index, row in tqdm(df.iterrows(), total=len(df)):
+            less_than_5_lines += collect_metrics_rest(df, index, row, timestamps)
+
+    compute_durations(df, timestamps)
+
+    write_table(df, OUTPUT_CSV)
     print(f'{less_than_5_lines} PRs ({less_than_5_lines / len(df) * 100:.2f}%) have at most 5 lines of changes')
+    get_client().print_summary()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
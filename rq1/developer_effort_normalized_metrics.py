@@ -1,313 +1,358 @@
 import os
-import time
 import json
+import threading
 import numpy as np
-import pandas as pd
-import requests
-from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
+
+from common.datasets import read_table, timestamp_array, write_table
+from common.github_client import api_url, get_client, next_page_url
+from rq1.normalization import RepoBaseline, normalize
 
-# In the run configuration, set the GITHUB_TOKEN environment variable
-GITHUB_TOKEN = os.getenv('GITHUB_TOKEN')
 INPUT_CSV = '../data/final_version_conflict_prs.csv'
 OUTPUT_CSV = 'result_rq1_version_conflict_prs.csv'
-
-HEADERS = {
-    'Authorization': f'Bearer {GITHUB_TOKEN}',
-    'Accept': 'application/vnd.github+json'
+REFRESH_BASELINES = False  # update the cached baselines with the PRs merged since the last run
+GRAPHQL_PAGE_SIZE = 100    # merged PRs per comment statistics query
+HOUR = np.timedelta64(1, 'h')
+NORMALIZATION = 'zscore'   # 'zscore', 'log' (z-score of log1p) or 'robust' (median/MAD), see rq1/normalization.py
+CHECKPOINT_PAGES = 50      # crawled pages between two writes of a cache file (also written when a repository is done)
+
+COMMENT_STATS_QUERY = """
+query($owner: String!, $name: String!, $after: String, $field: IssueOrderField!, $direction: OrderDirection!) {
+  repository(owner: $owner, name: $name) {
+    pullRequests(states: MERGED, first: %d, after: $after, orderBy: {field: $field, direction: $direction}) {
+      nodes {
+        number
+        mergedAt
+        updatedAt
+        comments { totalCount }
+        reviews(first: 100) {
+          totalCount
+          nodes {
+            body
+            comments { totalCount }
+          }
+        }
+      }
+      pageInfo {
+        hasNextPage
+        endCursor
+      }
+    }
+  }
 }
+""" % GRAPHQL_PAGE_SIZE
+
+REVIEWS_QUERY = """
+query($owner: String!, $name: String!, $number: Int!, $after: String) {
+  repository(owner: $owner, name: $name) {
+    pullRequest(number: $number) {
+      reviews(first: 100, after: $after) {
+        nodes {
+          body
+          comments { totalCount }
+        }
+        pageInfo {
+          hasNextPage
+          endCursor
+        }
+      }
+    }
+  }
+}
+"""
 
 
-def safe_get(url, headers, max_retries=5):
-    """Make a GET request to the GitHub API with rate limit handling."""
-
-    for i in range(max_retries):
-        response = requests.get(url, headers=headers)
-        if response.status_code == 200:
-            return response
-        elif response.status_code == 403:
-            wait = 2 ** i
-            print(f"Rate limited. Waiting {wait}s...")
-            time.sleep(wait)
-        else:
-            print(f"Request failed: {response.status_code} - {response.text}")
-            break
-
-    return None
-
-
-def try_load_cache(cache_file, unique_repos):
+def try_load_cache(cache_file):
     """Load the cache from a file if it exists, otherwise create an empty cache."""
 
-    repo_mean = {}
-    repo_std = {}
-
-    # Load cache if it exists
     if os.path.exists(cache_file):
         with open(cache_file) as f:
-            cache = json.load(f)
+            return json.load(f)
+    return {}
 
-        for repo in unique_repos:
-            if repo in cache:
-                repo_mean[repo] = cache[repo]['mean']
-                repo_std[repo] = cache[repo]['std']
-    else:
-        cache = {}
-    return cache, repo_mean, repo_std
 
+def is_complete(cache_entry):
+    """Entries of interrupted crawls hold the partial statistics and the cursor of the next page."""
+    return cache_entry is not None and 'cursor' not in cache_entry
 
-def concurrent_get_normalized_time_to_merge(df, unique_repos, cache_file):
-    """Fetch and normalize the time to merge for pull requests in all repositories."""
 
-    def get_repo_pr_merge_times(repo_full_name):
-        """Fetch the merge times of all pull requests for a given repository."""
+def is_refreshable(cache_entry):
+    """Complete entries with the aggregate state and high-water mark can be updated with newly merged PRs only."""
+    return (is_complete(cache_entry) and
+            all(key in cache_entry for key in ('count', 'mean', 'm2', 'log', 'histogram', 'high_water_mark')))
+
 
-        url = f"https://api.github.com/repos/{repo_full_name}/pulls?state=closed&per_page=100"
-        pr_merge_times = []
+def save_cache(cache_file, cache):
+    """Write the cache to a temporary file first, so an interrupted write cannot corrupt it."""
+    tmp_file = f"{cache_file}.tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp_file, cache_file)
+
+
+def fetch_repo_baselines(unique_repos, cache_file, fetch_page, refresh=False):
+    """
+    Compute per-repository statistics over all merged pull requests and keep them up to date in the cache file.
+
+    fetch_page(repo_full_name, cursor, newest_first) returns one page of merged PRs as a list of
+    (merged_at, updated_at, value) records (value is None for PRs that could not be measured) and the cursor of the
+    next page, or None if the page could not be fetched. With newest_first, the PRs are listed by their last update,
+    newest first.
+
+    Every cache entry stores the running statistics and the high-water mark, the latest merged_at folded into them.
+    Missing repositories are crawled completely. With refresh, complete entries are updated with the PRs merged after
+    their high-water mark only, and entries written before high-water marks existed are crawled again.
+    Returns the complete cache entries of the repositories, see RepoBaseline.
+    """
+
+    cache = try_load_cache(cache_file)
+    cache_lock = threading.Lock()
+    unsaved_pages = 0
+
+    def checkpoint(repo_full_name, entry, finished=True):
+        """Update the entry of a repository. The whole cache is rewritten, so only every CHECKPOINT_PAGES pages."""
+        nonlocal unsaved_pages
+        with cache_lock:
+            if entry is None:
+                cache.pop(repo_full_name, None)
+            else:
+                cache[repo_full_name] = entry
+            unsaved_pages += 1
+            if finished or unsaved_pages >= CHECKPOINT_PAGES:
+                save_cache(cache_file, cache)
+                unsaved_pages = 0
+
+    def fold(baseline, records):
+        values = [value for _, _, value in records if value is not None]
+        if len(values) < len(records):
+            print(f"Excluded {len(records) - len(values)} PRs due to errors")
+        baseline.push_many(values)
+
+    def crawl(repo_full_name, entry):
+        """
+        Fold the values of all merged pull requests of a repository into running statistics.
+        The partial statistics and the next page are checkpointed after every page, so an interrupted crawl resumes
+        from the last saved page.
+        """
+
+        baseline = RepoBaseline.from_dict(entry)
+        high_water_mark = entry.get('high_water_mark', '')
+        cursor = entry.get('cursor')
+
+        while True:
+            page = fetch_page(repo_full_name, cursor, False)
+            if page is None:
+                return None
 
-        while url:
-            response = safe_get(url, HEADERS)
-            if not response:
-                # possibly reached rate limit
+            records, cursor = page
+            fold(baseline, records)
+            high_water_mark = max([high_water_mark] + [merged_at for merged_at, _, _ in records])
+
+            if not cursor:
+                return baseline, high_water_mark
+            checkpoint(repo_full_name, {**baseline.to_dict(), 'high_water_mark': high_water_mark, 'cursor': cursor},
+                       finished=False)
+
+    def refresh_entry(repo_full_name, entry):
+        """
+        Fold the pull requests merged after the high-water mark into the statistics of a complete entry.
+        PRs are listed by their last update, newest first: merging updates a PR, so the listing can stop at the first
+        PR last updated before the high-water mark.
+        """
+
+        baseline = RepoBaseline.from_dict(entry)
+        high_water_mark = entry['high_water_mark']
+        new_high_water_mark = high_water_mark
+        cursor = None
+
+        while True:
+            page = fetch_page(repo_full_name, cursor, True)
+            if page is None:
                 return None
 
-            prs = response.json()
-            for pr in prs:
-                if pr.get("merged_at"):
-                    created_at = datetime.strptime(pr["created_at"], "%Y-%m-%dT%H:%M:%SZ")
-                    merged_at = datetime.strptime(pr["merged_at"], "%Y-%m-%dT%H:%M:%SZ")
-                    merge_time = (merged_at - created_at).total_seconds() / 3600  # in hours
-                    pr_merge_times.append(merge_time)
-
-            # Pagination
-            if 'link' in response.headers:
-                next_link = None
-                links = response.headers['link'].split(',')
-                for link in links:
-                    if 'rel="next"' in link:
-                        next_link = link[link.find('<') + 1: link.find('>')]
-                        break
-                url = next_link
-            else:
-                url = None
+            records, cursor = page
+            new_records = [record for record in records if record[0] > high_water_mark]
+            fold(baseline, new_records)
+            new_high_water_mark = max([new_high_water_mark] + [merged_at for merged_at, _, _ in new_records])
 
-        return pr_merge_times
+            if not cursor or any(updated_at < high_water_mark for _, updated_at, _ in records):
+                break
 
-    def fetch_merge_stats(repo_full_name):
-        """Fetch merge time statistics for a given repository."""
+        print(f"Refreshed {repo_full_name}: {baseline.count - entry['count']} PRs merged since {high_water_mark}")
+        return baseline, new_high_water_mark
+
+    def fetch_stats(repo_full_name):
+        """Fetch or refresh the statistics of a given repository."""
 
         try:
-            times = get_repo_pr_merge_times(repo_full_name)
-            if len(times) > 1:
-                merge_mean = float(np.mean(times))
-                merge_std = float(np.std(times))
-                print(f"Fetched {repo_full_name}: merged_prs={len(times)}, mean={merge_mean}, std={merge_std}")
+            entry = cache.get(repo_full_name, {})
+            if is_refreshable(entry):
+                result = refresh_entry(repo_full_name, entry)
+            else:
+                # Complete entries without a high-water mark cannot be updated in place
+                result = crawl(repo_full_name, {} if is_complete(entry) else entry)
+
+            if result is None:
+                return
 
-                return repo_full_name, merge_mean, merge_std
+            baseline, high_water_mark = result
+            if baseline.count > 1:
+                stats = baseline.stats
+                print(f"Fetched {repo_full_name}: merged_prs={stats.count}, mean={stats.mean}, std={stats.std}")
+                checkpoint(repo_full_name, {**baseline.to_dict(), 'high_water_mark': high_water_mark})
+            else:
+                checkpoint(repo_full_name, None)
         except Exception as e:
             print(f"Failed for {repo_full_name}: {e}")
-        return repo_full_name, None, None
-
-    cache, repo_pr_avg_merge_time, repo_pr_stdev_merge_time = try_load_cache(cache_file, unique_repos)
 
-    # Fetch missing repositories
-    to_fetch = [repo for repo in unique_repos if repo not in cache]
+    # Fetch missing repositories and continue interrupted crawls, and with refresh, update all complete entries
+    to_fetch = [repo for repo in unique_repos if refresh or not is_complete(cache.get(repo))]
 
     if len(to_fetch) > 0:
-        with ThreadPoolExecutor(max_workers=8) as executor:
-            results = list(executor.map(fetch_merge_stats, to_fetch))
-
-        for repo, mean, std in results:
-            if mean is not None:
-                repo_pr_avg_merge_time[repo] = mean
-                repo_pr_stdev_merge_time[repo] = std
-                cache[repo] = {'mean': mean, 'std': std}
-
-        # Save updated cache
-        with open(cache_file, 'w') as f:
-            json.dump(cache, f, indent=2)
-
-        # Update normalized time_to_merge column
-        for index, row in df.iterrows():
-            try:
-                repo = row['repository']
-                time_to_merge = row['time_to_merge']
-
-                repo_mean = repo_pr_avg_merge_time.get(repo)
-                repo_std = repo_pr_stdev_merge_time.get(repo)
-
-                if repo_mean and repo_std and repo_std != 0:
-                    df.at[index, 'time_to_merge_normalized'] = (time_to_merge - repo_mean) / repo_std
-
-            except Exception as e:
-                print(f"Error processing {row['pr_url']}: {e}")
-
-
-def concurrent_get_normalized_no_of_comments(df, unique_repos, cache_file):
-    """Fetch and normalize the number of comments for merged pull requests in all repositories."""
-
-    def get_pr_reviews_count_graphql(repo_full_name, pr_number):
-        """Fetch the number of non-empty reviews for a pull request using GraphQL."""
-        owner, repo = repo_full_name.split("/")
-        non_empty_reviews = 0
-        has_next_page = True
-        after_cursor = "null"  # first page has no cursor
-
-        def build_query(after_cursor):
-            cursor_part = f', after: "{after_cursor}"' if after_cursor != "null" else ""
-            return f"""
-            {{
-              repository(owner: "{owner}", name: "{repo}") {{
-                pullRequest(number: {pr_number}) {{
-                  reviews(first: 100{cursor_part}) {{
-                    nodes {{
-                      body
-                    }}
-                    pageInfo {{
-                      hasNextPage
-                      endCursor
-                    }}
-                  }}
-                }}
-              }}
-            }}
-            """
-
-        url = "https://api.github.com/graphql"
-
-        while has_next_page:
-            query = build_query(after_cursor)
-            response = requests.post(url, json={"query": query}, headers=HEADERS)
-
-            if response.status_code != 200 or response.json().get("errors"):
-                print(f"GraphQL query failed: {response.status_code} - {response.text}")
-                return None
-
-            pr_data = response.json()["data"]["repository"]["pullRequest"]
+        print(f"Fetching data from {len(to_fetch)} repositories...")
+        try:
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                list(executor.map(fetch_stats, to_fetch))
+        finally:
+            # Keeps the pages crawled since the last write when the run is interrupted
+            with cache_lock:
+                save_cache(cache_file, cache)
+
+    return {repo: cache[repo] for repo in unique_repos if is_complete(cache.get(repo))}
+
+
+def fetch_merge_time_page(repo_full_name, cursor, newest_first):
+    """
+    Fetch one page of closed PRs with the REST API and compute the time to merge of the merged ones, in hours.
+
+    Crawls list the PRs by creation, oldest first, so PRs closed after an interruption are added after the folded
+    pages. PR numbers grow with the creation time, so the cursor holds the highest number listed so far, and PRs
+    listed again because the pages shifted in the meantime are dropped. Refreshes list the PRs by their last update,
+    newest first, and drop the merged PRs they already listed.
+    """
+
+    if isinstance(cursor, str):
+        # URL of the next page, checkpointed before cursors held the listed PRs
+        cursor = {'url': cursor}
+    cursor = cursor or {}
+    order = "sort=updated&direction=desc" if newest_first else "sort=created&direction=asc"
+    url = cursor.get('url') or api_url(f"repos/{repo_full_name}/pulls?state=closed&per_page=100&{order}")
+    response = get_client().get(url)
+    if not response:
+        return None
+
+    prs = response.json()
+    if newest_first:
+        seen = set(cursor.get('seen', []))
+        merged_prs = [pr for pr in prs if pr.get("merged_at") and pr["number"] not in seen]
+        listed = {'seen': sorted(seen | {pr["number"] for pr in merged_prs})}
+    else:
+        after = cursor.get('after', 0)
+        merged_prs = [pr for pr in prs if pr.get("merged_at") and pr["number"] > after]
+        listed = {'after': max([after] + [pr["number"] for pr in prs])}
 
-            reviews_data = pr_data["reviews"]
-            non_empty_reviews += sum(1 for r in reviews_data["nodes"] if r["body"])
+    merged_at = [pr["merged_at"] for pr in merged_prs]
+    hours = (timestamp_array(merged_at) - timestamp_array([pr["created_at"] for pr in merged_prs])) / HOUR
 
-            has_next_page = reviews_data["pageInfo"]["hasNextPage"]
-            after_cursor = reviews_data["pageInfo"]["endCursor"]
+    next_url = next_page_url(response)
+    records = list(zip(merged_at, [pr["updated_at"] for pr in merged_prs], hours.tolist()))
+    return records, {'url': next_url, **listed} if next_url else None
 
-        return non_empty_reviews
 
-    def get_no_of_comments(repo_full_name, pr):
-        """Fetch the total number of comments for a pull request."""
+def get_pr_review_counts(repo_full_name, pr_number):
+    """Page through all reviews of a pull request. Returns the number of non-empty reviews and of review comments."""
+    owner, name = repo_full_name.split("/")
+    non_empty_reviews = 0
+    review_comments = 0
+    variables = {'owner': owner, 'name': name, 'number': pr_number, 'after': None}
 
-        pr_data = safe_get(pr['url'], HEADERS)
-        if not pr_data:
+    while True:
+        data = get_client().graphql(REVIEWS_QUERY, variables)
+        if data is None:
             return None
 
-        pr_data = pr_data.json()
-        total_comments = pr_data['comments'] + pr_data['review_comments']
-        reviews = get_pr_reviews_count_graphql(repo_full_name, pr['number'])
+        reviews_data = data["repository"]["pullRequest"]["reviews"]
+        non_empty_reviews += sum(1 for r in reviews_data["nodes"] if r["body"])
+        review_comments += sum(r["comments"]["totalCount"] for r in reviews_data["nodes"])
 
-        return total_comments + reviews
+        if not reviews_data["pageInfo"]["hasNextPage"]:
+            return non_empty_reviews, review_comments
+        variables['after'] = reviews_data["pageInfo"]["endCursor"]
 
-    def get_repo_pr_comments(repo_full_name):
-        """Fetch the number of comments on all merged PRs for a given repository."""
 
-        url = f"https://api.github.com/repos/{repo_full_name}/pulls?state=closed&per_page=100"
-        pr_comments = []
+def count_pr_comments(repo_full_name, pr):
+    """Total number of comments of a PR: issue comments + review comments + non-empty reviews."""
 
-        while url:
-            response = safe_get(url, HEADERS)
-            if not response:
-                return None
+    reviews = pr["reviews"]
+    if reviews["totalCount"] > len(reviews["nodes"]):
+        # More than 100 reviews, page through all of them
+        counts = get_pr_review_counts(repo_full_name, pr["number"])
+        if counts is None:
+            return None
+        non_empty_reviews, review_comments = counts
+    else:
+        non_empty_reviews = sum(1 for r in reviews["nodes"] if r["body"])
+        review_comments = sum(r["comments"]["totalCount"] for r in reviews["nodes"])
 
-            prs = response.json()
-            merged_prs = [pr for pr in prs if pr.get("merged_at")]
+    return pr["comments"]["totalCount"] + review_comments + non_empty_reviews
 
-            with ThreadPoolExecutor(max_workers=8) as executor:
-                futures = [executor.submit(get_no_of_comments, repo_full_name, pr) for pr in merged_prs]
-
-                for future in as_completed(futures):
-                    num_comments = future.result()
-                    if num_comments is not None:
-                        pr_comments.append(num_comments)
-                    else:
-                        print(f"Excluded one PR due to error")
-
-            print(f"So far collected data from {len(pr_comments)} PRs for {repo_full_name}")
-
-            # Pagination
-            next_link = None
-            if 'link' in response.headers:
-                links = response.headers['link'].split(',')
-                for link in links:
-                    if 'rel="next"' in link:
-                        next_link = link[link.find('<') + 1: link.find('>')]
-                        break
-            url = next_link
-
-        return pr_comments
-
-    def fetch_comment_stats(repo_full_name):
-        """Fetch comment statistics for merged PRs in a given repository."""
-        try:
-            comments = get_repo_pr_comments(repo_full_name)
-            if comments and len(comments) > 1:
-                comment_mean = float(np.mean(comments))
-                comment_std = float(np.std(comments))
-                print(f"Fetched {repo_full_name}: merged_prs={len(comments)}, mean_comments={comment_mean}, std_comments={comment_std}")
 
-                return repo_full_name, comment_mean, comment_std
-        except Exception as e:
-            print(f"Failed for {repo_full_name}: {e}")
-        return repo_full_name, None, None
+def fetch_comment_page(repo_full_name, cursor, newest_first):
+    """Fetch the comment counts of one page of merged PRs with a single GraphQL query."""
 
-    cache, repo_comment_mean, repo_comment_std = try_load_cache(cache_file, unique_repos)
-    to_fetch = [repo for repo in unique_repos if repo not in cache]
+    owner, name = repo_full_name.split("/")
+    data = get_client().graphql(COMMENT_STATS_QUERY, {
+        'owner': owner,
+        'name': name,
+        'after': cursor,
+        # Creation order does not change between runs, so the cursor of an interrupted crawl stays valid
+        'field': 'UPDATED_AT' if newest_first else 'CREATED_AT',
+        'direction': 'DESC' if newest_first else 'ASC'
+    })
+    if data is None:
+        return None
 
-    if len(to_fetch) == 0:
-        return
+    pull_requests = data["repository"]["pullRequests"]
+    records = [(pr["mergedAt"], pr["updatedAt"], count_pr_comments(repo_full_name, pr))
+               for pr in pull_requests["nodes"]]
 
-    print(f"Fetching comment data from {len(to_fetch)} repositories...")
-    with ThreadPoolExecutor(max_workers=8) as executor:
-        results = list(executor.map(fetch_comment_stats, to_fetch))
+    page_info = pull_requests["pageInfo"]
+    return records, page_info["endCursor"] if page_info["hasNextPage"] else None
 
-    for repo, mean, std in results:
-        if mean is not None:
-            repo_comment_mean[repo] = mean
-            repo_comment_std[repo] = std
-            cache[repo] = {'mean': mean, 'std': std}
 
-    # Save updated cache
-    with open(cache_file, 'w') as f:
-        json.dump(cache, f, indent=2)
+def concurrent_get_normalized_time_to_merge(df, unique_repos, cache_file, refresh=False):
+    """Fetch and normalize the time to merge for pull requests in all repositories."""
 
-    for index, row in df.iterrows():
-        try:
-            repo = row['repository']
-            comments = row['comments']
+    baselines = fetch_repo_baselines(unique_repos, cache_file, fetch_merge_time_page, refresh)
+    df['time_to_merge_normalized'] = normalize(df, 'time_to_merge', baselines, NORMALIZATION)
 
-            mean = repo_comment_mean.get(repo)
-            std = repo_comment_std.get(repo)
 
-            if mean and std and std != 0:
-                df.at[index, 'comments_normalized'] = (comments - mean) / std
+def concurrent_get_normalized_no_of_comments(df, unique_repos, cache_file, refresh=False):
+    """Fetch and normalize the number of comments for merged pull requests in all repositories."""
 
-        except Exception as e:
-            print(f"Error processing {row['pr_url']}: {e}")
+    baselines = fetch_repo_baselines(unique_repos, cache_file, fetch_comment_page, refresh)
+    df['comments_normalized'] = normalize(df, 'comments', baselines, NORMALIZATION)
 
 
 def main():
-    df = pd.read_csv(INPUT_CSV)
+    df = read_table(INPUT_CSV)
 
     unique_repos = df['repository'].unique()
 
-    repo_df = pd.read_csv("../data/java_repos_from_April_2015_min_50_stars_min_50_issues.csv")
-    repo_df = repo_df[repo_df['name'].isin(unique_repos)]
+    repo_df = read_table("../data/java_repos_from_April_2015_min_50_stars_min_50_issues.csv",
+                         columns=['name', 'totalPullRequests', 'openPullRequests'],
+                         filters=[('name', 'in', list(unique_repos))])
     repo_df = repo_df.sort_values(by=["totalPullRequests", "openPullRequests"], ascending=True)
 
     unique_repos = repo_df['name'].iloc[:72].unique()
 
-    # concurrent_get_normalized_time_to_merge(df, unique_repos, cache_file='merge_times_cache.json')
-    concurrent_get_normalized_no_of_comments(df, unique_repos, cache_file='comments_cache.json')
+    # concurrent_get_normalized_time_to_merge(df, unique_repos, cache_file='merge_times_cache.json',
+    #                                         refresh=REFRESH_BASELINES)
+    concurrent_get_normalized_no_of_comments(df, unique_repos, cache_file='comments_cache.json',
+                                             refresh=REFRESH_BASELINES)
 
-    df.to_csv(OUTPUT_CSV, index=False)
+    write_table(df, OUTPUT_CSV)
+    get_client().print_summary()
 
 
 if __name__ == "__main__":
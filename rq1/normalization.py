@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+from rq1.running_stats import LogHistogram, RunningStats
+
+MAD_TO_STD = 1.4826  # scales the MAD to the standard deviation for normally distributed values
+
+
+class RepoBaseline:
+    """
+    Mergeable baseline of one repository: running statistics of the values and of log1p(value), and a histogram for
+    the median/MAD. This is the state stored in comments_cache.json and merge_times_cache.json.
+    """
+
+    def __init__(self, stats=None, log_stats=None, histogram=None):
+        self.stats = stats or RunningStats()
+        self.log_stats = log_stats or RunningStats()
+        self.histogram = histogram or LogHistogram()
+
+    @property
+    def count(self):
+        return self.stats.count
+
+    def push_many(self, values):
+        values = np.asarray(values, dtype=float)
+        self.stats.push_many(values)
+        self.log_stats.push_many(np.log1p(np.maximum(values, 0)))
+        self.histogram.push_many(values)
+
+    def to_dict(self):
+        return {**self.stats.to_dict(), 'std': self.stats.std if self.count else None,
+                'log': self.log_stats.to_dict(), 'histogram': self.histogram.to_dict()}
+
+    @classmethod
+    def from_dict(cls, entry):
+        return cls(RunningStats.from_dict(entry), RunningStats.from_dict(entry.get('log', {})),
+                   LogHistogram.from_dict(entry.get('histogram', {})))
+
+
+def zscore_center_scale(entry):
+    return entry.get('mean'), entry.get('std')
+
+
+def log_center_scale(entry):
+    if 'log' not in entry:
+        return None, None
+    log_stats = RunningStats.from_dict(entry['log'])
+    return log_stats.mean, log_stats.std
+
+
+def robust_center_scale(entry):
+    if 'histogram' not in entry:
+        return None, None
+    histogram = LogHistogram.from_dict(entry['histogram'])
+    return histogram.median, histogram.mad * MAD_TO_STD
+
+
+# method -> (transform applied to the values, center and scale of a cache entry in the transformed space)
+NORMALIZERS = {
+    'zscore': (lambda values: values, zscore_center_scale),
+    'log': (lambda values: np.log1p(values.clip(lower=0)), log_center_scale),
+    'robust': (lambda values: values, robust_center_scale),
+}
+
+
+def baseline_frame(baselines, method='zscore'):
+    """Center and scale of every repository for a normalization method, from the cache entries per repository."""
+    _, center_scale = NORMALIZERS[method]
+    rows = {repo: center_scale(entry) for repo, entry in baselines.items()}
+    return pd.DataFrame.from_dict(rows, orient='index', columns=['center', 'scale'], dtype=float)
+
+
+def normalize(df, column, baselines, method='zscore', repo_column='repository'):
+    """
+    Normalize a column against the baseline of each row's repository in one vectorized pass.
+    Rows of repositories without a baseline or with a scale of 0 are NaN.
+    """
+    transform, _ = NORMALIZERS[method]
+    stats = baseline_frame(baselines, method)
+
+    center = df[repo_column].map(stats['center'])
+    scale = df[repo_column].map(stats['scale'])
+    return (transform(df[column].astype(float)) - center) / scale.where(scale > 0)
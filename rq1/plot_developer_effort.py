@@ -1,10 +1,11 @@
 import numpy as np
-import pandas as pd
 import matplotlib
 import matplotlib.pyplot as plt
 import seaborn as sns
 from matplotlib.ticker import MaxNLocator
 
+from common.datasets import read_table
+
 INPUT_CSV = '../data/final_version_conflict_prs.csv'
 
 
@@ -118,7 +119,7 @@ def main():
     })
     sns.set_theme(style="whitegrid", font_scale=0.2, rc={"grid.linewidth": 0.3})
 
-    df = pd.read_csv(INPUT_CSV)
+    df = read_table(INPUT_CSV)
 
     create_boxplot(df, columns=['comments'], figname='developer_effort_metrics_a')
     at_most_5_comments = len(df[df['comments'] <= 5])
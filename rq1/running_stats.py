@@ -0,0 +1,123 @@
+import math
+from collections import Counter
+
+import numpy as np
+
+
+class RunningStats:
+    """
+    Streaming mean and standard deviation (Welford's algorithm).
+
+    Only the count, the mean and the sum of squared differences from the mean (m2) are kept, so the statistics of
+    any number of values take constant memory. The state can be saved with to_dict(), restored with from_dict() and
+    combined with the state of another batch with merge().
+    """
+
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def push(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def push_many(self, values):
+        """Fold a batch of values at once: compute its statistics with NumPy and merge them."""
+        values = np.asarray(values, dtype=float)
+        if values.size == 0:
+            return
+        mean = values.mean()
+        self.merge(RunningStats(int(values.size), float(mean), float(((values - mean) ** 2).sum())))
+
+    def merge(self, other):
+        """Fold the statistics of another (disjoint) set of values into this one (Chan et al.)."""
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            return self
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        return self
+
+    @property
+    def variance(self):
+        """Population variance, the same as np.var with ddof=0."""
+        return self.m2 / self.count if self.count else float('nan')
+
+    @property
+    def std(self):
+        """Population standard deviation, the same as np.std with ddof=0."""
+        return math.sqrt(self.variance)
+
+    def to_dict(self):
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('count', 0), data.get('mean', 0.0), data.get('m2', 0.0))
+
+
+class LogHistogram:
+    """
+    Mergeable histogram of non-negative values, used to estimate the median and the median absolute deviation of a
+    stream without keeping the values.
+
+    Bin i counts the values with round(log1p(value) / WIDTH) == i, so the estimates are off by at most WIDTH / 2 in
+    log1p space (about 0.5% of 1 + value) while a repository needs a few hundred bins at most.
+    """
+
+    WIDTH = 0.01
+
+    def __init__(self, counts=None):
+        self.counts = Counter(counts or {})
+
+    def push_many(self, values):
+        values = np.maximum(np.asarray(values, dtype=float), 0)
+        self.counts.update(np.rint(np.log1p(values) / self.WIDTH).astype(int).tolist())
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        return self
+
+    @property
+    def count(self):
+        return sum(self.counts.values())
+
+    def _bins(self):
+        bins = np.array(sorted(self.counts), dtype=float)
+        return np.expm1(bins * self.WIDTH), np.array([self.counts[int(b)] for b in bins])
+
+    @staticmethod
+    def _weighted_median(values, weights):
+        order = np.argsort(values)
+        cumulative = np.cumsum(weights[order])
+        return float(values[order][np.searchsorted(cumulative, cumulative[-1] / 2)])
+
+    @property
+    def median(self):
+        if not self.counts:
+            return float('nan')
+        return self._weighted_median(*self._bins())
+
+    @property
+    def mad(self):
+        """Median absolute deviation from the median."""
+        if not self.counts:
+            return float('nan')
+        values, weights = self._bins()
+        return self._weighted_median(np.abs(values - self._weighted_median(values, weights)), weights)
+
+    def to_dict(self):
+        return {str(bin_index): count for bin_index, count in sorted(self.counts.items())}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls({int(bin_index): count for bin_index, count in data.items()})
@@ -0,0 +1,295 @@
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+CLONE_CACHE_DIR = os.getenv('CLONE_CACHE_DIR', 'clones')
+MAX_CLONE_CACHE_SIZE = 50 * 1024 ** 3   # bytes, least recently used mirrors are deleted first
+CHECKOUT_MODE = 'sparse'                # 'sparse': only the build descriptors of the commit, 'full': complete clone
+SPARSE_PATTERNS = ['**/pom.xml', '.mvn/**']
+
+
+def git(*args, cwd=None):
+    return subprocess.run(["git", *args], cwd=cwd, check=True)
+
+
+def directory_size(path):
+    size = 0
+    for entry in Path(path).rglob('*'):
+        try:
+            if entry.is_file():
+                size += entry.stat().st_size
+        except FileNotFoundError:
+            # Removed while walking, e.g. the worktree metadata of a job that just finished
+            pass
+    return size
+
+
+class CloneCache:
+    """
+    Bare mirrors of the analysed repositories, shared by all jobs and runs.
+
+    Every repository is cloned once, into a directory named after the hash of its normalized URL, and later updated
+    with git fetch only when a requested commit is missing. Jobs check out commits as worktrees of the mirror, which
+    costs no network and little disk. When the mirrors take more than max_size bytes, the least recently used mirrors
+    without worktrees are deleted. The size of a mirror is measured when it changes (clone, fetch, checkout of missing
+    blobs), so eviction only sums the known sizes.
+
+    In sparse mode, a mirror is a partial clone holding only the requested commits (fetched with --depth 1 and
+    --filter=blob:none), and worktrees only check out the SPARSE_PATTERNS. The blobs of the other files are downloaded
+    on demand, when expand() turns a worktree into a full checkout.
+    """
+
+    def __init__(self, root=CLONE_CACHE_DIR, max_size=MAX_CLONE_CACHE_SIZE, mode=CHECKOUT_MODE):
+        if mode not in ('sparse', 'full'):
+            raise ValueError(f"Unknown checkout mode: {mode}")
+        self.root = Path(root).resolve()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.mode = mode
+        self.hits = 0
+        self.fetches = 0
+        self.clones = 0
+        self.evictions = 0
+        self.expansions = 0
+        self._lock = threading.Lock()
+        self._mirror_locks = defaultdict(threading.Lock)
+        self._in_use = defaultdict(int)
+        self._sizes = {}    # bytes per mirror
+        for trash in self.root.glob('.evicted-*'):
+            # Left over by an interrupted eviction
+            shutil.rmtree(trash, ignore_errors=True)
+
+    @staticmethod
+    def key(repo_url):
+        """https://github.com/Owner/Repo.git, git@github.com:owner/repo and github.com/owner/repo share one key."""
+        normalized = re.sub(r'^(\w+://)?([^@/]+@)?', '', repo_url.strip().lower()).replace(':', '/')
+        normalized = normalized.rstrip('/').removesuffix('.git')
+        digest = hashlib.sha256(normalized.encode()).hexdigest()[:16]
+        return f"{'_'.join(normalized.split('/')[-2:])}-{digest}"
+
+    def mirror_path(self, repo_url):
+        # Partial mirrors lack most objects, so they are kept apart from the full mirrors of the same repository
+        suffix = '.partial.git' if self.mode == 'sparse' else '.git'
+        return self.root / f"{self.key(repo_url)}{suffix}"
+
+    def mirror_lock(self, mirror):
+        with self._lock:
+            return self._mirror_locks[mirror]
+
+    def measure(self, mirror):
+        """Record the size of a mirror after it changed. Call with the mirror lock held."""
+        size = directory_size(mirror)
+        with self._lock:
+            self._sizes[mirror] = size
+
+    @contextmanager
+    def using(self, mirror):
+        """Keep a mirror from being evicted for the duration of the with block."""
+        with self._lock:
+            self._in_use[mirror] += 1
+        try:
+            yield mirror
+        finally:
+            with self._lock:
+                self._in_use[mirror] -= 1
+
+    @staticmethod
+    def has_commit(mirror, commit_sha):
+        # rev-list --missing never downloads objects, while cat-file would fetch a missing commit of a partial mirror
+        # (and all its history) from the promisor remote
+        result = subprocess.run(["git", "--git-dir", str(mirror), "rev-list", "--no-walk", "--missing=allow-promisor",
+                                 f"{commit_sha}^{{commit}}"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return result.returncode == 0
+
+    def ensure_commit(self, repo_url, commit_sha):
+        """Clone or update the mirror of a repository until it contains the commit. Call with the mirror lock held."""
+        mirror = self.mirror_path(repo_url)
+
+        if self.mode == 'sparse':
+            return self.ensure_partial_commit(repo_url, commit_sha)
+
+        changed = True
+
+        if not mirror.exists():
+            print(f"Cloning repository: {repo_url}")
+            tmp_mirror = mirror.with_suffix('.tmp')
+            shutil.rmtree(tmp_mirror, ignore_errors=True)
+            git("clone", "--mirror", repo_url, str(tmp_mirror))
+            # Renamed when complete, so an interrupted clone is not mistaken for a mirror
+            tmp_mirror.rename(mirror)
+            self.clones += 1
+        elif self.has_commit(mirror, commit_sha):
+            self.hits += 1
+            changed = False
+        else:
+            print(f"Fetching {repo_url}...")
+            git("--git-dir", str(mirror), "fetch", "--prune", "origin")
+            self.fetches += 1
+
+        if not self.has_commit(mirror, commit_sha):
+            # Commits that are only reachable from refs a mirror does not fetch
+            git("--git-dir", str(mirror), "fetch", "origin", commit_sha)
+
+        if changed:
+            self.measure(mirror)
+        (mirror / "last_used").touch()
+        return mirror
+
+    def ensure_partial_commit(self, repo_url, commit_sha):
+        """Fetch only the commit and its trees into the partial mirror. Call with the mirror lock held."""
+        mirror = self.mirror_path(repo_url)
+        changed = True
+
+        if not mirror.exists():
+            print(f"Creating partial mirror of {repo_url}")
+            tmp_mirror = mirror.with_suffix('.tmp')
+            shutil.rmtree(tmp_mirror, ignore_errors=True)
+            git("init", "--quiet", "--bare", str(tmp_mirror))
+            git("--git-dir", str(tmp_mirror), "remote", "add", "origin", repo_url)
+            # Lets git download missing blobs from origin when a checkout needs them
+            git("--git-dir", str(tmp_mirror), "config", "remote.origin.promisor", "true")
+            git("--git-dir", str(tmp_mirror), "config", "remote.origin.partialclonefilter", "blob:none")
+            tmp_mirror.rename(mirror)
+            self.clones += 1
+
+        if self.has_commit(mirror, commit_sha):
+            self.hits += 1
+            changed = False
+        else:
+            print(f"Fetching commit {commit_sha} of {repo_url}...")
+            git("--git-dir", str(mirror), "fetch", "--quiet", "--depth", "1", "--filter=blob:none", "origin",
+                commit_sha)
+            self.fetches += 1
+
+        if changed:
+            self.measure(mirror)
+        (mirror / "last_used").touch()
+        return mirror
+
+    def checkout(self, mirror, commit_sha, worktree_dir):
+        if self.mode == 'full':
+            git("--git-dir", str(mirror), "-c", "advice.detachedHead=false", "worktree", "add", "--force",
+                "--detach", str(worktree_dir), commit_sha)
+            return
+
+        git("--git-dir", str(mirror), "worktree", "add", "--quiet", "--force", "--no-checkout", "--detach",
+            str(worktree_dir), commit_sha)
+        git("sparse-checkout", "set", "--no-cone", *SPARSE_PATTERNS, cwd=worktree_dir)
+        # Populates the index and the sparse working tree, downloading only the blobs of the matching files
+        git("read-tree", "-mu", "HEAD", cwd=worktree_dir)
+        self.measure(mirror)
+
+    def expand(self, repo_url, worktree_dir):
+        """Turn a sparse worktree into a full checkout, for builds that need more than the build descriptors."""
+        if self.mode == 'full':
+            return
+        print(f"Expanding {worktree_dir} to a full checkout...")
+        mirror = self.mirror_path(repo_url)
+        with self.mirror_lock(mirror):
+            git("sparse-checkout", "disable", cwd=worktree_dir)
+            self.measure(mirror)
+        with self._lock:
+            self.expansions += 1
+
+    def changed_paths(self, repo_url, commit_a, commit_b, patterns=SPARSE_PATTERNS):
+        """
+        Paths matching patterns that differ between two commits. Only the trees of the commits are compared, so no
+        blob is downloaded into a partial mirror.
+        """
+        mirror = self.mirror_path(repo_url)
+        try:
+            with self.using(mirror), self.mirror_lock(mirror):
+                self.ensure_commit(repo_url, commit_a)
+                self.ensure_commit(repo_url, commit_b)
+                result = subprocess.run(["git", "--git-dir", str(mirror), "diff", "--name-only", "--no-renames",
+                                         commit_a, commit_b, "--", *(f":(glob){pattern}" for pattern in patterns)],
+                                        check=True, stdout=subprocess.PIPE, text=True)
+        finally:
+            # The commits may have been fetched into the mirror
+            self.evict()
+        return result.stdout.splitlines()
+
+    @contextmanager
+    def worktree(self, repo_url, commit_sha, worktree_dir):
+        """Check out a commit of a repository into worktree_dir for the duration of the with block."""
+        mirror = self.mirror_path(repo_url)
+
+        try:
+            with self.using(mirror):
+                try:
+                    with self.mirror_lock(mirror):
+                        self.ensure_commit(repo_url, commit_sha)
+                        print(f"Checking out commit {commit_sha} into {worktree_dir}...")
+                        # Forget worktrees of interrupted runs whose directories were deleted
+                        git("--git-dir", str(mirror), "worktree", "prune")
+                        self.checkout(mirror, commit_sha, worktree_dir)
+
+                    yield worktree_dir
+                finally:
+                    with self.mirror_lock(mirror):
+                        subprocess.run(["git", "--git-dir", str(mirror), "worktree", "remove", "--force",
+                                        str(worktree_dir)])
+        finally:
+            self.evict()
+
+    @staticmethod
+    def last_used(mirror):
+        try:
+            return (mirror / "last_used").stat().st_mtime
+        except FileNotFoundError:
+            return 0
+
+    def evict(self):
+        """Delete the least recently used mirrors without worktrees until the cache fits into max_size."""
+        with self._lock:
+            unmeasured = [mirror for mirror in self.root.glob('*.git') if mirror not in self._sizes]
+        for mirror in unmeasured:
+            # Mirrors of earlier runs are measured once, without holding the cache lock
+            with self.mirror_lock(mirror):
+                if mirror.exists():
+                    self.measure(mirror)
+
+        evicted = []
+        with self._lock:
+            self._sizes = {mirror: size for mirror, size in self._sizes.items() if mirror.exists()}
+            total_size = sum(self._sizes.values())
+            for mirror in sorted(self._sizes, key=self.last_used):
+                if total_size <= self.max_size:
+                    break
+                if self._in_use[mirror] > 0:
+                    continue
+                # Moved away while holding the lock, so no job starts to use the mirror while it is deleted
+                trash = Path(tempfile.mkdtemp(prefix='.evicted-', dir=self.root))
+                mirror.rename(trash / mirror.name)
+                size = self._sizes.pop(mirror)
+                total_size -= size
+                self.evictions += 1
+                evicted.append((mirror, trash, size))
+
+        for mirror, trash, size in evicted:
+            print(f"Evicting {mirror.name} from the clone cache ({size / 1024 ** 2:.0f} MB)")
+            shutil.rmtree(trash, ignore_errors=True)
+
+    def print_summary(self):
+        print(f"Clone cache ({self.mode} checkouts): {self.hits} hits, {self.fetches} fetches, {self.clones} clones, "
+              f"{self.evictions} evictions, {self.expansions} expanded to full checkouts")
+
+
+_clone_cache = None
+_clone_cache_lock = threading.Lock()
+
+
+def get_clone_cache():
+    """Return the process-wide CloneCache, so all jobs share its mirrors and locks."""
+    global _clone_cache
+    with _clone_cache_lock:
+        if _clone_cache is None:
+            _clone_cache = CloneCache()
+        return _clone_cache
@@ -1,34 +1,108 @@
-import csv
-import os
+import re
+import threading
+from functools import lru_cache
 
+import numpy as np
+import pandas as pd
 from semver import Version
 import json
 
+from rq2.results_store import CATEGORIES, ResultsStore
+
 OUTPUT_CSV = '../data/rq2_semantic_differences.csv'
 OUTPUT_JSON = 'semantic_differences_per_module.json'
+RESULTS_DB = 'cache/rq2_results.sqlite'     # store the workers write to, compacted into OUTPUT_CSV and OUTPUT_JSON
+# 'semver': strict SemVer (with optional minor and patch), as used for the published results
+# 'maven':  also accepts Maven versions such as 5.4.2.Final, 2.0.0.RELEASE, 1.2.3.4 or 01.2, which are INVALID in SemVer
+VERSION_SCHEME = 'semver'
+PAIR_CACHE_SIZE = 65536
+
+CATEGORY_ARRAY = np.array(CATEGORIES, dtype=object)
+# major[.minor[.patch[.build...]]] followed by any qualifier (-SNAPSHOT, .Final, -jre, RC1, ...)
+MAVEN_VERSION = re.compile(r'[vV]?(\d+)(?:\.(\d+))?(?:\.(\d+))?(?:\.\d+)*(?:[-._+]?[0-9A-Za-z][0-9A-Za-z.\-_+]*)?')
 
 
-def semantic_difference(v1, v2):
-    """Compute semantic distance: major, minor, patch delta"""
+def parse_semver(version):
     try:
-        v1_parsed = Version.parse(v1, optional_minor_and_patch=True)
-        v2_parsed = Version.parse(v2, optional_minor_and_patch=True)
+        parsed = Version.parse(version, optional_minor_and_patch=True)
+        return parsed.major, parsed.minor, parsed.patch
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_maven_version(version):
+    match = MAVEN_VERSION.fullmatch(version.strip()) if isinstance(version, str) else None
+    if match is None:
+        return None
+    return tuple(int(part or 0) for part in match.groups())
+
+
+PARSERS = {'semver': parse_semver, 'maven': parse_maven_version}
+
+
+class VersionTable:
+    """Interned versions of a scheme: every distinct version string is parsed once into (major, minor, patch)."""
+
+    def __init__(self, scheme):
+        self.parse = PARSERS[scheme]
+        self.versions = {}
+
+    def __getitem__(self, version):
+        if version not in self.versions:
+            self.versions[version] = self.parse(version)    # None if the version is invalid
+        return self.versions[version]
+
+
+VERSION_TABLES = {scheme: VersionTable(scheme) for scheme in PARSERS}
 
-        if v1_parsed.major != v2_parsed.major:
-            return "MAJOR"
-        elif v1_parsed.minor != v2_parsed.minor:
-            return "MINOR"
-        elif v1_parsed.patch != v2_parsed.patch:
-            return "PATCH"
-        else:
-            return "OTHER"
 
-    except Exception as e:
-        return {"error": str(e)}
+def classify(parsed_v1, parsed_v2):
+    if parsed_v1 is None or parsed_v2 is None:
+        return "INVALID"
+    if parsed_v1[0] != parsed_v2[0]:
+        return "MAJOR"
+    elif parsed_v1[1] != parsed_v2[1]:
+        return "MINOR"
+    elif parsed_v1[2] != parsed_v2[2]:
+        return "PATCH"
+    return "OTHER"
+
+
+@lru_cache(maxsize=PAIR_CACHE_SIZE)
+def classify_pair(v1, v2, scheme):
+    table = VERSION_TABLES[scheme]
+    return classify(table[v1], table[v2])
+
+
+def semantic_difference(v1, v2, scheme=None):
+    """Compute semantic distance: major, minor, patch delta, or INVALID if a version cannot be parsed"""
+    return classify_pair(v1, v2, scheme or VERSION_SCHEME)
+
+
+def classify_pairs(versions_1, versions_2, scheme=None):
+    """
+    Semantic distance of whole arrays of version pairs at once. The distinct versions are parsed once and the
+    major/minor/patch parts compared as integer codes.
+    """
+    table = VERSION_TABLES[scheme or VERSION_SCHEME]
+    codes, uniques = pd.factorize(pd.Series([*versions_1, *versions_2], dtype=object))
+    parsed = [table[version] for version in uniques]
+    valid = np.array([p is not None for p in parsed] + [False], dtype=bool)
+    # Factorized per part, so arbitrarily large version numbers compare without overflow
+    parts = [np.append(pd.factorize(pd.Series([p[i] if p else -1 for p in parsed], dtype=object))[0], -1)
+             for i in range(3)]
+
+    first, second = codes[:len(codes) // 2], codes[len(codes) // 2:]     # -1 (missing versions) selects the padding
+    categories = np.select([~(valid[first] & valid[second]),
+                            parts[0][first] != parts[0][second],
+                            parts[1][first] != parts[1][second],
+                            parts[2][first] != parts[2][second]],
+                           [4, 0, 1, 2], 3)
+    return CATEGORY_ARRAY[categories]
 
 
 def parse_diff_counts_from_json(input_json):
-    diff_counts = {"MAJOR": 0, "MINOR": 0, "PATCH": 0, "OTHER": 0, "INVALID": 0}
+    diff_counts = dict.fromkeys(CATEGORIES, 0)
 
     # Structure: {module_name: {MAJOR: <int>, MINOR: <int>, PATCH: <int>, OTHER: <int>, INVALID: <int>}}
     diff_counts_per_module = {}
@@ -36,35 +110,29 @@ def parse_diff_counts_from_json(input_json):
     with open(input_json, "r") as f:
         data = json.load(f)
 
-        for module in data["conflicts"]:
-            if module not in diff_counts_per_module:
-                diff_counts_per_module[module] = {"MAJOR": 0, "MINOR": 0, "PATCH": 0, "OTHER": 0, "INVALID": 0}
-            else:
-                # modules should be unique
-                raise ValueError(f"Module {module} already exists in diff_counts")
-
-            for dep, versions in data['conflicts'][module].items():
-                try:
-                    chosen_version = dep.split(":")[-1]
-                    for conflicting_version in versions:
-                        difference = semantic_difference(chosen_version, conflicting_version)
-                        count = versions[conflicting_version]
-
-                        if "error" not in difference:
-                            diff_counts[difference] += count
-                            diff_counts_per_module[module][difference] += count
-                        else:
-                            print(f"→ {dep}: {difference} - x{count} times")
-                            diff_counts['INVALID'] += count
-                            diff_counts_per_module[module]['INVALID'] += count
-
-                except Exception as e:
-                    print(f"  Error processing module {module} - {dep}: {e}")
+    # One row per (module, dependency, omitted version), classified in one batch
+    rows = []
+    for module, dependencies in data["conflicts"].items():
+        if module in diff_counts_per_module:
+            # modules should be unique
+            raise ValueError(f"Module {module} already exists in diff_counts")
+        diff_counts_per_module[module] = dict.fromkeys(CATEGORIES, 0)
+        for dep, versions in dependencies.items():
+            chosen_version = dep.split(":")[-1]
+            rows += [(module, dep, chosen_version, conflicting_version, count)
+                     for conflicting_version, count in versions.items()]
+
+    differences = classify_pairs([row[2] for row in rows], [row[3] for row in rows])
+    for (module, dep, _, conflicting_version, count), difference in zip(rows, differences):
+        if difference == "INVALID":
+            print(f"→ {dep} vs {conflicting_version}: invalid version - x{count} times")
+        diff_counts[difference] += count
+        diff_counts_per_module[module][difference] += count
 
     return data, diff_counts, diff_counts_per_module
 
 
-def print_and_write_summary_to_csv(data, diff_counts):
+def print_summary(data, diff_counts):
     total_conflicts = sum(diff_counts.values())
 
     # Print a summary of all semantic differences
@@ -73,64 +141,30 @@ def print_and_write_summary_to_csv(data, diff_counts):
     for key in ["MAJOR", "MINOR", "PATCH", "OTHER", "INVALID"]:
         print(f"  {key}: {diff_counts[key]}")
 
-    # Write summary to CSV
-    write_header = not os.path.exists(OUTPUT_CSV) or os.stat(OUTPUT_CSV).st_size == 0
-    with open(OUTPUT_CSV, "a", newline="") as f:
-        writer = csv.writer(f)
-        if write_header:
-            writer.writerow(
-                ["pr_url", "affected_modules", "total", "major", "minor", "patch", "other", "invalid_semver"])
-
-        writer.writerow([
-            data["pr_url"],
-            data["affected_modules"],
-            total_conflicts,
-            diff_counts["MAJOR"],
-            diff_counts["MINOR"],
-            diff_counts["PATCH"],
-            diff_counts["OTHER"],
-            diff_counts["INVALID"]
-        ])
-
-
-def print_and_write_per_module_to_json(data, diff_counts_per_module):
-    # Load existing output
-    if os.path.exists(OUTPUT_JSON) and os.stat(OUTPUT_JSON).st_size > 0:
-        with open(OUTPUT_JSON, "r") as f:
-            output_data = json.load(f)
-    else:
-        output_data = {}
-
-    # Build per-module output under the PR URL
-    pr_data = {}
-    for module, diff_counts in diff_counts_per_module.items():
-        total_conflicts_in_module = sum(diff_counts.values())
-
-        pr_data[module] = {
-            "MAJOR": diff_counts["MAJOR"],
-            "MINOR": diff_counts["MINOR"],
-            "PATCH": diff_counts["PATCH"],
-            "OTHER": diff_counts["OTHER"],
-            "INVALID_SEMVER": diff_counts["INVALID"],
-            "TOTAL": total_conflicts_in_module
-        }
-    # Structure:
-    # {pr_url:
-    #   [
-    #       {
-    #           module_name: {MAJOR: <int>, MINOR: <int>, PATCH: <int>, OTHER: <int>, INVALID_SEMVER: <int>, TOTAL: <int>}
-    #       }
-    #   ]
-    # }
-    output_data[data['pr_url']] = pr_data
-
-    # Write updated result back
-    with open(OUTPUT_JSON, "w") as f:
-        json.dump(output_data, f, indent=4)
+
+_results_store = None
+_results_store_lock = threading.Lock()
+
+
+def get_results_store():
+    """Return the process-wide ResultsStore, seeded with the existing CSV/JSON outputs when it is new."""
+    global _results_store
+    with _results_store_lock:
+        if _results_store is None:
+            _results_store = ResultsStore(RESULTS_DB)
+            if _results_store.is_empty():
+                _results_store.import_outputs(OUTPUT_CSV, OUTPUT_JSON)
+        return _results_store
 
 
 def compute_semver_differences(input_json):
+    """Compute the semantic differences of a PR and store them. Safe to call from parallel workers."""
     data, diff_counts, diff_counts_per_module = parse_diff_counts_from_json(input_json)
 
-    print_and_write_summary_to_csv(data, diff_counts)
-    print_and_write_per_module_to_json(data, diff_counts_per_module)
+    print_summary(data, diff_counts)
+    get_results_store().upsert(data["pr_url"], data["affected_modules"], diff_counts, diff_counts_per_module)
+
+
+def write_outputs():
+    """Compact the stored semantic differences into the CSV summary and the per-module JSON file."""
+    get_results_store().compact(OUTPUT_CSV, OUTPUT_JSON)
@@ -0,0 +1,71 @@
+import json
+
+DIFF_KINDS = ["removed", "added", "changed"]
+
+
+def mediations(module_conflicts):
+    """
+    Mediations of a module by artifact: {groupId:artifactId: {used_version: {omitted_version: count}}}, from the
+    conflicts of the module ({groupId:artifactId:used_version: {omitted_version: count}}).
+    """
+    by_artifact = {}
+    for dependency, omitted_versions in module_conflicts.items():
+        artifact, used_version = dependency.rsplit(':', 1)
+        by_artifact.setdefault(artifact, {})[used_version] = omitted_versions
+    return by_artifact
+
+
+def diff_conflicts(before, after):
+    """
+    Structural diff of the conflicts of two analyses ({module: {groupId:artifactId:used_version: {omitted: count}}}).
+
+    Per module, the mediations of an artifact are 'removed' when the artifact no longer conflicts, 'added' when it
+    conflicts only after, and 'changed' when the used version or the omitted versions differ. Every module and
+    artifact is looked up once in a dict, so the diff takes time linear in the size of both analyses.
+    Returns {module: {'removed': {artifact: ...}, 'added': {artifact: ...}, 'changed': {artifact: {'before': ...,
+    'after': ...}}}}, without the modules whose mediations did not change.
+    """
+    diff = {}
+    for module in before.keys() | after.keys():
+        mediations_before = mediations(before.get(module, {}))
+        mediations_after = mediations(after.get(module, {}))
+        module_diff = {
+            "removed": {artifact: mediations_before[artifact]
+                        for artifact in mediations_before.keys() - mediations_after.keys()},
+            "added": {artifact: mediations_after[artifact]
+                      for artifact in mediations_after.keys() - mediations_before.keys()},
+            "changed": {artifact: {"before": mediations_before[artifact], "after": mediations_after[artifact]}
+                        for artifact in mediations_before.keys() & mediations_after.keys()
+                        if mediations_before[artifact] != mediations_after[artifact]},
+        }
+        if any(module_diff.values()):
+            diff[module] = module_diff
+    return dict(sorted(diff.items()))
+
+
+def summarize(diff):
+    """Number of removed, added and changed mediations over all modules."""
+    return {kind: sum(len(module_diff[kind]) for module_diff in diff.values()) for kind in DIFF_KINDS}
+
+
+def diff_conflict_files(before_file, after_file, output_file):
+    """Diff the conflicts saved by two analyses of a PR, save the diff to output_file and return its summary."""
+    with open(before_file, 'r') as f:
+        before = json.load(f)
+    with open(after_file, 'r') as f:
+        after = json.load(f)
+
+    diff = diff_conflicts(before["conflicts"], after["conflicts"])
+    summary = summarize(diff)
+    with open(output_file, 'w') as f:
+        json.dump({
+            "pr_url": before["pr_url"],
+            "total_conflicts_before": before["total_conflicts"],
+            "total_conflicts_after": after["total_conflicts"],
+            **summary,
+            "modules": diff},
+            f, indent=4)
+
+    print(f"{before['pr_url']}: {before['total_conflicts']} conflicts before, {after['total_conflicts']} after "
+          f"({summary['removed']} mediations removed, {summary['added']} added, {summary['changed']} changed)")
+    return summary
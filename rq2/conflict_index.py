@@ -0,0 +1,235 @@
+import glob
+import json
+import os
+import threading
+import time
+from functools import lru_cache
+
+from common.checkpoint import open_database
+from rq2.pom_resolver import version_key
+
+CONFLICT_INDEX_DB = 'cache/conflict_index.sqlite'
+CONFLICTS_GLOB = 'cache/conflicts_before_*.json'
+TOP_ARTIFACTS = 20
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conflicts (
+    group_id TEXT NOT NULL,
+    artifact_id TEXT NOT NULL,
+    used_version TEXT NOT NULL,         -- version that won the mediation
+    omitted_version TEXT NOT NULL,      -- version that lost it
+    pr_url TEXT NOT NULL,
+    module TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (artifact_id, group_id, pr_url, module, used_version, omitted_version)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS conflicts_by_pr ON conflicts (pr_url);
+CREATE TABLE IF NOT EXISTS artifact_prs (
+    group_id TEXT NOT NULL,
+    artifact_id TEXT NOT NULL,
+    pr_url TEXT NOT NULL,
+    conflicts INTEGER NOT NULL,
+    modules INTEGER NOT NULL,
+    PRIMARY KEY (artifact_id, group_id, pr_url)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS artifact_prs_by_pr ON artifact_prs (pr_url);
+CREATE TABLE IF NOT EXISTS artifacts (
+    group_id TEXT NOT NULL,
+    artifact_id TEXT NOT NULL,
+    conflicts INTEGER NOT NULL,         -- omitted versions, i.e. lost mediations
+    prs INTEGER NOT NULL,
+    modules INTEGER NOT NULL,
+    versions INTEGER NOT NULL,          -- distinct used and omitted versions
+    lowest_version TEXT,
+    highest_version TEXT,
+    PRIMARY KEY (artifact_id, group_id)
+);
+CREATE INDEX IF NOT EXISTS artifacts_by_conflicts ON artifacts (conflicts DESC);
+CREATE TABLE IF NOT EXISTS stale_artifacts (
+    group_id TEXT NOT NULL,
+    artifact_id TEXT NOT NULL,
+    PRIMARY KEY (artifact_id, group_id)
+);
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    pr_url TEXT NOT NULL,
+    mtime REAL NOT NULL
+);
+"""
+
+
+def split_artifact(artifact):
+    """'groupId:artifactId' or just 'artifactId' into (group_id or None, artifact_id)."""
+    group_id, _, artifact_id = artifact.rpartition(':')
+    return group_id or None, artifact_id
+
+
+class ConflictIndex:
+    """
+    SQLite index of the version conflicts of all analysed PRs, keyed by groupId:artifactId.
+
+    Every omitted version is a row (artifact, used version, omitted version, PR, module, count). The aggregates per
+    artifact and PR and per artifact (conflicts, PRs, modules, version span) are precomputed, so the queries are index
+    lookups instead of scans of the conflicts_before_*.json files. Adding a PR marks its artifacts as stale, and their
+    aggregates are recomputed in one pass before the next query.
+    """
+
+    def __init__(self, path=CONFLICT_INDEX_DB):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        open_database(path, SCHEMA).close()
+
+    @property
+    def db(self):
+        # sqlite3 connections cannot be shared between threads, so each thread gets its own
+        if not hasattr(self._local, 'connection'):
+            self._local.connection = open_database(self.path)
+        return self._local.connection
+
+    def add(self, pr_url, conflicts, source=None):
+        """
+        Index the conflicts of a PR ({module: {'g:a:used_version': {omitted_version: count}}}), replacing those of an
+        earlier analysis. source is the (path, mtime) of the file the conflicts were read from.
+        """
+        rows = []
+        per_artifact = {}
+        for module, dependencies in conflicts.items():
+            for dependency, omitted_versions in dependencies.items():
+                group_id, artifact_id, used_version = dependency.rsplit(':', 2)
+                rows += [(group_id, artifact_id, used_version, omitted_version, pr_url, module, count)
+                         for omitted_version, count in omitted_versions.items()]
+                counts = per_artifact.setdefault((group_id, artifact_id), [0, set()])
+                counts[0] += sum(omitted_versions.values())
+                counts[1].add(module)
+
+        with self.db:
+            # The aggregates of the artifacts of the earlier analysis and of this one are recomputed before the next
+            # query, all at once, instead of once per PR
+            self.db.execute("INSERT OR IGNORE INTO stale_artifacts SELECT group_id, artifact_id "
+                            "FROM artifact_prs WHERE pr_url = ?", [pr_url])
+            self.db.execute("DELETE FROM conflicts WHERE pr_url = ?", [pr_url])
+            self.db.execute("DELETE FROM artifact_prs WHERE pr_url = ?", [pr_url])
+            self.db.executemany("INSERT INTO conflicts VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self.db.executemany("INSERT INTO artifact_prs VALUES (?, ?, ?, ?, ?)",
+                                [(group_id, artifact_id, pr_url, count, len(modules))
+                                 for (group_id, artifact_id), (count, modules) in per_artifact.items()])
+            self.db.executemany("INSERT OR IGNORE INTO stale_artifacts VALUES (?, ?)", per_artifact)
+            if source is not None:
+                self.db.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?)", [source[0], pr_url, source[1]])
+
+    def update_aggregates(self):
+        """Recompute the aggregates of the artifacts whose conflicts changed since the last update."""
+        with self.db:
+            # Locks out concurrent writers, so no PR is added between reading and clearing the stale artifacts
+            self.db.execute("BEGIN IMMEDIATE")
+            stale = "(artifact_id, group_id) IN (SELECT artifact_id, group_id FROM stale_artifacts)"
+            versions = {}
+            for group_id, artifact_id, version in self.db.execute(
+                    f"SELECT group_id, artifact_id, used_version FROM conflicts WHERE {stale} "
+                    f"UNION SELECT group_id, artifact_id, omitted_version FROM conflicts WHERE {stale}"):
+                versions.setdefault((group_id, artifact_id), []).append(version)
+
+            self.db.execute(f"DELETE FROM artifacts WHERE {stale}")
+            aggregates = self.db.execute(
+                f"SELECT group_id, artifact_id, SUM(conflicts), COUNT(*), SUM(modules) FROM artifact_prs WHERE {stale} "
+                "GROUP BY artifact_id, group_id").fetchall()
+            # Equal versions such as 1.0 and 1.0.0 are ordered by name, so the span does not depend on the row order
+            sort_key = lru_cache(maxsize=None)(lambda version: (version_key(version), version))
+            rows = []
+            for group_id, artifact_id, *counts in aggregates:
+                ordered = sorted(versions[(group_id, artifact_id)], key=sort_key)
+                rows.append([group_id, artifact_id, *counts, len(ordered), ordered[0], ordered[-1]])
+            self.db.executemany("INSERT INTO artifacts VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.db.execute("DELETE FROM stale_artifacts")
+
+    def _query(self, sql, parameters=()):
+        if self.db.execute("SELECT 1 FROM stale_artifacts LIMIT 1").fetchone():
+            self.update_aggregates()
+        return self.db.execute(sql, parameters).fetchall()
+
+    def add_file(self, path):
+        """Index a conflicts_before_*.json file, unless it did not change since it was indexed."""
+        mtime = os.path.getmtime(path)
+        known = self.db.execute("SELECT mtime FROM sources WHERE path = ?", [path]).fetchone()
+        if known and known[0] == mtime:
+            return False
+        with open(path, 'r') as f:
+            data = json.load(f)
+        self.add(data['pr_url'], data['conflicts'], source=(path, mtime))
+        return True
+
+    def build(self, pattern=CONFLICTS_GLOB):
+        """Index all conflict files matching pattern. Only new and changed files are read."""
+        start = time.perf_counter()
+        paths = sorted(glob.glob(pattern))
+        added = sum(self.add_file(path) for path in paths)
+        self.update_aggregates()
+        print(f"Indexed {added} of {len(paths)} conflict files in {time.perf_counter() - start:.1f}s")
+
+    def top_artifacts(self, limit=TOP_ARTIFACTS):
+        """The artifacts with the most lost mediations, with their aggregates."""
+        return self._query("SELECT * FROM artifacts ORDER BY conflicts DESC LIMIT ?", [limit])
+
+    def _artifact_filter(self, artifact, omitted_version=None):
+        group_id, artifact_id = split_artifact(artifact)
+        condition, parameters = "artifact_id = ?", [artifact_id]
+        if group_id is not None:
+            condition += " AND group_id = ?"
+            parameters.append(group_id)
+        if omitted_version is not None:
+            condition += " AND omitted_version = ?"
+            parameters.append(omitted_version)
+        return condition, parameters
+
+    def lost_mediations(self, artifact, omitted_version=None):
+        """
+        Where a version of an artifact ('groupId:artifactId' or 'artifactId') lost a mediation:
+        (pr_url, module, group_id, artifact_id, used_version, omitted_version, count) rows.
+        """
+        condition, parameters = self._artifact_filter(artifact, omitted_version)
+        return self.db.execute("SELECT pr_url, module, group_id, artifact_id, used_version, omitted_version, count "
+                               f"FROM conflicts WHERE {condition} ORDER BY pr_url, module", parameters).fetchall()
+
+    def prs_with_lost_mediation(self, artifact, omitted_version=None):
+        condition, parameters = self._artifact_filter(artifact, omitted_version)
+        table = "artifact_prs" if omitted_version is None else "conflicts"
+        return [pr_url for pr_url, in self.db.execute(
+            f"SELECT DISTINCT pr_url FROM {table} WHERE {condition} ORDER BY pr_url", parameters)]
+
+    def version_span(self, artifact):
+        """(group_id, artifact_id, versions, lowest_version, highest_version) of the matching artifacts."""
+        condition, parameters = self._artifact_filter(artifact)
+        return self._query("SELECT group_id, artifact_id, versions, lowest_version, highest_version "
+                           f"FROM artifacts WHERE {condition}", parameters)
+
+    def print_top_artifacts(self, limit=TOP_ARTIFACTS):
+        prs = self.db.execute("SELECT COUNT(DISTINCT pr_url) FROM conflicts").fetchone()[0]
+        print(f"\nTop {limit} conflicting artifacts in {prs} PRs:")
+        print(f"  {'artifact':<60} {'conflicts':>9} {'PRs':>5} {'modules':>7} {'versions':>8}  span")
+        for group_id, artifact_id, conflicts, prs, modules, versions, lowest, highest in self.top_artifacts(limit):
+            print(f"  {group_id + ':' + artifact_id:<60} {conflicts:>9} {prs:>5} {modules:>7} {versions:>8}  "
+                  f"{lowest} - {highest}")
+
+
+_conflict_index = None
+_conflict_index_lock = threading.Lock()
+
+
+def get_conflict_index():
+    """Return the process-wide ConflictIndex shared by all jobs."""
+    global _conflict_index
+    with _conflict_index_lock:
+        if _conflict_index is None:
+            _conflict_index = ConflictIndex()
+        return _conflict_index
+
+
+def main():
+    index = get_conflict_index()
+    index.build()
+    index.print_top_artifacts()
+
+
+if __name__ == "__main__":
+    main()
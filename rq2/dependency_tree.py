@@ -0,0 +1,108 @@
+import re
+import sys
+from collections import namedtuple
+
+# [INFO] <tree prefix>(<groupId>:<artifactId>:<type>[:<classifier>]:<version>[:<scope>] - <note>)
+# The character classes of the prefix and of the coordinates do not overlap, so a line is matched without backtracking
+TREE_LINE = re.compile(r'\[INFO\] ([| +\\-]*)(\(?)([^: ()]+(?::[^: ()]+){3,5})')
+ANSI_ESCAPE = re.compile(r'\x1b\[[0-9;]*m')
+MODULE_HEADER = '[INFO] --- '
+CONFLICT_NOTE = 'omitted for conflict with '
+
+DependencyNode = namedtuple('DependencyNode', [
+    'module', 'depth', 'group_id', 'artifact_id', 'type', 'classifier', 'version', 'scope',
+    'omitted',          # 'conflict', 'duplicate', 'cycle' or None if the dependency is used
+    'conflict_version'  # version that won the mediation, for dependencies omitted for conflict
+])
+
+
+class DependencyTreeParser:
+    """
+    Single-pass parser of the output of mvn dependency:tree -Dverbose.
+
+    The output is fed line by line, from a file or straight from the Maven process. Each tree line is tokenized once
+    into a DependencyNode with interned strings, and the versions omitted for conflict are counted per module as
+    {module: {groupId:artifactId:used_version: {omitted_version: count}}}.
+    """
+
+    def __init__(self, keep_nodes=False):
+        self.module = None
+        self.conflicts = {}
+        self.total_conflicts = 0
+        self.has_errors = False
+        self.nodes = [] if keep_nodes else None
+
+    @property
+    def affected_modules(self):
+        return len(self.conflicts)
+
+    def feed(self, line):
+        if '\x1b' in line:
+            line = ANSI_ESCAPE.sub('', line)
+
+        if line.startswith(MODULE_HEADER):
+            # [INFO] --- dependency:3.8.1:tree (default-cli) @ module-a ---
+            if ':tree ' in line and ' @ ' in line:
+                self.module = sys.intern(line.split(' @ ', 1)[1].split(' ', 1)[0].strip())
+            return
+        if line.startswith('[ERROR]'):
+            self.has_errors = True
+            return
+
+        node = self.tokenize(line)
+        if node is None:
+            return
+        if self.nodes is not None:
+            self.nodes.append(node)
+        if node.omitted == 'conflict':
+            key = f"{node.group_id}:{node.artifact_id}:{node.conflict_version}"
+            omitted_versions = self.conflicts.setdefault(node.module, {}).setdefault(key, {})
+            omitted_versions[node.version] = omitted_versions.get(node.version, 0) + 1
+            self.total_conflicts += 1
+
+    def parse(self, lines):
+        for line in lines:
+            self.feed(line)
+        return self
+
+    def tokenize(self, line):
+        """The DependencyNode of a tree line of the current module, or None for any other line."""
+        match = TREE_LINE.match(line)
+        if match is None or self.module is None:
+            return None
+
+        prefix, parenthesized, coordinates = match.groups()
+        depth = len(prefix) // 3
+        parts = coordinates.split(':')
+        if depth == 0:
+            # Root of the module: groupId:artifactId:packaging[:classifier]:version
+            scope = None
+            classifier = parts[3] if len(parts) == 5 else None
+        elif len(parts) >= 5:
+            scope = parts[-1]
+            classifier = parts[3] if len(parts) == 6 else None
+            parts = parts[:-1]
+        else:
+            return None
+
+        omitted = conflict_version = None
+        if parenthesized:
+            note = line[match.end():]
+            if CONFLICT_NOTE in note:
+                omitted = 'conflict'
+                conflict_version = sys.intern(note.split(CONFLICT_NOTE, 1)[1].split(';', 1)[0].strip(' )\r\n'))
+            elif 'omitted for duplicate' in note:
+                omitted = 'duplicate'
+            elif 'omitted for cycle' in note:
+                omitted = 'cycle'
+
+        intern = sys.intern
+        return DependencyNode(self.module, depth, intern(parts[0]), intern(parts[1]), intern(parts[2]),
+                              classifier and intern(classifier), intern(parts[-1]), scope and intern(scope),
+                              omitted, conflict_version)
+
+
+def parse_dependency_tree(file_path, keep_nodes=False):
+    """Parse a dependency tree saved to a file, reading it as a stream."""
+    with open(file_path, 'r') as f:
+        return DependencyTreeParser(keep_nodes).parse(f)
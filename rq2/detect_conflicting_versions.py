@@ -1,162 +1,313 @@
 import json
 import os
+import shutil
 import subprocess
-import re
-from collections import defaultdict
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 import pandas as pd
-import requests
 
-from rq2.compute_semantic_difference import compute_semver_differences
-
-# In the run configuration, you need to set the GITHUB_TOKEN environment variable to your GitHub Personal Access Token
-GITHUB_TOKEN = os.getenv('GITHUB_TOKEN')
-HEADERS = {
-    'Authorization': f'Bearer {GITHUB_TOKEN}',
-    'Accept': 'application/vnd.github+json'
-}
-MAVEN_CMD = r"C:\Program Files\apache-maven-3.9.4\bin\mvn.cmd"
+from common.datasets import read_table
+from common.github_client import api_url, get_client
+from rq2.clone_cache import get_clone_cache
+from rq2.compute_semantic_difference import compute_semver_differences, write_outputs
+from rq2.conflict_diff import DIFF_KINDS, diff_conflict_files
+from rq2.conflict_index import get_conflict_index
+from rq2.dependency_tree import DependencyTreeParser, parse_dependency_tree
+from rq2.maven_repository import get_maven_repository
+from rq2.pom_resolver import get_pom_resolver
+
+MAVEN_CMD = os.getenv('MAVEN_CMD', r"C:\Program Files\apache-maven-3.9.4\bin\mvn.cmd")
+DEPENDENCY_PLUGIN = "org.apache.maven.plugins:maven-dependency-plugin:3.8.1"
 INPUT_CSV = '../data/rq2_final_version_conflict_overview.csv'
-TEMP_DIR = "temp_repo"
-
-
-def clone_repo(repo_url: str, repo_dir: str):
-    if not os.path.exists(repo_dir):
-        print(f"Cloning repository: {repo_url}")
-        subprocess.run(["git", "clone", repo_url, repo_dir], check=True)
-    else:
-        print(f"Repository already cloned at {repo_dir}")
-
-
-def checkout_commit(repo_dir: str, commit_sha: str):
-    print(f"Checking out commit {commit_sha}...")
-    subprocess.run(["git", "-c", "advice.detachedHead=false", "checkout", commit_sha], cwd=repo_dir, check=True)
-
-
-def run_maven_dependency_tree(repo_dir: str, output_file: str):
-    print("Running mvn dependency:tree...")
-    with open(output_file, 'w') as f:
-        result = subprocess.run(
-            [MAVEN_CMD, "org.apache.maven.plugins:maven-dependency-plugin:3.8.1:tree", "-Dverbose", "--fail-never"],
+WORK_DIR = "work"       # one git worktree and dependency tree per job
+JOB_LOG_CSV = "cache/dependency_tree_jobs.csv"
+MAX_PRS = None          # limit the number of analysed PRs for trial runs
+# 'maven' runs mvn dependency:tree, 'native' resolves the POMs in Python against the local Maven repository (no JVM,
+# no network, but only the POMs already in the repository are resolved)
+RESOLVER = 'maven'
+# Also analyse the merge commit of each PR and diff its conflicts against those of the base commit, to measure what
+# the PR fixed (cache/conflicts_after_*.json and cache/conflicts_diff_*.json)
+ANALYSE_MERGE_COMMIT = False
+
+# Machine resources shared by the concurrent mvn dependency:tree runs
+CPU_BUDGET = os.cpu_count() or 1
+MEMORY_BUDGET_MB = 8192
+JOB_CPUS = 1            # cores reserved per Maven run (single-threaded, so the tree of each module stays contiguous)
+JOB_MEMORY_MB = 1024    # maximum heap (-Xmx) of each Maven run
+
+
+def max_parallel_jobs():
+    """Number of Maven runs that fit into the CPU and memory budget at the same time."""
+    return max(1, min(CPU_BUDGET // JOB_CPUS, MEMORY_BUDGET_MB // JOB_MEMORY_MB))
+
+
+def run_maven_dependency_tree(repo_dir: str, output_file: str, offline=False, parser=None):
+    """Run mvn dependency:tree, streaming its output into output_file and, line by line, into parser."""
+    print(f"Running mvn dependency:tree{' offline' if offline else ''} in {repo_dir}...")
+    env = {**os.environ, 'MAVEN_OPTS': f"{os.environ.get('MAVEN_OPTS', '')} -Xmx{JOB_MEMORY_MB}m".strip()}
+    with open(output_file, 'w') as f, subprocess.Popen(
+            [MAVEN_CMD, f"{DEPENDENCY_PLUGIN}:tree", "-Dverbose", "--fail-never",
+             *get_maven_repository().args(offline)],
             cwd=repo_dir,
-            stdout=f,
+            stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
-            text=True
-        )
-
-        if result.returncode != 0:
-            print("Maven failed. Error output:")
-            print(result.stderr)
-        return result.returncode == 0
+            text=True,
+            env=env
+    ) as process:
+        for line in process.stdout:
+            f.write(line)
+            if parser is not None:
+                parser.feed(line)
+        returncode = process.wait()
+
+        if returncode != 0:
+            print(f"Maven failed, see {output_file}")
+        return returncode == 0
+
+
+def resolve_dependency_tree(repo_dir: str, output_file: str, timings):
+    """
+    Run dependency:tree against the shared Maven repository: offline when it is warm, and again online when artifacts
+    are missing. Adds the Maven duration and the downloads to timings. Returns whether Maven succeeded and the parsed
+    dependency tree.
+    """
+    maven_repository = get_maven_repository()
+    offline = maven_repository.offline and maven_repository.is_warm
+
+    start = time.perf_counter()
+    parser = DependencyTreeParser()
+    succeeded = run_maven_dependency_tree(repo_dir, output_file, offline, parser)
+    offline_miss = offline and maven_repository.missed_artifacts(output_file)
+    if offline_miss:
+        parser = DependencyTreeParser()
+        succeeded = run_maven_dependency_tree(repo_dir, output_file, offline=False, parser=parser)
+    downloads, downloaded_bytes = maven_repository.record(output_file, offline_miss)
+
+    timings['maven_s'] = round(timings.get('maven_s', 0) + time.perf_counter() - start, 1)
+    timings['maven_offline'] = offline and not offline_miss
+    timings['maven_downloads'] = timings.get('maven_downloads', 0) + downloads
+    timings['maven_downloaded_mb'] = round(timings.get('maven_downloaded_mb', 0) + downloaded_bytes / 1024 ** 2, 2)
+    return succeeded, parser
 
 
 def parse_conflicts_by_module_from_dependency_tree(file_path: str):
     # Structure: {module_name: {dep_key: {omitted_version: count}}}
-    module_conflicts = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
-    total_conflicts = 0
-    current_module = None
-    module_pattern = re.compile(r'dependency:.*?:tree.*?@ ([-\w.]+)')
-
-    conflict_pattern = re.compile(
-        r'([a-zA-Z0-9_.\-]+):([a-zA-Z0-9_.\-]+):.*?:([\w.\-]+):.*? -.*? omitted for conflict with ([\w.\-]+)'
-    )
-
-    with open(file_path, 'r') as f:
-        for line in f:
-            module_match = module_pattern.search(line)
-            if module_match:
-                current_module = module_match.group(1)
-                continue
-
-            match = conflict_pattern.search(line)
-            if match and current_module:
-                # test if the project is a single module project
-                group_id = match.group(1)
-                artifact_id = match.group(2)
-                omitted_version = match.group(3)
-                used_version = match.group(4)
-
-                key = f"{group_id}:{artifact_id}:{used_version}"
-                module_conflicts[current_module][key][omitted_version] += 1
-                total_conflicts += 1
-
-    affected_modules = len(module_conflicts.keys())
-
-    return total_conflicts, affected_modules, dict(module_conflicts)
-
-
-def detect_conflicting_versions(pr_url, repo_url, commit_sha, json_output_file):
-    repo_path = Path(TEMP_DIR).resolve()
-    clone_repo(repo_url, str(repo_path))
-
-    checkout_commit(str(repo_path), commit_sha)
-
-    output_file = "dep_tree.txt"
-    total_conflicts = 0
-    if run_maven_dependency_tree(str(repo_path), str(output_file)):
-        total_conflicts, affected_modules, conflicts = parse_conflicts_by_module_from_dependency_tree(str(output_file))
-
-        with open(json_output_file, "w") as f:
-            json.dump({
-                "pr_url": pr_url,
-                "total_conflicts": total_conflicts,
-                "affected_modules": affected_modules,
-                "conflicts": conflicts},
-                f, indent=4)
-
-        if conflicts:
-            print(f"{total_conflicts} conflicts in {affected_modules} modules saved to {json_output_file}")
+    parser = parse_dependency_tree(file_path)
+    return parser.total_conflicts, parser.affected_modules, parser.conflicts
+
+
+def maven_conflicts(repo_url, worktree, output_file, timings):
+    """
+    Conflicts per module from mvn dependency:tree, or None if Maven failed. A sparse checkout that Maven cannot build
+    is expanded to a full checkout before giving up.
+    """
+    clone_cache = get_clone_cache()
+    maven_succeeded, tree = resolve_dependency_tree(str(worktree), output_file, timings)
+
+    timings['full_checkout'] = clone_cache.mode == 'full'
+    # Errors on a sparse checkout usually mean the build reads a file that was left out (a properties file,
+    # a profile activated by a file, a build extension)
+    if clone_cache.mode == 'sparse' and (not maven_succeeded or tree.has_errors):
+        start = time.perf_counter()
+        clone_cache.expand(repo_url, worktree)
+        timings['checkout_s'] += round(time.perf_counter() - start, 1)
+        maven_succeeded, tree = resolve_dependency_tree(str(worktree), output_file, timings)
+        timings['full_checkout'] = True
+
+    if not maven_succeeded:
+        return None
+    return tree.total_conflicts, tree.affected_modules, tree.conflicts
+
+
+def native_conflicts(repo_dir, timings):
+    """Conflicts per module from the POM resolver. Dependencies whose POM is not in the local repository are leaves."""
+    start = time.perf_counter()
+    total_conflicts, affected_modules, conflicts, missing = get_pom_resolver().resolve_conflicts(repo_dir)
+    timings['resolve_s'] = round(time.perf_counter() - start, 2)
+    timings['missing_poms'] = len(missing)
+    if missing:
+        print(f"{len(missing)} POMs not in the local Maven repository, e.g. {', '.join(missing[:3])}")
+    return total_conflicts, affected_modules, conflicts
+
+
+def detect_conflicting_versions(pr_url, repo_url, commit_sha, json_output_file, timings=None):
+    """
+    Run mvn dependency:tree (or the POM resolver) at a commit and save the conflicts per module to json_output_file.
+    Each job works in its own worktree and output file (named after json_output_file), so jobs can run in parallel.
+    The duration of the checkout and of the Maven run are added to timings. Returns the number of conflicts, or None
+    if the dependency tree could not be computed (json_output_file is then missing).
+    """
+    timings = {} if timings is None else timings
+    job_dir = Path(WORK_DIR, Path(json_output_file).stem).resolve()
+    worktree = job_dir / "src"
+    output_file = job_dir / "dep_tree.txt"
+
+    shutil.rmtree(job_dir, ignore_errors=True)
+    job_dir.mkdir(parents=True)
+    # The output of an earlier run must not pass for the result of this one
+    if os.path.exists(json_output_file):
+        os.remove(json_output_file)
+
+    total_conflicts = None
+    start = time.perf_counter()
+    # The dependency tree is kept in the job directory, the worktree is removed when the job ends
+    with get_clone_cache().worktree(repo_url, commit_sha, worktree):
+        timings['checkout_s'] = round(time.perf_counter() - start, 1)
+        if RESOLVER == 'native':
+            result = native_conflicts(str(worktree), timings)
         else:
-            print("No conflicting versions found.")
+            result = maven_conflicts(repo_url, worktree, str(output_file), timings)
+
+        if result is not None:
+            total_conflicts, affected_modules, conflicts = result
+
+            with open(json_output_file, "w") as f:
+                json.dump({
+                    "pr_url": pr_url,
+                    "total_conflicts": total_conflicts,
+                    "affected_modules": affected_modules,
+                    "conflicts": conflicts},
+                    f, indent=4)
 
-    # Optional: clean up
-    # subprocess.run(["rmdir", "/S", "/Q", repo_path], shell=True)
+            if conflicts:
+                print(f"{total_conflicts} conflicts in {affected_modules} modules saved to {json_output_file}")
+            else:
+                print(f"No conflicting versions found for {pr_url}.")
 
     return total_conflicts
 
 
-def process_pr(pr_url, force=False):
+def analyse_merge_commit(pr_url, repo_url, base_sha, merge_sha, before_file, after_file, diff_file, force, timings):
+    """
+    Analyse the merge commit of a PR into after_file and diff its conflicts against those of the base commit. The
+    mirror and the Maven repository filled by the base commit are reused, and when the PR changed no build descriptor
+    the conflicts of the base commit are copied without running Maven again. Returns the summary of the diff, or None
+    if the merge commit could not be analysed.
+    """
+    if not os.path.exists(after_file) or force:
+        start = time.perf_counter()
+        after_timings = {}
+        changed = get_clone_cache().changed_paths(repo_url, base_sha, merge_sha)
+        if changed:
+            detect_conflicting_versions(pr_url, repo_url, merge_sha, json_output_file=after_file, timings=after_timings)
+        else:
+            print(f"{pr_url} changed no build descriptor, reusing the conflicts of the base commit")
+            shutil.copyfile(before_file, after_file)
+        timings.update({f"after_{key}": value for key, value in after_timings.items()})
+        timings['after_s'] = round(time.perf_counter() - start, 1)
+        timings['after_reused'] = not changed
+
+    if not os.path.exists(after_file):
+        return None
+    return diff_conflict_files(before_file, after_file, diff_file)
+
+
+def process_pr(pr_url, force=False, timings=None):
+    timings = {} if timings is None else timings
     parts = pr_url.strip("/").split("/")
     owner, repo, pr_number = parts[-4], parts[-3], parts[-1]
-    api_url = f"https://api.github.com/repos/{owner}/{repo}/pulls/{pr_number}"
 
-    response = requests.get(api_url, headers=HEADERS)
-    if response.status_code != 200:
-        print(f"Failed to fetch PR data: {response.status_code} - {response.text}")
-        exit(1)
+    response = get_client().get(api_url(f"repos/{owner}/{repo}/pulls/{pr_number}"))
+    if response is None:
+        raise RuntimeError(f"Failed to fetch PR data for {pr_url}")
 
     pr_commit_sha = response.json().get("merge_commit_sha")
     pr_base_sha = response.json().get("base").get("sha")
     repo_url = response.json().get("base").get("repo").get("clone_url")
     json_output_file = f"cache/conflicts_before_{owner}_{repo}_{pr_number}.json"
 
+    total_conflicts = -1    # cached data
     if not os.path.exists(json_output_file) or force:
-        total_conflicts = detect_conflicting_versions(pr_url, repo_url, pr_base_sha, json_output_file=json_output_file)
-        return total_conflicts, json_output_file
-    else:
-        # Use cached data
-        return -1, json_output_file
-
-    # print("--------------------------------")
-    # detect_conflicting_versions(pr_url, repo_url, pr_commit_sha, json_output_file="conflicts_after.json")
+        total_conflicts = detect_conflicting_versions(pr_url, repo_url, pr_base_sha, json_output_file=json_output_file,
+                                                      timings=timings)
+        if total_conflicts is None:
+            raise RuntimeError(f"Failed to compute the dependency tree of {pr_url}")
+
+    if ANALYSE_MERGE_COMMIT and pr_commit_sha and os.path.exists(json_output_file):
+        try:
+            summary = analyse_merge_commit(pr_url, repo_url, pr_base_sha, pr_commit_sha, json_output_file,
+                                           f"cache/conflicts_after_{owner}_{repo}_{pr_number}.json",
+                                           f"cache/conflicts_diff_{owner}_{repo}_{pr_number}.json", force, timings)
+            if summary is not None:
+                timings.update({f"mediations_{kind}": count for kind, count in summary.items()})
+        except Exception as e:
+            print(f"Failed to analyse the merge commit of {pr_url}: {e}")
+
+    return total_conflicts, json_output_file
+
+
+def run_job(pr_url, force=False):
+    """Analyse one PR and record how long it took."""
+    job = {'pr_url': pr_url, 'status': 'failed', 'total_conflicts': None, 'json_output': None}
+    timings = {}
+    start = time.perf_counter()
+    try:
+        total_conflicts, json_output = process_pr(pr_url, force, timings)
+        job.update(status='cached' if total_conflicts == -1 else 'done', total_conflicts=total_conflicts,
+                   json_output=json_output)
+        # if total_conflicts > 0:
+        if job['status'] == 'done':
+            compute_semver_differences(json_output)
+        if os.path.exists(json_output):
+            get_conflict_index().add_file(json_output)
+    except Exception as e:
+        print(f"Failed to analyse {pr_url}: {e}")
+    job.update(timings, duration_s=round(time.perf_counter() - start, 1))
+    return job
+
+
+def analyse_prs(pr_urls, force=False):
+    """Run the analysis of the PRs in parallel, within the CPU/memory budget. Yields each job when it finishes."""
+    workers = max_parallel_jobs()
+    print(f"Analysing {len(pr_urls)} PRs with up to {workers} concurrent Maven runs")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_job, pr_url, force) for pr_url in pr_urls]
+        for future in as_completed(futures):
+            job = future.result()
+            tree_s = job.get('maven_s', job.get('resolve_s', '-'))
+            print(f"{job['pr_url']}: {job['status']} in {job['duration_s']}s "
+                  f"(checkout {job.get('checkout_s', '-')}s, dependency tree {tree_s}s)")
+            yield job
+
+
+def main():
+    if RESOLVER == 'maven':
+        # Check if the Maven command is available
+        result = subprocess.run([MAVEN_CMD, "--version"], stdout=subprocess.DEVNULL, check=True)
+        if result.returncode != 0:
+            print("Maven command not found. Please check your Maven installation.")
+            exit(1)
+        get_maven_repository().prewarm([MAVEN_CMD, f"{DEPENDENCY_PLUGIN}:help"])
+
+    os.makedirs("cache", exist_ok=True)
+    df = read_table(INPUT_CSV, columns=['pr_url'])
+    pr_urls = list(df['pr_url'][:MAX_PRS])
+
+    start = time.perf_counter()
+    jobs = []
+    for job in analyse_prs(pr_urls, force=True):
+        jobs.append(job)
+    write_outputs()
+    get_conflict_index().print_top_artifacts()
+
+    pd.DataFrame(jobs).to_csv(JOB_LOG_CSV, index=False)
+    elapsed = time.perf_counter() - start
+    busy = sum(job['duration_s'] for job in jobs)
+    print(f"\nAnalysed {len(jobs)} PRs in {elapsed:.0f}s ({busy:.0f}s of job time), durations saved to {JOB_LOG_CSV}")
+    if ANALYSE_MERGE_COMMIT:
+        diffed = [job for job in jobs if job.get('mediations_removed') is not None]
+        totals = {kind: sum(job[f"mediations_{kind}"] for job in diffed) for kind in DIFF_KINDS}
+        print(f"Merge commits of {len(diffed)} PRs: {totals['removed']} mediations removed, {totals['added']} added, "
+              f"{totals['changed']} changed, {sum(job.get('after_s', 0) for job in jobs):.0f}s of job time "
+              f"({sum(bool(job.get('after_reused')) for job in jobs)} without build descriptor changes)")
+    get_clone_cache().print_summary()
+    if RESOLVER == 'maven':
+        get_maven_repository().print_summary()
 
 
 # Example usage:
 if __name__ == "__main__":
-    # Check if the Maven command is available
-    result = subprocess.run([MAVEN_CMD, "--version"], stdout=subprocess.DEVNULL, check=True)
-    if result.returncode != 0:
-        print("Maven command not found. Please check your Maven installation.")
-        exit(1)
-
-    df = pd.read_csv(INPUT_CSV)
-    df = df.iloc[0:1]
-
-    for index, row in df.iterrows():
-        pr_url = row['pr_url']
-        print(f"\n------------------------------\nProcessing PR: {pr_url}")
-        total_conflicts, json_output = process_pr(pr_url, force=True)
-
-        # if total_conflicts > 0:
-        compute_semver_differences(json_output)
+    main()
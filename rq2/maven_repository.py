@@ -0,0 +1,129 @@
+import os
+import re
+import subprocess
+import threading
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from rq2.clone_cache import directory_size
+
+MAVEN_REPO_DIR = os.getenv('MAVEN_REPO_DIR', 'm2/repository')
+# Remote repository all artifacts are resolved from, e.g. file:///srv/maven-mirror or a local Nexus/Reposilite URL.
+# Maven Central is used when it is not set.
+REMOTE_REPOSITORY_URL = os.getenv('MAVEN_REMOTE_REPOSITORY')
+OFFLINE_MODE = True     # run dependency:tree with -o once the repository is warm, online only for missing artifacts
+
+# Let concurrent Maven runs share the local repository without corrupting it (Maven 3.9+)
+SYNC_CONTEXT_ARGS = ["-Daether.syncContext.named.factory=file-lock", "-Daether.syncContext.named.nameMapper=file-gav"]
+
+DOWNLOADED_PATTERN = re.compile(r'Downloaded from [^:]+: \S+ \((\d+(?:\.\d+)?) (B|kB|MB|GB)')
+OFFLINE_MISS_PATTERN = re.compile(r'in offline mode')
+SIZE_UNITS = {'B': 1, 'kB': 1000, 'MB': 1000 ** 2, 'GB': 1000 ** 3}
+
+SETTINGS_TEMPLATE = """<settings>
+  <localRepository>{local_repository}</localRepository>
+  <mirrors>{mirrors}
+  </mirrors>
+</settings>
+"""
+MIRROR_TEMPLATE = """
+    <mirror>
+      <id>stand-in</id>
+      <mirrorOf>*</mirrorOf>
+      <url>{url}</url>
+    </mirror>"""
+
+
+class MavenRepository:
+    """
+    Local Maven repository shared by all dependency:tree runs, with its own settings.xml.
+
+    The repository is pre-warmed once with the dependency plugin, after which every run first resolves its project
+    offline (-o). Only when artifacts are missing is the run repeated online, which downloads them for all later runs.
+    The runs that needed no download are counted as cache hits.
+    """
+
+    def __init__(self, root=MAVEN_REPO_DIR, remote_url=REMOTE_REPOSITORY_URL, offline=OFFLINE_MODE):
+        self.root = Path(root).resolve()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.settings = self.root.parent / "settings.xml"
+        self.offline = offline
+        self.write_settings(remote_url)
+        self.runs = 0
+        self.hits = 0
+        self.offline_misses = 0
+        self.downloads = 0
+        self.downloaded_bytes = 0
+        self.initial_size = directory_size(self.root)
+        self._lock = threading.Lock()
+
+    def write_settings(self, remote_url):
+        mirrors = MIRROR_TEMPLATE.format(url=escape(remote_url)) if remote_url else ""
+        self.settings.write_text(SETTINGS_TEMPLATE.format(local_repository=escape(str(self.root)), mirrors=mirrors))
+
+    def args(self, offline=False):
+        """Command line arguments that make Maven use this repository."""
+        return ["-s", str(self.settings), f"-Dmaven.repo.local={self.root}", *SYNC_CONTEXT_ARGS,
+                *(["-o"] if offline else [])]
+
+    @property
+    def is_warm(self):
+        return (self.root / ".prewarmed").exists()
+
+    def prewarm(self, command):
+        """Run a Maven command (e.g. a goal of the dependency plugin) online once, so offline runs find the plugin."""
+        if self.is_warm:
+            return True
+        print(f"Pre-warming the Maven repository {self.root}...")
+        result = subprocess.run([*command, *self.args()], cwd=self.root, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL)
+        if result.returncode != 0:
+            print("Pre-warming the Maven repository failed, dependency:tree will run online")
+            return False
+        (self.root / ".prewarmed").touch()
+        return True
+
+    @staticmethod
+    def missed_artifacts(output_file):
+        """Whether an offline run failed because artifacts were not in the local repository."""
+        with open(output_file, 'r') as f:
+            return any(OFFLINE_MISS_PATTERN.search(line) for line in f)
+
+    def record(self, output_file, offline_miss=False):
+        """Count the downloads of a finished run. Returns the number of downloaded files and their size in bytes."""
+        downloads, downloaded_bytes = 0, 0
+        with open(output_file, 'r') as f:
+            for line in f:
+                match = DOWNLOADED_PATTERN.search(line)
+                if match:
+                    downloads += 1
+                    downloaded_bytes += float(match.group(1)) * SIZE_UNITS[match.group(2)]
+
+        with self._lock:
+            self.runs += 1
+            self.hits += not offline_miss and downloads == 0
+            self.offline_misses += offline_miss
+            self.downloads += downloads
+            self.downloaded_bytes += downloaded_bytes
+        return downloads, downloaded_bytes
+
+    def print_summary(self):
+        hit_rate = self.hits / self.runs if self.runs else 0
+        size = directory_size(self.root)
+        print(f"Maven repository: {self.hits}/{self.runs} runs without downloads ({hit_rate:.0%} hit rate), "
+              f"{self.offline_misses} offline misses, {self.downloads} files downloaded "
+              f"({self.downloaded_bytes / 1024 ** 2:.1f} MB), {size / 1024 ** 2:.0f} MB in {self.root} "
+              f"({(size - self.initial_size) / 1024 ** 2:+.0f} MB)")
+
+
+_maven_repository = None
+_maven_repository_lock = threading.Lock()
+
+
+def get_maven_repository():
+    """Return the process-wide MavenRepository shared by all jobs."""
+    global _maven_repository
+    with _maven_repository_lock:
+        if _maven_repository is None:
+            _maven_repository = MavenRepository()
+        return _maven_repository
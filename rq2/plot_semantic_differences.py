@@ -7,6 +7,8 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+from common.datasets import read_table
+
 
 def plot_total_category_pie(df, categories):
     category_total_conflicts = {cat: df[cat].sum() for cat in categories}
@@ -129,7 +131,7 @@ if __name__ == "__main__":
     # sns.set_theme(style="whitegrid", font_scale=0.2, rc={"grid.linewidth": 0.3})
 
     # Load your DataFrame
-    df = pd.read_csv("../data/rq2_semantic_differences.csv")  # Replace with your actual DataFrame if loaded differently
+    df = read_table("../data/rq2_semantic_differences.csv")  # Replace with your actual DataFrame if loaded differently
     module_conflicts = json.load(open("semantic_differences_per_module.json", "r"))
 
     # Make sure the json file contains only PRs that are in the dataframe
@@ -0,0 +1,400 @@
+import re
+import threading
+import xml.etree.ElementTree as ET
+from collections import deque, namedtuple
+from pathlib import Path
+
+from rq2.maven_repository import MAVEN_REPO_DIR
+
+PROPERTY = re.compile(r'\$\{([^}]+)}')
+VERSION_RANGE = re.compile(r'([\[(])([^,\])]*)(,?)([^\])]*)([\])])')
+MAX_INTERPOLATION_DEPTH = 10
+MAX_PARENT_DEPTH = 30
+
+# Scope of a transitive dependency, by the scope of the dependency that pulls it in and its declared scope
+# (test and provided dependencies of dependencies are not transitive)
+TRANSITIVE_SCOPES = {
+    'compile': {'compile': 'compile', 'runtime': 'runtime'},
+    'runtime': {'compile': 'runtime', 'runtime': 'runtime'},
+    'provided': {'compile': 'provided', 'runtime': 'provided'},
+    'test': {'compile': 'test', 'runtime': 'test'},
+    'system': {'compile': 'system', 'runtime': 'system'},
+}
+
+# Order of the well-known qualifiers of Maven versions, all others sort between snapshot and release
+QUALIFIERS = {'alpha': 1, 'a': 1, 'beta': 2, 'b': 2, 'milestone': 3, 'm': 3, 'rc': 4, 'cr': 4, 'snapshot': 5,
+              '': 7, 'ga': 7, 'final': 7, 'release': 7, 'sp': 8}
+
+RELEASE = (1, QUALIFIERS[''], '')
+
+Dependency = namedtuple('Dependency', 'group_id artifact_id version type classifier scope optional exclusions')
+
+
+def version_key(version):
+    """Sort key of a Maven version, e.g. 1.0-alpha-1 < 1.0-rc1 < 1.0-SNAPSHOT < 1.0 = 1.0.0 < 1.0-sp1 < 1.0.1."""
+    key = []
+    for segment in version.split('-'):
+        tokens = []
+        for token in re.findall(r'\d+|[a-zA-Z]+', segment):
+            if token.isdigit():
+                tokens.append((2, int(token), ''))
+            else:
+                rank = QUALIFIERS.get(token.lower(), 6)
+                tokens.append((1, rank, token.lower() if rank == 6 else ''))
+        # Trailing zeros and release qualifiers of each segment do not count: 1.0.0-alpha = 1-alpha, 1.0.Final = 1
+        while tokens and tokens[-1] in ((2, 0, ''), RELEASE):
+            tokens.pop()
+        key += tokens
+    # Ends like a release, so 1.0 sorts after 1.0-rc1 and before 1.0.1
+    return tuple(key) + (RELEASE,)
+
+
+def in_range(version, spec):
+    """Whether a version satisfies a Maven version range such as [1.0,2.0) or (,1.5],[2.0,)."""
+    key = version_key(version)
+    for lower_bracket, lower, comma, upper, upper_bracket in VERSION_RANGE.findall(spec):
+        if not comma:
+            # [1.0] pins a single version
+            upper = lower
+        if lower and (version_key(lower) > key or (lower_bracket == '(' and version_key(lower) == key)):
+            continue
+        if upper and (version_key(upper) < key or (upper_bracket == ')' and version_key(upper) == key)):
+            continue
+        return True
+    return False
+
+
+def is_range(version):
+    return version is not None and version[:1] in ('[', '(')
+
+
+def strip_namespaces(root):
+    for element in root.iter():
+        if isinstance(element.tag, str) and '}' in element.tag:
+            element.tag = element.tag.split('}', 1)[1]
+    return root
+
+
+def child_text(element, name, default=None):
+    child = element.find(name) if element is not None else None
+    return child.text.strip() if child is not None and child.text else default
+
+
+class RawPom:
+    """The declarations of one pom.xml, before inheritance and interpolation. Profiles active by default are merged."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        root = strip_namespaces(ET.parse(path).getroot())
+
+        parent = root.find('parent')
+        self.parent = None if parent is None else (
+            child_text(parent, 'groupId'), child_text(parent, 'artifactId'), child_text(parent, 'version'),
+            # An empty <relativePath/> disables the lookup of the parent in the file system
+            child_text(parent, 'relativePath', '' if parent.find('relativePath') is not None else '../pom.xml'))
+        self.group_id = child_text(root, 'groupId')
+        self.artifact_id = child_text(root, 'artifactId')
+        self.version = child_text(root, 'version')
+        self.packaging = child_text(root, 'packaging', 'jar')
+
+        self.properties = {}
+        self.managed = []
+        self.dependencies = []
+        self.modules = []
+        sections = [root] + [profile for profile in root.findall('profiles/profile')
+                             if child_text(profile.find('activation'), 'activeByDefault') == 'true']
+        for section in sections:
+            for prop in section.findall('properties/*'):
+                self.properties[prop.tag] = (prop.text or '').strip()
+            self.managed += [self.parse_dependency(d)
+                             for d in section.findall('dependencyManagement/dependencies/dependency')]
+            self.dependencies += [self.parse_dependency(d) for d in section.findall('dependencies/dependency')]
+            self.modules += [(module.text or '').strip() for module in section.findall('modules/module')]
+
+    @staticmethod
+    def parse_dependency(element):
+        exclusions = frozenset((child_text(e, 'groupId', '*'), child_text(e, 'artifactId', '*'))
+                               for e in element.findall('exclusions/exclusion'))
+        return Dependency(child_text(element, 'groupId'), child_text(element, 'artifactId'),
+                          child_text(element, 'version'), child_text(element, 'type', 'jar'),
+                          child_text(element, 'classifier'), child_text(element, 'scope'),
+                          child_text(element, 'optional') == 'true', exclusions)
+
+
+class Model:
+    """Effective model of a POM: inherited, interpolated, with imported BOMs and its own management applied."""
+
+    def __init__(self, group_id, artifact_id, version, packaging, properties, managed, dependencies):
+        self.group_id = group_id
+        self.artifact_id = artifact_id
+        self.version = version
+        self.packaging = packaging
+        self.properties = properties
+        self.managed = managed              # {(groupId, artifactId, type, classifier): Dependency}
+        self.dependencies = dependencies
+
+
+def management_key(dependency):
+    return dependency.group_id, dependency.artifact_id, dependency.type, dependency.classifier
+
+
+def is_excluded(dependency, exclusions):
+    return any(group in ('*', dependency.group_id) and artifact in ('*', dependency.artifact_id)
+               for group, artifact in exclusions)
+
+
+def manage(dependency, managed, fill_only=True):
+    """
+    Apply a managed dependency: fill in the missing version/scope (declarations of the POM itself), or override
+    them (transitive dependencies), and add the managed exclusions.
+    """
+    entry = managed.get(management_key(dependency))
+    if entry is None:
+        return dependency
+    version, scope = dependency.version, dependency.scope
+    if entry.version and (not fill_only or not version):
+        version = entry.version
+    if entry.scope and (not fill_only or not scope):
+        scope = entry.scope
+    return dependency._replace(version=version, scope=scope, exclusions=dependency.exclusions | entry.exclusions)
+
+
+class ResolutionSession:
+    """Resolves the models of one multi-module project, preferring the reactor modules over the local repository."""
+
+    def __init__(self, resolver, project_dir):
+        self.resolver = resolver
+        self.models = {}
+        self.reactor = {}
+        self.missing = set()
+
+        paths = []
+        queue = deque([Path(project_dir) / 'pom.xml'])
+        while queue:
+            path = queue.popleft().resolve()
+            if path in paths or not path.is_file():
+                continue
+            paths.append(path)
+            for module in self.resolver.raw_pom(path).modules:
+                module_path = path.parent / module
+                queue.append(module_path / 'pom.xml' if not module_path.name.endswith('.xml') else module_path)
+
+        # Keyed by the interpolated coordinates, so that e.g. ${revision} versions match the dependencies on the modules
+        for path in paths:
+            model = self.build(self.resolver.raw_pom(path))
+            self.reactor[(model.group_id, model.artifact_id, model.version)] = path
+
+    def inherited_coordinates(self, raw):
+        group_id, version = raw.group_id, raw.version
+        if raw.parent is not None:
+            group_id = group_id or raw.parent[0]
+            version = version or raw.parent[2]
+        return group_id, raw.artifact_id, version
+
+    def find_raw(self, group_id, artifact_id, version, near=None, relative_path=None):
+        """Find the POM of a coordinate: next to a child POM, in the reactor, or in the local repository."""
+        if near is not None and relative_path:
+            path = near.parent / relative_path
+            path = path / 'pom.xml' if path.is_dir() else path
+            if path.is_file():
+                raw = self.resolver.raw_pom(path)
+                if self.inherited_coordinates(raw) == (group_id, artifact_id, version):
+                    return raw
+
+        path = self.reactor.get((group_id, artifact_id, version))
+        path = path or self.resolver.repository_pom(group_id, artifact_id, version)
+        if path is None:
+            self.missing.add(f"{group_id}:{artifact_id}:{version}")
+            return None
+        return self.resolver.raw_pom(path)
+
+    def model(self, group_id, artifact_id, version):
+        key = (group_id, artifact_id, version)
+        if key not in self.models:
+            self.models[key] = None  # guards against cycles of parents or BOM imports
+            raw = self.find_raw(*key)
+            self.models[key] = None if raw is None else self.build(raw)
+        return self.models[key]
+
+    def build(self, raw):
+        # Inheritance: the chain from the POM up to the root parent
+        chain = [raw]
+        while chain[-1].parent is not None and len(chain) < MAX_PARENT_DEPTH:
+            parent = self.find_raw(*chain[-1].parent[:3], near=chain[-1].path, relative_path=chain[-1].parent[3])
+            if parent is None:
+                break
+            chain.append(parent)
+
+        group_id, artifact_id, version = self.inherited_coordinates(raw)
+        properties = {}
+        managed = {}
+        dependencies = {}
+        for pom in reversed(chain):
+            properties.update(pom.properties)
+        for pom in chain:
+            # Declarations of the child come first and win over those of its parents
+            for dependency in pom.managed:
+                managed.setdefault(management_key(dependency), dependency)
+            for dependency in pom.dependencies:
+                dependencies.setdefault(management_key(dependency), dependency)
+
+        parent = raw.parent or (None, None, None)
+        context = {**properties, 'project.groupId': group_id, 'project.artifactId': artifact_id,
+                   'project.version': version, 'project.parent.groupId': parent[0],
+                   'project.parent.version': parent[2], 'project.basedir': str(raw.path.parent)}
+        for name in ('groupId', 'artifactId', 'version'):
+            context[f'pom.{name}'] = context[f'project.{name}']
+        version = self.interpolate(version, context)
+
+        # Interpolate the managed dependencies, then add those of the imported BOMs (declared ones take precedence)
+        managed = [self.interpolate_dependency(d, context) for d in managed.values()]
+        imports = [d for d in managed if d.scope == 'import' and d.type == 'pom']
+        effective_managed = {management_key(d): d for d in managed if not (d.scope == 'import' and d.type == 'pom')}
+        for dependency in imports:
+            bom = self.model(dependency.group_id, dependency.artifact_id, dependency.version)
+            for key, entry in (bom.managed.items() if bom else []):
+                effective_managed.setdefault(key, entry)
+
+        effective_dependencies = [manage(self.interpolate_dependency(d, context), effective_managed)
+                                  for d in dependencies.values()]
+        return Model(group_id, artifact_id, version, raw.packaging, context, effective_managed, effective_dependencies)
+
+    @staticmethod
+    def interpolate(value, context):
+        for _ in range(MAX_INTERPOLATION_DEPTH):
+            if value is None or '${' not in value:
+                break
+            value = PROPERTY.sub(lambda m: context.get(m.group(1)) or m.group(0), value)
+        return value
+
+    def interpolate_dependency(self, dependency, context):
+        return dependency._replace(
+            group_id=self.interpolate(dependency.group_id, context),
+            artifact_id=self.interpolate(dependency.artifact_id, context),
+            version=self.interpolate(dependency.version, context),
+            type=self.interpolate(dependency.type, context),
+            classifier=self.interpolate(dependency.classifier, context),
+            scope=self.interpolate(dependency.scope, context))
+
+    def select_version(self, dependency):
+        if not is_range(dependency.version):
+            return dependency
+        return dependency._replace(version=self.resolver.resolve_range(
+            dependency.group_id, dependency.artifact_id, dependency.version))
+
+    def mediate(self, model):
+        """
+        Collect the dependency graph of a module breadth first and apply nearest-wins mediation, like Maven does
+        (the first declaration wins between dependencies at the same depth). Returns {g:a:used: {omitted: count}}.
+        """
+        conflicts = {}
+        winners = {(model.group_id, model.artifact_id, model.packaging, None): model.version}
+        # (dependency, scope, exclusions of the path, dependency management in effect for its children, depth)
+        queue = deque((self.select_version(d), d.scope or 'compile', frozenset(), model.managed, 1)
+                      for d in model.dependencies)
+        while queue:
+            dependency, scope, exclusions, managed, depth = queue.popleft()
+            key = management_key(dependency)
+            if key in winners:
+                if winners[key] != dependency.version:
+                    used = f"{dependency.group_id}:{dependency.artifact_id}:{winners[key]}"
+                    omitted_versions = conflicts.setdefault(used, {})
+                    omitted_versions[dependency.version] = omitted_versions.get(dependency.version, 0) + 1
+                continue
+            winners[key] = dependency.version
+            if dependency.version is None:
+                continue
+
+            child_model = self.model(dependency.group_id, dependency.artifact_id, dependency.version)
+            if child_model is None:
+                continue
+            child_exclusions = exclusions | dependency.exclusions
+            if depth == 1:
+                # The management of direct dependencies also applies to their transitive dependencies
+                managed = {**child_model.managed, **managed}
+            for child in child_model.dependencies:
+                if child.optional or is_excluded(child, child_exclusions):
+                    continue
+                child_scope = TRANSITIVE_SCOPES.get(scope, {}).get(child.scope or 'compile')
+                if child_scope is None:
+                    continue
+                managed_child = manage(child, managed, fill_only=False)
+                if managed_child.scope != child.scope:
+                    # A managed scope replaces the derived one
+                    child_scope = managed_child.scope
+                queue.append((self.select_version(managed_child), child_scope, child_exclusions, managed, depth + 1))
+        return conflicts
+
+
+class PomResolver:
+    """
+    In-process alternative to mvn dependency:tree for finding version conflicts.
+
+    The pom.xml files of a project (parents, dependencyManagement, properties, BOM imports, exclusions and profiles
+    active by default) are resolved against a local Maven repository directory, without network access. Dependencies
+    whose POM is not in the repository are kept as leaves and reported as missing.
+    """
+
+    def __init__(self, repository=MAVEN_REPO_DIR):
+        self.repository = Path(repository).resolve()
+        self._raw_poms = {}
+        self._lock = threading.Lock()
+
+    def raw_pom(self, path):
+        path = Path(path)
+        raw = self._raw_poms.get(path)
+        if raw is None:
+            raw = RawPom(path)
+            with self._lock:
+                self._raw_poms[path] = raw
+        return raw
+
+    def artifact_dir(self, group_id, artifact_id):
+        return self.repository / group_id.replace('.', '/') / artifact_id
+
+    def repository_pom(self, group_id, artifact_id, version):
+        if not (group_id and artifact_id and version):
+            return None
+        path = self.artifact_dir(group_id, artifact_id) / version / f"{artifact_id}-{version}.pom"
+        return path if path.is_file() else None
+
+    def resolve_range(self, group_id, artifact_id, spec):
+        """Highest version of the local repository in a version range, or its lower bound if none is available."""
+        directory = self.artifact_dir(group_id, artifact_id)
+        versions = [d.name for d in directory.iterdir() if d.is_dir()] if directory.is_dir() else []
+        matching = [v for v in versions if in_range(v, spec)]
+        if matching:
+            return max(matching, key=version_key)
+        bounds = [bound for bound in re.split(r'[\[\](),]', spec) if bound]
+        return bounds[0] if bounds else spec
+
+    def resolve_conflicts(self, project_dir):
+        """
+        Version conflicts of every module of a project, with the structure of the conflicts parsed from
+        mvn dependency:tree. Returns the total number of conflicts, the number of affected modules, the conflicts and
+        the missing POMs.
+        """
+        session = ResolutionSession(self, project_dir)
+        conflicts = {}
+        for group_id, artifact_id, version in session.reactor:
+            model = session.model(group_id, artifact_id, version)
+            module_conflicts = session.mediate(model) if model else {}
+            if module_conflicts:
+                conflicts[artifact_id] = module_conflicts
+
+        total_conflicts = sum(count for deps in conflicts.values() for omitted in deps.values()
+                              for count in omitted.values())
+        return total_conflicts, len(conflicts), conflicts, sorted(session.missing)
+
+
+_pom_resolver = None
+_pom_resolver_lock = threading.Lock()
+
+
+def get_pom_resolver():
+    """Return the process-wide PomResolver, so all jobs share the parsed POMs of the local repository."""
+    global _pom_resolver
+    with _pom_resolver_lock:
+        if _pom_resolver is None:
+            _pom_resolver = PomResolver()
+        return _pom_resolver
@@ -0,0 +1,131 @@
+import csv
+import json
+import os
+import threading
+import time
+
+from common.checkpoint import open_database
+
+CATEGORIES = ["MAJOR", "MINOR", "PATCH", "OTHER", "INVALID"]
+JSON_KEYS = ["MAJOR", "MINOR", "PATCH", "OTHER", "INVALID_SEMVER", "TOTAL"]
+CSV_HEADER = ["pr_url", "affected_modules", "total", "major", "minor", "patch", "other", "invalid_semver"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS summary (
+    pr_url TEXT PRIMARY KEY,
+    affected_modules INTEGER,
+    total INTEGER,
+    major INTEGER,
+    minor INTEGER,
+    patch INTEGER,
+    other INTEGER,
+    invalid_semver INTEGER,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS modules (
+    pr_url TEXT NOT NULL,
+    module TEXT NOT NULL,
+    major INTEGER,
+    minor INTEGER,
+    patch INTEGER,
+    other INTEGER,
+    invalid_semver INTEGER,
+    total INTEGER,
+    PRIMARY KEY (pr_url, module)
+);
+"""
+
+
+def atomic_write(path, write):
+    """Write a file through a temporary file, so readers never see a partially written output."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", newline="") as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+class ResultsStore:
+    """
+    SQLite store of the semantic differences of the analysed PRs, which parallel workers can write to.
+
+    Each PR is upserted: analysing a PR again replaces its summary and modules instead of adding a row. The store is
+    compacted on demand into the CSV summary and the per-module JSON file, in the order the PRs were first stored.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        open_database(path, SCHEMA).close()
+
+    @property
+    def db(self):
+        # sqlite3 connections cannot be shared between threads, so each thread gets its own
+        if not hasattr(self._local, 'connection'):
+            self._local.connection = open_database(self.path)
+        return self._local.connection
+
+    def is_empty(self):
+        return not self.db.execute("SELECT 1 FROM summary UNION ALL SELECT 1 FROM modules LIMIT 1").fetchone()
+
+    def upsert(self, pr_url, affected_modules, diff_counts, diff_counts_per_module):
+        """Store the semantic differences of a PR, replacing those of an earlier analysis in one transaction."""
+        with self.db:
+            self._upsert_summary(pr_url, [affected_modules, sum(diff_counts.values())] +
+                                 [diff_counts[category] for category in CATEGORIES])
+            self._upsert_modules(pr_url, {module: [counts[c] for c in CATEGORIES] + [sum(counts.values())]
+                                          for module, counts in diff_counts_per_module.items()})
+
+    def _upsert_summary(self, pr_url, values):
+        # ON CONFLICT ... DO UPDATE keeps the rowid, and so the position of the PR in the outputs
+        self.db.execute("INSERT INTO summary VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (pr_url) DO UPDATE SET "
+                        "affected_modules = excluded.affected_modules, total = excluded.total, major = excluded.major, "
+                        "minor = excluded.minor, patch = excluded.patch, other = excluded.other, "
+                        "invalid_semver = excluded.invalid_semver, updated_at = excluded.updated_at",
+                        [pr_url, *values, time.time()])
+
+    def _upsert_modules(self, pr_url, modules):
+        placeholders = ", ".join("?" * len(modules))
+        self.db.execute(f"DELETE FROM modules WHERE pr_url = ? AND module NOT IN ({placeholders})",
+                        [pr_url, *modules])
+        self.db.executemany("INSERT INTO modules VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                            "ON CONFLICT (pr_url, module) DO UPDATE SET major = excluded.major, "
+                            "minor = excluded.minor, patch = excluded.patch, other = excluded.other, "
+                            "invalid_semver = excluded.invalid_semver, total = excluded.total",
+                            [(pr_url, module, *counts) for module, counts in modules.items()])
+
+    def import_outputs(self, csv_path, json_path):
+        """Load the results of earlier runs from the CSV/JSON outputs. Duplicate CSV rows of a PR keep the last one."""
+        with self.db:
+            if os.path.exists(csv_path) and os.stat(csv_path).st_size > 0:
+                with open(csv_path, newline="") as f:
+                    for row in csv.DictReader(f):
+                        self._upsert_summary(row["pr_url"], [int(row[column]) for column in CSV_HEADER[1:]])
+            if os.path.exists(json_path) and os.stat(json_path).st_size > 0:
+                with open(json_path) as f:
+                    for pr_url, modules in json.load(f).items():
+                        self._upsert_modules(pr_url, {module: [counts[key] for key in JSON_KEYS]
+                                                      for module, counts in modules.items()})
+
+    def compact(self, csv_path, json_path):
+        """Write the CSV summary and the per-module JSON file from the store."""
+        rows = self.db.execute(f"SELECT {', '.join(CSV_HEADER)} FROM summary ORDER BY rowid").fetchall()
+
+        def write_csv(f):
+            writer = csv.writer(f, lineterminator="\n")
+            writer.writerow(CSV_HEADER)
+            writer.writerows(rows)
+
+        # Structure: {pr_url: {module_name: {MAJOR: <int>, MINOR: <int>, PATCH: <int>, OTHER: <int>,
+        #                                    INVALID_SEMVER: <int>, TOTAL: <int>}}}
+        output_data = {}
+        for pr_url, module, *counts in self.db.execute("SELECT pr_url, module, major, minor, patch, other, "
+                                                       "invalid_semver, total FROM modules ORDER BY rowid"):
+            output_data.setdefault(pr_url, {})[module] = dict(zip(JSON_KEYS, counts))
+        for row in rows:
+            # PRs without conflicting modules
+            output_data.setdefault(row[0], {})
+
+        atomic_write(csv_path, write_csv)
+        atomic_write(json_path, lambda f: json.dump(output_data, f, indent=4))
+        print(f"Saved the semantic differences of {len(rows)} PRs to {csv_path} and {json_path}")
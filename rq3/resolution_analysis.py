@@ -4,6 +4,8 @@ import pandas as pd
 from matplotlib import pyplot as plt
 import seaborn as sns
 
+from common.datasets import read_table
+
 INPUT_CSV = '../data/final_version_conflict_prs.csv'
 OUTPUT_CSV = 'rq3_resolution_strategies.csv'
 
@@ -99,7 +101,7 @@ def analyze_effort_per_resolution_category(categories, df, resolution_counts_df)
 
 
 def main():
-    df = pd.read_csv(INPUT_CSV)
+    df = read_table(INPUT_CSV)
 
     # Check if 'resolution_strategy' exists in the DataFrame
     if 'resolution_strategy' not in df.columns: